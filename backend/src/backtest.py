@@ -0,0 +1,396 @@
+"""
+Event-driven backtest of MarketMaker on a recorded feed log (see feed_log.py).
+
+MarketMaker.on_trade() assumes our quote fills the moment any trade prints
+through its price. Here, instead:
+
+  - quotes become orders that reach the exchange after `entry_latency_us`
+    and are only cancelled after `cancel_latency_us` (they can still fill meanwhile)
+  - a live order joins the BACK of the queue at its price: queue_ahead = the
+    level quantity in OrderBookEngine when it arrives
+  - trades at our price eat the queue ahead of us first; only the rest fills us,
+    so fills can be partial. A trade through our price fills what's left.
+  - level decreases in depth diffs that aren't explained by trades are treated as
+    cancels and move us forward ("proportional"), or only when the level
+    shrinks below our position ("risk_averse")
+
+Time is exchange time (ts_event_us), plus `feed_latency_us` before the strategy
+sees an event.
+
+    python backtest.py session.feed --entry-latency-us 5000 --cancel-latency-us 3000
+"""
+import argparse
+import csv
+import heapq
+import json
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from feed_log import REC_FRAME, REC_SNAPSHOT, read_feed_log
+from market_handler import DepthDiff, MarketDecoder, Trade
+from market_maker import MarketMaker
+from order_book_engine import OrderBookEngine
+from order_manager import RestingOrder
+from replay import RecordedSnapshots
+from telemetry import SILENT
+from ticks import TICK_SPECS, TickSpec
+
+EPS = 1e-12
+
+
+@dataclass(slots=True)
+class SimOrder:
+    order_id: int
+    side: str # "buy" / "sell"
+    price: float
+    qty: float
+    remaining: float
+    t_sent: int # µs, when the strategy sent it
+    state: str = "pending" # pending → live → partial → filled / cancelled
+    live: bool = False # reached the exchange
+    cancel_requested: bool = False
+    queue_ahead: float = 0.0 # quantity resting in front of us at our price
+    traded_at_level: float = 0.0 # trade volume at our price since the last depth diff
+    t_live: int = 0
+    t_first_fill: int = 0
+    rest: Optional[RestingOrder] = None # the maker's order (one ladder level) this one carries
+
+
+@dataclass(slots=True)
+class SimFill:
+    t: int
+    order_id: int
+    side: str
+    price: float
+    qty: float
+    liquidity: str # "maker" (rested and got hit) / "taker" (crossed on arrival)
+    remaining: float
+
+
+class Backtester:
+    def __init__(
+            self,
+            book: OrderBookEngine,
+            maker: MarketMaker,
+            entry_latency_us: int = 5_000,
+            cancel_latency_us: int = 5_000,
+            feed_latency_us: int = 0,
+            queue_model: str = "proportional",
+            maker_fee_bps: float = 0.0,
+            taker_fee_bps: float = 0.0,
+    ):
+        if queue_model not in ("proportional", "risk_averse"):
+            raise ValueError(f"unknown queue_model {queue_model!r}")
+        self.book = book
+        self.maker = maker
+        self.entry_latency_us = entry_latency_us
+        self.cancel_latency_us = cancel_latency_us
+        self.feed_latency_us = feed_latency_us
+        self.proportional = queue_model == "proportional"
+        self.maker_fee_bps = maker_fee_bps
+        self.taker_fee_bps = taker_fee_bps
+
+        self.now = 0 # µs, exchange time
+        self.active: List[SimOrder] = [] # pending / live / cancel-pending orders
+        self._working: Dict[str, Dict[int, SimOrder]] = {"buy": {}, "sell": {}} # maker order_id → sim order carrying it, per side
+        self._timers: list = [] # heap of (t, seq, action, order)
+        self._seq = 0
+        self._next_id = 1
+
+        self.fills: List[SimFill] = []
+        self.orders_sent = 0
+        self.orders_cancelled = 0
+        self.fees = 0.0
+        self.max_abs_inventory = 0.0
+        self._queue_wait_us = 0
+        self._queue_wait_n = 0
+
+    # ------------------------------------------------------------ event entry
+
+    def on_event(self, ev):
+        t = ev.ts_event_us + self.feed_latency_us
+        if t > self.now:
+            self.now = t
+        if self._timers and self._timers[0][0] <= self.now:
+            self._run_timers(self.now)
+
+        if isinstance(ev, DepthDiff):
+            self._on_depth(ev)
+        elif isinstance(ev, Trade):
+            self._on_trade(ev)
+
+    def finish(self):
+        """ Let every scheduled action that is still in flight happen """
+        if self._timers:
+            self._run_timers(max(t for t, *_ in self._timers))
+
+    # ------------------------------------------------------------ timers
+
+    def _schedule(self, t: int, action: str, order: SimOrder):
+        self._seq += 1
+        heapq.heappush(self._timers, (t, self._seq, action, order))
+
+    def _run_timers(self, until: int):
+        timers = self._timers
+        while timers and timers[0][0] <= until:
+            t, _, action, o = heapq.heappop(timers)
+            if o.state in ("filled", "cancelled"):
+                continue
+            if action == "live":
+                self._go_live(o, t)
+            else: # "cancel"
+                o.state = "cancelled"
+                self.orders_cancelled += 1
+                self.active.remove(o)
+
+    # ------------------------------------------------------------ strategy → orders
+
+    def _send(self, r: RestingOrder):
+        o = SimOrder(self._next_id, r.side, r.price, r.qty, r.qty, self.now, rest=r)
+        self._next_id += 1
+        self.orders_sent += 1
+        self.active.append(o)
+        self._working[r.side][r.order_id] = o
+        self._schedule(self.now + self.entry_latency_us, "live", o)
+
+    def _cancel(self, o: SimOrder):
+        if not o.cancel_requested:
+            o.cancel_requested = True
+            self._schedule(self.now + self.cancel_latency_us, "cancel", o)
+
+    def _sync_quotes(self):
+        # Mirror the maker's resting orders (every ladder level, see order_manager.py): an order the maker
+        # sent gets sent here, one it cancelled / resized is cancelled here, the rest keep their queue spot
+        orders = self.maker.orders
+        for side, resting in (("buy", orders.bids.orders), ("sell", orders.asks.orders)):
+            working = self._working[side]
+            stale = [oid for oid, o in working.items() if resting.get(o.price) is not o.rest]
+            for oid in stale:
+                self._cancel(working.pop(oid))
+            if len(working) < len(resting):
+                for r in resting.values():
+                    if r.order_id not in working:
+                        self._send(r)
+
+    # ------------------------------------------------------------ market data
+
+    def _on_depth(self, diff: DepthDiff):
+        book = self.book
+        live = [o for o in self.active if o.live]
+        before = [(book.bids if o.side == "buy" else book.asks).get(o.price, 0) for o in live]
+
+        book.on_depth_diff(diff)
+
+        for o, old_q in zip(live, before):
+            new_q = (book.bids if o.side == "buy" else book.asks).get(o.price, 0)
+            if new_q < old_q:
+                cancels = (old_q - new_q) - o.traded_at_level # shrink not explained by trades = cancels
+                if self.proportional and cancels > 0 and old_q > 0:
+                    o.queue_ahead -= cancels * o.queue_ahead / old_q # cancels spread evenly over the queue
+                if o.queue_ahead > new_q:
+                    o.queue_ahead = new_q
+            o.traded_at_level = 0.0
+
+        self.maker.on_book_update()
+        if book.synced:
+            self._sync_quotes()
+
+    def _on_trade(self, tr: Trade):
+        for o in list(self.active):
+            if not o.live:
+                continue
+            if o.side == "buy":
+                if tr.taker_side != "sell" or tr.price > o.price:
+                    continue
+                through = tr.price < o.price
+            else:
+                if tr.taker_side != "buy" or tr.price < o.price:
+                    continue
+                through = tr.price > o.price
+
+            if through: # traded through our price → the whole level, us included, is gone
+                self._fill(o, o.remaining, o.price, "maker")
+                continue
+
+            vol = tr.qty
+            if o.queue_ahead >= vol:
+                o.queue_ahead -= vol
+                o.traded_at_level += vol
+                continue
+            left = vol - o.queue_ahead
+            o.traded_at_level += o.queue_ahead
+            o.queue_ahead = 0.0
+            self._fill(o, min(left, o.remaining), o.price, "maker")
+
+    # ------------------------------------------------------------ exchange side
+
+    def _go_live(self, o: SimOrder, t: int):
+        o.live = True
+        o.t_live = t
+        book = self.book
+        if o.side == "buy":
+            # crossing on arrival → take liquidity from the asks up to our price
+            for price, qty in book.asks.top(20):
+                if price > o.price or o.remaining <= EPS:
+                    break
+                self._fill(o, min(qty, o.remaining), price, "taker")
+            o.queue_ahead = book.bids.get(o.price, 0)
+        else:
+            for price, qty in book.bids.top(20):
+                if price < o.price or o.remaining <= EPS:
+                    break
+                self._fill(o, min(qty, o.remaining), price, "taker")
+            o.queue_ahead = book.asks.get(o.price, 0)
+        if o.state == "pending":
+            o.state = "live"
+
+    def _fill(self, o: SimOrder, qty, price, liquidity: str):
+        if qty <= EPS:
+            return
+        maker = self.maker
+        o.remaining -= qty
+        if o.t_first_fill == 0 and liquidity == "maker":
+            o.t_first_fill = self.now
+            self._queue_wait_us += self.now - o.t_live
+            self._queue_wait_n += 1
+        if o.side == "buy":
+            maker.inventory += qty
+            maker.realized_pnl -= price * qty
+        else:
+            maker.inventory -= qty
+            maker.realized_pnl += price * qty
+        inv = abs(self.book.to_qty(maker.inventory))
+        if inv > self.max_abs_inventory:
+            self.max_abs_inventory = inv
+
+        bps = self.maker_fee_bps if liquidity == "maker" else self.taker_fee_bps
+        if bps:
+            self.fees += self.book.to_price(price) * self.book.to_qty(qty) * bps / 10_000
+
+        done = o.remaining <= EPS
+        self.fills.append(SimFill(self.now, o.order_id, o.side, price, qty, liquidity, 0 if done else o.remaining))
+        if done:
+            o.remaining = 0
+            o.state = "filled"
+            self.active.remove(o)
+            self._working[o.side].pop(o.rest.order_id, None)
+        else:
+            o.state = "partial"
+        # like MarketMaker.on_trade: the maker's order shrinks / stops resting, and the next book update requotes the level
+        maker.orders.fill(o.rest, o.rest.remaining if done else qty)
+        maker.refresh_quotes()
+
+    # ------------------------------------------------------------ results
+
+    def report(self) -> dict:
+        book, maker = self.book, self.maker
+        to_p, to_q = book.to_price, book.to_qty
+        s = maker.status()
+        bb, ba = book.best_bid(), book.best_ask()
+        mid = (to_p(bb) + to_p(ba)) / 2 if bb is not None and ba is not None else None
+        buy_vol = sum(to_q(f.qty) for f in self.fills if f.side == "buy")
+        sell_vol = sum(to_q(f.qty) for f in self.fills if f.side == "sell")
+        mtm = s["pnl"] + s["inventory"] * mid if mid is not None else None
+        return {
+            "orders_sent": self.orders_sent,
+            "orders_cancelled": self.orders_cancelled,
+            "fills": len(self.fills),
+            "partial_fills": sum(1 for f in self.fills if f.remaining),
+            "taker_fills": sum(1 for f in self.fills if f.liquidity == "taker"),
+            "buy_volume": round(buy_vol, 8),
+            "sell_volume": round(sell_vol, 8),
+            "inventory": s["inventory"],
+            "max_abs_inventory": round(self.max_abs_inventory, 8),
+            "cash_pnl": s["pnl"],
+            "mark_to_market_pnl": round(mtm, 2) if mtm is not None else None,
+            "fees": round(self.fees, 6),
+            "net_pnl": round(mtm - self.fees, 2) if mtm is not None else None,
+            "avg_queue_wait_ms": round(self._queue_wait_us / self._queue_wait_n / 1000, 3) if self._queue_wait_n else None,
+        }
+
+
+def make_backtester(
+        snapshots: List[dict],
+        symbol: str = "BTCUSDT",
+        tick_spec: Optional[TickSpec] = None,
+        maker_kwargs: Optional[dict] = None,
+        **sim_kwargs,
+) -> Backtester:
+    """ Fresh silent book + maker + Backtester, fed from recorded snapshots """
+    book = OrderBookEngine(symbol, book_side="ticks" if tick_spec else "sorted", tick_spec=tick_spec,
+                           snapshot_provider=RecordedSnapshots(snapshots))
+    book.telemetry = SILENT
+    maker = MarketMaker(book, **(maker_kwargs or {}))
+    maker.telemetry = SILENT
+    return Backtester(book, maker, **sim_kwargs)
+
+
+def run_events(sim: Backtester, events) -> Backtester:
+    """ Run already decoded events (e.g. shared by sweep.py across many configs) """
+    on_event = sim.on_event
+    n = 0
+    t0 = time.perf_counter()
+    for ev in events:
+        on_event(ev)
+        n += 1
+    sim.finish()
+    sim.events = n
+    sim.elapsed_s = time.perf_counter() - t0
+    return sim
+
+
+def run_backtest(
+        path: str,
+        symbol: str = "BTCUSDT",
+        tick_spec: Optional[TickSpec] = None,
+        maker_kwargs: Optional[dict] = None,
+        **sim_kwargs,
+) -> Backtester:
+    # Snapshots first (cheap: frames are skipped without decoding), so the book
+    # can be handed one whenever it asks; frames are then streamed, never held in memory.
+    snapshots = [json.loads(payload) for kind, _, payload in read_feed_log(path) if kind == REC_SNAPSHOT]
+    decoder = MarketDecoder(expect_microseconds=True, tick_specs={symbol: tick_spec} if tick_spec else None)
+    sim = make_backtester(snapshots, symbol, tick_spec, maker_kwargs, **sim_kwargs)
+    parse = decoder.parse_frame
+    frames = (parse(payload, ts_recv_us) for kind, ts_recv_us, payload in read_feed_log(path) if kind == REC_FRAME)
+    return run_events(sim, (ev for ev in frames if ev is not None))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Backtest MarketMaker on a recorded feed log")
+    ap.add_argument("path")
+    ap.add_argument("--symbol", default="BTCUSDT")
+    ap.add_argument("--ticks", action="store_true", help="integer tick mode")
+    ap.add_argument("--entry-latency-us", type=int, default=5_000)
+    ap.add_argument("--cancel-latency-us", type=int, default=5_000)
+    ap.add_argument("--feed-latency-us", type=int, default=0)
+    ap.add_argument("--queue-model", choices=("proportional", "risk_averse"), default="proportional")
+    ap.add_argument("--maker-fee-bps", type=float, default=0.0)
+    ap.add_argument("--taker-fee-bps", type=float, default=0.0)
+    ap.add_argument("--fills-csv", help="write every fill to this CSV file")
+    args = ap.parse_args()
+
+    sym = args.symbol.upper()
+    sim = run_backtest(
+        args.path, symbol=sym, tick_spec=TICK_SPECS[sym] if args.ticks else None,
+        entry_latency_us=args.entry_latency_us, cancel_latency_us=args.cancel_latency_us,
+        feed_latency_us=args.feed_latency_us, queue_model=args.queue_model,
+        maker_fee_bps=args.maker_fee_bps, taker_fee_bps=args.taker_fee_bps,
+    )
+    print(f"{'events':>20}: {sim.events}")
+    print(f"{'events_per_s':>20}: {sim.events / sim.elapsed_s:,.0f}")
+    for k, v in sim.report().items():
+        print(f"{k:>20}: {v}")
+
+    if args.fills_csv:
+        to_p, to_q = sim.book.to_price, sim.book.to_qty
+        with open(args.fills_csv, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["ts_us", "order_id", "side", "price", "qty", "liquidity", "remaining"])
+            for fl in sim.fills:
+                w.writerow([fl.t, fl.order_id, fl.side, to_p(fl.price), to_q(fl.qty), fl.liquidity, to_q(fl.remaining)])
+
+
+if __name__ == "__main__":
+    main()
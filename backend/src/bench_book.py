@@ -0,0 +1,97 @@
+"""
+Benchmark: dict book side vs sorted price ladder vs integer-tick array.
+
+Runs the same synthetic stream of depth diffs through OrderBookEngine with each
+backend, calling best_bid()/best_ask()/spread() after every diff like
+MarketMaker.on_book_update does, and checks every book ends up identical.
+
+    python bench_book.py [levels] [diffs]
+"""
+import random
+import sys
+import time
+
+from market_handler import DepthDiff
+from order_book_engine import OrderBookEngine
+from ticks import TICK_SPECS
+
+SPEC = TICK_SPECS["BTCUSDT"]
+
+
+def make_diffs(levels: int, n_diffs: int, seed: int = 7):
+    """ Deterministic diffs around a 90000.0 mid, 0.1 tick, mostly near the touch """
+    rnd = random.Random(seed)
+    diffs = []
+    uid = 1
+    for _ in range(n_diffs):
+        bids, asks = [], []
+        for _ in range(rnd.randint(1, 20)):
+            depth = int(rnd.expovariate(1 / (levels / 10))) % levels # near-touch heavy
+            qty = 0.0 if rnd.random() < 0.3 else round(rnd.uniform(0.001, 5.0), 3)
+            if rnd.random() < 0.5:
+                bids.append((round(90000.0 - depth * 0.1, 1), qty))
+            else:
+                asks.append((round(90000.1 + depth * 0.1, 1), qty))
+        diffs.append(DepthDiff("depth_diff", 0, 0, "BTCUSDT", uid, uid, uid - 1, bids, asks))
+        uid += 1
+    return diffs
+
+
+def to_tick_diffs(diffs):
+    """ Same diffs with prices/qtys as int ticks/lots (what the decoder emits in tick mode) """
+    pt, ql = SPEC.price_to_ticks_f, SPEC.qty_to_lots_f
+    return [
+        DepthDiff(d.etype, d.ts_event_us, d.ts_recv_us, d.symbol, d.U, d.u, d.pu,
+                  [(pt(p), ql(q)) for p, q in d.bids], [(pt(p), ql(q)) for p, q in d.asks])
+        for d in diffs
+    ]
+
+
+def seeded_book(book_side: str, levels: int) -> OrderBookEngine:
+    spec = SPEC if book_side == "ticks" else None
+    book = OrderBookEngine("BTCUSDT", book_side=book_side, tick_spec=spec)
+    for i in range(levels):
+        bid, ask = round(90000.0 - i * 0.1, 1), round(90000.1 + i * 0.1, 1)
+        if spec:
+            bid, ask = spec.price_to_ticks_f(bid), spec.price_to_ticks_f(ask)
+        book.bids[bid] = spec.qty_to_lots_f(1.0) if spec else 1.0
+        book.asks[ask] = spec.qty_to_lots_f(1.0) if spec else 1.0
+    book.last_update_id = 0
+    book.snapshot_loaded = True
+    book.synced = True
+    return book
+
+
+def run(book_side: str, levels: int, diffs):
+    book = seeded_book(book_side, levels)
+    t0 = time.perf_counter()
+    for d in diffs:
+        book.on_depth_diff(d)
+        book.best_bid()
+        book.best_ask()
+        book.spread()
+    dt = time.perf_counter() - t0
+    return book, dt
+
+
+def main():
+    levels = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    n_diffs = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    diffs = make_diffs(levels, n_diffs)
+    tick_diffs = to_tick_diffs(diffs)
+
+    results = {}
+    for side in ("dict", "sorted", "ticks"):
+        book, dt = run(side, levels, tick_diffs if side == "ticks" else diffs)
+        results[side] = book
+        print(f"{side:>6}: {n_diffs / dt:>12,.0f} diffs/s  {dt / n_diffs * 1e9:>10,.0f} ns/diff  ({len(book.bids)}b/{len(book.asks)}a levels)")
+
+    def as_floats(book):
+        return [[(book.to_price(p), book.to_qty(q)) for p, q in side.levels()] for side in (book.bids, book.asks)]
+
+    ref = as_floats(results["dict"])
+    print("books identical:", all(as_floats(b) == ref for b in results.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""
+Benchmark suite for the hot paths: decoder, book engine, market maker, and the whole pipeline.
+
+Every stage runs over the same deterministic corpus of Binance-shaped frames
+(same layout as exchange_sim.py), generated from a seed, for each book depth:
+
+    decode.parse_frame      MarketDecoder.parse_frame (json.loads + parse_combined)
+    book.apply_diff         OrderBookEngine._apply_diff
+    book.on_depth_diff      OrderBookEngine.on_depth_diff (id checks + apply)
+    book.best_bid_ask       best_bid() + best_ask() after every diff
+    maker.on_book_update    MarketMaker.on_book_update after every diff
+    maker.on_trade          MarketMaker.on_trade on every trade
+    pipeline                raw frame → parse_frame → handle_event (book + maker), like data_feed
+
+For each one it reports events/s and ns/event (best of --repeat runs), then
+makes one more pass under tracemalloc for memory per event:
+  alloc B/ev  peak bytes allocated during the call (temporaries included)
+  kept B/ev   bytes still allocated after it (what the book/maker keeps)
+Python doesn't expose a count of allocations, so bytes are what we compare.
+
+Stages that need the book to move between calls (best_bid_ask, maker.*) do
+that work untimed and time each call on its own, minus the timer's own cost.
+
+    python bench_suite.py                                  # 100 / 1000 / 5000 levels
+    python bench_suite.py --levels 1000 --events 50000 --ticks
+    python bench_suite.py --save bench_baseline.json       # record a baseline
+    python bench_suite.py --compare bench_baseline.json    # flag regressions (exit code 1)
+"""
+import argparse
+import gc
+import hashlib
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from data_feed import handle_event
+from exchange_sim import depth_frame, trade_frame
+from market_handler import DepthDiff, MarketDecoder
+from market_maker import MarketMaker
+from order_book_engine import OrderBookEngine
+from telemetry import SILENT
+from ticks import TICK_SPECS
+
+SYMBOL = "BTCUSDT"
+MID_TICKS = 9_000_000 # 90000.00 at 0.01
+
+
+class Corpus:
+    """
+    Deterministic session for one book depth: a REST snapshot with `levels` per
+    side around 90000.00 and `events` frames after it (~80% depth diffs, ~20% trades).
+
+    Diffs are what a 100ms BTCUSDT diff looks like: 0-25 levels per side, mostly
+    near the touch with a tail across the whole depth, ~30% deletes.
+    """
+
+    def __init__(self, levels: int, events: int = 20000, seed: int = 17):
+        self.levels = levels
+        rnd = random.Random(seed * 1_000_003 + levels)
+
+        def fmt(t):
+            return f"{t / 100:.2f}"
+
+        def qty():
+            return f"{rnd.expovariate(1.0):.5f}"
+
+        bids = {MID_TICKS - 1 - i: qty() for i in range(levels)}
+        asks = {MID_TICKS + i: qty() for i in range(levels)}
+        uid = 1_000_000
+        self.snapshot = {
+            "lastUpdateId": uid,
+            "bids": [[fmt(p), q] for p, q in bids.items()],
+            "asks": [[fmt(p), q] for p, q in asks.items()],
+        }
+
+        frames = []
+        ts = 1_700_000_000_000_000
+        trade_id = 0
+        n_levels = 0
+        for _ in range(events):
+            ts += rnd.randint(200, 20000)
+            if rnd.random() < 0.2:
+                sell = rnd.random() < 0.5 # taker sells into the best bid
+                price = max(bids) if sell else min(asks)
+                trade_id += 1
+                frames.append(trade_frame(SYMBOL, ts, trade_id, fmt(price), f"{rnd.expovariate(50):.5f}", sell))
+                continue
+            b, a = [], []
+            for side, levels_out, sign, base in ((bids, b, -1, MID_TICKS - 1), (asks, a, 1, MID_TICKS)):
+                for _ in range(rnd.randint(0, 25)):
+                    off = int(rnd.expovariate(1 / 8)) if rnd.random() < 0.8 else rnd.randrange(levels)
+                    p = base + sign * off
+                    if rnd.random() < 0.3 and p in side:
+                        del side[p]
+                        levels_out.append([fmt(p), "0.00000000"])
+                    else:
+                        side[p] = q = qty()
+                        levels_out.append([fmt(p), q])
+                if not side: # never leave a side empty
+                    side[base] = q = qty()
+                    levels_out.append([fmt(base), q])
+            n_levels += len(b) + len(a)
+            U = uid + 1
+            uid = U + rnd.randint(0, 3) # ids advance by more than one per event, like Binance
+            frames.append(depth_frame(SYMBOL, ts, U, uid, b, a))
+
+        self.frames: List[str] = frames
+        self.diff_levels = n_levels
+        self.digest = hashlib.sha1("\n".join(frames).encode()).hexdigest()[:12]
+
+    def decode(self, dec: MarketDecoder) -> list:
+        return [dec.parse_frame(raw, 0) for raw in self.frames]
+
+
+# ---------------------------------------------------------------- stages
+#
+# A stage factory builds fresh state and returns (steps, per_call):
+#   steps     list of (untimed, timed, arg); either callable may be None
+#   per_call  time each call on its own (needed when untimed work sits in between)
+
+
+def _book(corpus: Corpus, spec, book_side: str) -> OrderBookEngine:
+    book = OrderBookEngine(SYMBOL, book_side=book_side, tick_spec=spec)
+    book.telemetry = SILENT
+    book.apply_snapshot(corpus.snapshot)
+    book.snapshot_loaded = True
+    book.synced = True # the corpus follows on from the snapshot
+    return book
+
+
+def _maker(book: OrderBookEngine) -> MarketMaker:
+    maker = MarketMaker(book)
+    maker.telemetry = SILENT
+    return maker
+
+
+def make_stages(corpus: Corpus, spec, book_side: str) -> Dict[str, Callable]:
+    dec = MarketDecoder(expect_microseconds=True, tick_specs={SYMBOL: spec} if spec else None)
+    events = corpus.decode(dec)
+    diffs = [ev for ev in events if isinstance(ev, DepthDiff)]
+
+    def parse_frame():
+        return [(None, lambda raw: dec.parse_frame(raw, 0), raw) for raw in corpus.frames], False
+
+    def apply_diff():
+        book = _book(corpus, spec, book_side)
+        return [(None, book._apply_diff, d) for d in diffs], False
+
+    def on_depth_diff():
+        book = _book(corpus, spec, book_side)
+        return [(None, book.on_depth_diff, d) for d in diffs], False
+
+    def best_bid_ask():
+        book = _book(corpus, spec, book_side)
+        bb, ba = book.best_bid, book.best_ask
+        return [(book._apply_diff, lambda d: (bb(), ba()), d) for d in diffs], True
+
+    def on_book_update():
+        book = _book(corpus, spec, book_side)
+        maker = _maker(book)
+        update = maker.on_book_update
+        return [(book.on_depth_diff, lambda d: update(), ev) if isinstance(ev, DepthDiff) else (maker.on_trade, None, ev)
+                for ev in events], True
+
+    def on_trade():
+        book = _book(corpus, spec, book_side)
+        maker = _maker(book)
+
+        def book_update(d):
+            book.on_depth_diff(d)
+            maker.on_book_update()
+
+        return [(book_update, None, ev) if isinstance(ev, DepthDiff) else (None, maker.on_trade, ev)
+                for ev in events], True
+
+    def pipeline():
+        book = _book(corpus, spec, book_side)
+        maker = _maker(book)
+        parse = dec.parse_frame
+        return [(None, lambda raw: handle_event(parse(raw, 0), book, maker), raw) for raw in corpus.frames], False
+
+    return {
+        "decode.parse_frame": parse_frame,
+        "book.apply_diff": apply_diff,
+        "book.on_depth_diff": on_depth_diff,
+        "book.best_bid_ask": best_bid_ask,
+        "maker.on_book_update": on_book_update,
+        "maker.on_trade": on_trade,
+        "pipeline": pipeline,
+    }
+
+
+# ---------------------------------------------------------------- measuring
+
+def timer_overhead_ns(n: int = 200_000) -> float:
+    """ Cost of one perf_counter_ns() pair around nothing (subtracted from per-call timings) """
+    now = time.perf_counter_ns
+    best = float("inf")
+    for _ in range(5):
+        total = 0
+        for _ in range(n):
+            t = now()
+            total += now() - t
+        best = min(best, total / n)
+    return best
+
+
+def _time(steps, per_call: bool, overhead_ns: float):
+    """ (timed calls, ns) for one run, with the GC off like timeit """
+    gc.collect()
+    gc.disable()
+    try:
+        return _time_run(steps, per_call, overhead_ns)
+    finally:
+        gc.enable()
+
+
+def _time_run(steps, per_call: bool, overhead_ns: float):
+    if not per_call:
+        t0 = time.perf_counter_ns()
+        for _, fn, arg in steps:
+            fn(arg)
+        return len(steps), time.perf_counter_ns() - t0
+    now = time.perf_counter_ns
+    n = total = 0
+    for pre, fn, arg in steps:
+        if pre is not None:
+            pre(arg)
+        if fn is not None:
+            t = now()
+            fn(arg)
+            total += now() - t
+            n += 1
+    return n, max(0.0, total - n * overhead_ns)
+
+
+def _alloc(steps, limit: int):
+    """ (alloc bytes/call, kept bytes/call) over the first `limit` timed calls, under tracemalloc """
+    traced = tracemalloc.get_traced_memory
+    reset_peak = tracemalloc.reset_peak
+    n = peak_sum = kept_sum = 0
+    tracemalloc.start()
+    try:
+        for pre, fn, arg in steps:
+            if pre is not None:
+                pre(arg)
+            if fn is None:
+                continue
+            cur0 = traced()[0]
+            reset_peak()
+            fn(arg)
+            cur1, peak = traced()
+            peak_sum += peak - cur0
+            kept_sum += cur1 - cur0
+            n += 1
+            if n >= limit:
+                break
+    finally:
+        tracemalloc.stop()
+    return (peak_sum / n, kept_sum / n) if n else (0.0, 0.0)
+
+
+def measure(factory: Callable, repeat: int, alloc_events: int, overhead_ns: float) -> dict:
+    best_ns = float("inf")
+    n = 0
+    for _ in range(repeat):
+        steps, per_call = factory()
+        n, ns = _time(steps, per_call, overhead_ns)
+        best_ns = min(best_ns, ns)
+    steps, _ = factory()
+    alloc_b, kept_b = _alloc(steps, alloc_events)
+    ns_ev = best_ns / n if n else 0.0
+    return {
+        "events": n,
+        "ev_s": round(1e9 / ns_ev) if ns_ev else None,
+        "ns_ev": round(ns_ev, 1),
+        "alloc_b_ev": round(alloc_b, 1),
+        "kept_b_ev": round(kept_b, 1),
+    }
+
+
+def run_suite(levels_list: List[int], events: int, ticks: bool, book_side: Optional[str], repeat: int,
+              alloc_events: int, stages: Optional[List[str]] = None, seed: int = 17, out=print) -> dict:
+    spec = TICK_SPECS[SYMBOL] if ticks else None
+    side = "ticks" if ticks else (book_side or "sorted")
+    mode = f"{'ticks' if ticks else 'float'}/{side}"
+    overhead = timer_overhead_ns()
+    results = {}
+    corpora = {}
+    for levels in levels_list:
+        corpus = Corpus(levels, events, seed)
+        corpora[str(levels)] = corpus.digest
+        n_diffs = sum(1 for raw in corpus.frames if "@depth" in raw[:40])
+        out(f"\n[{mode}] {levels} levels, {events} events ({n_diffs} diffs, {corpus.diff_levels / max(n_diffs, 1):.1f} levels/diff, "
+            f"{events - n_diffs} trades) corpus={corpus.digest}")
+        for name, factory in make_stages(corpus, spec, side).items():
+            if stages and not any(name.startswith(s) for s in stages):
+                continue
+            r = measure(factory, repeat, alloc_events, overhead)
+            results[f"{name}@{levels}"] = r
+            out(f"  {name:<22}{r['ev_s'] or 0:>12,} ev/s{r['ns_ev']:>10,.0f} ns/ev"
+                f"{r['alloc_b_ev']:>10,.0f} alloc B/ev{r['kept_b_ev']:>9,.0f} kept B/ev")
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "mode": mode,
+            "events": events,
+            "seed": seed,
+            "repeat": repeat,
+            "corpus": corpora,
+            "timer_overhead_ns": round(overhead, 1),
+        },
+        "results": results,
+    }
+
+
+# ---------------------------------------------------------------- baselines
+
+def compare(current: dict, baseline: dict, threshold: float = 0.15, alloc_slack_b: float = 64.0, out=print) -> List[str]:
+    """
+    Regressions of `current` against `baseline`: ns/event up by more than
+    `threshold`, or alloc bytes/event up by more than `threshold` + alloc_slack_b.
+    """
+    cm, bm = current["meta"], baseline["meta"]
+    for key in ("python", "machine", "mode", "events", "seed"):
+        if cm.get(key) != bm.get(key):
+            out(f"[WARN] baseline {key}={bm.get(key)!r}, now {cm.get(key)!r}: numbers may not be comparable")
+    for levels, digest in cm["corpus"].items():
+        base_digest = bm.get("corpus", {}).get(levels)
+        if base_digest is not None and base_digest != digest:
+            out(f"[WARN] corpus for {levels} levels changed since the baseline ({base_digest} → {digest})")
+
+    regressions = []
+    out(f"\n{'stage':<30}{'base ns/ev':>12}{'now ns/ev':>12}{'Δ':>9}{'base B/ev':>11}{'now B/ev':>10}")
+    for key, r in current["results"].items():
+        b = baseline["results"].get(key)
+        if b is None:
+            out(f"{key:<30}{'-':>12}{r['ns_ev']:>12,.0f}{'new':>9}")
+            continue
+        d = r["ns_ev"] / b["ns_ev"] - 1 if b["ns_ev"] else 0.0
+        flags = []
+        if d > threshold:
+            flags.append("SLOWER")
+        if r["alloc_b_ev"] > b["alloc_b_ev"] * (1 + threshold) + alloc_slack_b:
+            flags.append("MORE ALLOC")
+        if flags:
+            regressions.append(f"{key}: {' + '.join(flags)}")
+        out(f"{key:<30}{b['ns_ev']:>12,.0f}{r['ns_ev']:>12,.0f}{d:>+9.1%}{b['alloc_b_ev']:>11,.0f}{r['alloc_b_ev']:>10,.0f}"
+            f"{'  ' + ' + '.join(flags) if flags else ''}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Hot-path benchmarks: decoder, book, maker, pipeline")
+    ap.add_argument("--levels", default="100,1000,5000", help="book depths, comma separated")
+    ap.add_argument("--events", type=int, default=20000)
+    ap.add_argument("--ticks", action="store_true", help="integer tick mode (tick-array book)")
+    ap.add_argument("--book-side", choices=("sorted", "dict"), default="sorted", help="float mode backend")
+    ap.add_argument("--repeat", type=int, default=5, help="timed runs per stage (best is kept)")
+    ap.add_argument("--alloc-events", type=int, default=5000, help="calls traced per stage for memory")
+    ap.add_argument("--stage", action="append", help="only stages starting with this (repeatable), e.g. book")
+    ap.add_argument("--seed", type=int, default=17)
+    ap.add_argument("--save", help="write the results as a baseline JSON")
+    ap.add_argument("--compare", help="baseline JSON to check against")
+    ap.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown before flagging (0.15 = 15%%)")
+    args = ap.parse_args()
+
+    current = run_suite([int(x) for x in args.levels.split(",")], args.events, args.ticks, args.book_side,
+                        args.repeat, args.alloc_events, args.stage, args.seed)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\nbaseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s):")
+            for r in regressions:
+                print("  " + r)
+            sys.exit(1)
+        print("\nno regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import asyncio
+import mmap
+import os
+import struct
+import time
+import zlib
+from array import array
+from typing import Optional
+
+from order_book_engine import OrderBookEngine
+
+# Book checkpoints in a memory-mapped file, for warm restarts.
+#
+# Every `interval_s` the top `depth` levels of each side plus last_update_id are
+# copied into a fixed-layout file:
+#
+#   header  magic "MMBOOK01" | version u16 | mode u16 (0 float, 1 ticks) | symbol 16s |
+#           depth u32 | seq u64 | last_update_id i64 | n_bids u32 | n_asks u32 |
+#           crc32 u32 | written_at f64 | pad
+#   levels  depth × (price, qty) bids, best first, then depth × (price, qty) asks
+#           (f64 in float mode, i64 in tick mode)
+#
+# seq is odd while a write is in progress and the crc covers the levels, so a
+# checkpoint torn by a crash is simply rejected.
+#
+# On startup restore() maps the file, validates it and installs it in the book
+# like a snapshot. The first live diffs then either bridge it
+# (U <= last_update_id + 1 <= u, the usual rule) and the maker can quote right
+# away, or they can't, and the book falls back to a REST snapshot as it always does.
+
+MAGIC = b"MMBOOK01"
+VERSION = 1
+HEADER = struct.Struct("<8sHH16sIQqIIId4x") # padded to 72 bytes so the levels are 8-byte aligned
+
+
+def checkpoint_size(depth: int) -> int:
+    return HEADER.size + depth * 4 * 8
+
+
+class BookCheckpoint:
+    def __init__(
+            self,
+            book: OrderBookEngine,
+            path: str,
+            depth: int = 1000, # levels per side (same as the REST snapshot limit)
+            interval_s: float = 1.0,
+            max_age_s: Optional[float] = 300.0, # older checkpoints can't bridge anyway → don't even try
+    ):
+        self.book = book
+        self.path = path
+        self.depth = depth
+        self.interval_s = interval_s
+        self.max_age_s = max_age_s
+        self._ticks = book.tick_spec is not None
+        self._fmt = "q" if self._ticks else "d"
+        self._mm: Optional[mmap.mmap] = None
+        self._task: Optional[asyncio.Task] = None
+        self._seq = 0
+
+        # counters
+        self.writes = 0
+        self.last_write_s: Optional[float] = None # duration of the last checkpoint
+        self.restored_from: Optional[int] = None # last_update_id of the checkpoint we started from
+
+    # ---- file
+
+    def _open(self) -> mmap.mmap:
+        if self._mm is None:
+            size = checkpoint_size(self.depth)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size != size: # new file or different depth → fresh layout
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                self._mm = mmap.mmap(fd, size)
+            finally:
+                os.close(fd) # the mapping keeps the file open
+        return self._mm
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._mm = None
+
+    # ---- write side
+
+    def write(self) -> bool:
+        """ Checkpoint the book now. Skipped (False) while the book isn't synced """
+        book = self.book
+        if not book.synced or book.last_update_id is None:
+            return False
+        t0 = time.perf_counter()
+        mm = self._open()
+        depth = self.depth
+        bids = book.bids.top(depth)
+        asks = book.asks.top(depth)
+
+        levels = memoryview(mm)[HEADER.size:].cast(self._fmt)
+        try:
+            self._seq += 1 # odd → write in progress
+            self._pack_header(mm, book.last_update_id, len(bids), len(asks), 0)
+            flat = array(self._fmt, [x for level in bids for x in level])
+            levels[:len(flat)] = flat
+            flat = array(self._fmt, [x for level in asks for x in level])
+            levels[2 * depth:2 * depth + len(flat)] = flat
+        finally:
+            levels.release()
+        crc = zlib.crc32(memoryview(mm)[HEADER.size:])
+        self._seq += 1 # even → complete
+        self._pack_header(mm, book.last_update_id, len(bids), len(asks), crc)
+
+        self.writes += 1
+        self.last_write_s = time.perf_counter() - t0
+        return True
+
+    def _pack_header(self, mm, last_update_id: int, n_bids: int, n_asks: int, crc: int):
+        HEADER.pack_into(mm, 0, MAGIC, VERSION, int(self._ticks), self.book.symbol.encode()[:16],
+                         self.depth, self._seq, last_update_id, n_bids, n_asks, crc, time.time())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval_s)
+            self.write() # runs on the loop thread, between events → always a consistent book
+
+    def start(self) -> asyncio.Task:
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.write() # last state on the way out
+        self.close()
+
+    # ---- read side
+
+    def load(self) -> Optional[tuple]:
+        """ (last_update_id, bids, asks) from the file, or None if it is missing / invalid / too old """
+        try:
+            with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if len(mm) < HEADER.size:
+                    return None
+                magic, version, mode, symbol, depth, seq, last_update_id, n_bids, n_asks, crc, written_at = HEADER.unpack_from(mm, 0)
+                if magic != MAGIC or version != VERSION or seq % 2:
+                    return None
+                if symbol.rstrip(b"\0").decode() != self.book.symbol or mode != int(self._ticks):
+                    return None
+                if len(mm) != checkpoint_size(depth) or zlib.crc32(memoryview(mm)[HEADER.size:]) != crc:
+                    return None
+                if self.max_age_s is not None and time.time() - written_at > self.max_age_s:
+                    return None
+                levels = array(self._fmt, mm[HEADER.size:])
+        except (FileNotFoundError, ValueError): # ValueError: empty file can't be mapped
+            return None
+        bids = list(zip(levels[0:2 * n_bids:2], levels[1:2 * n_bids:2]))
+        asks = list(zip(levels[2 * depth:2 * depth + 2 * n_asks:2], levels[2 * depth + 1:2 * depth + 2 * n_asks:2]))
+        return last_update_id, bids, asks
+
+    def restore(self) -> bool:
+        """ Warm start: install the checkpoint in the book (call before the first diff) """
+        ckpt = self.load()
+        if ckpt is None:
+            return False
+        last_update_id, bids, asks = ckpt
+        self.book.restore_levels(bids, asks, last_update_id)
+        self.restored_from = last_update_id
+        return True
+
+    def status(self) -> dict:
+        return {
+            "writes": self.writes,
+            "last_write_ms": round(self.last_write_s * 1000, 3) if self.last_write_s is not None else None,
+            "restored_from": self.restored_from,
+        }
@@ -0,0 +1,439 @@
+import sys
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# One "side" of the order book (all bids, or all asks).
+# OrderBookEngine only talks to a side through this small interface:
+#   side[price] = qty        -> add / replace a level
+#   side.pop(price, None)    -> remove a level
+#   side.best()              -> best price (highest bid / lowest ask) or None
+#   side.top(n)              -> first n levels, best first, as (price, qty)
+#   side.next_worse(price)   -> nearest level strictly behind `price` (or None)
+#   side.next_better(price)  -> nearest level strictly in front of `price` (or None)
+#   side.drop_worse(price)   -> remove every level strictly behind `price`, returns how many (depth window)
+#   side.nbytes()            -> rough memory footprint in bytes (containers + price/qty objects)
+# plus the usual dict things (len, in, get, keys, items, clear).
+# That keeps _apply_diff exactly the same no matter which backend is plugged in.
+
+
+class DictBookSide(dict):
+    """
+    Original backend: a plain dict. Updates are O(1) but best() scans every level.
+    Kept around as the reference implementation and for benchmarks.
+    """
+
+    def __init__(self, is_bid: bool):
+        super().__init__()
+        self.is_bid = is_bid
+
+    def best(self) -> Optional[float]:
+        if not self:
+            return None
+        return max(self.keys()) if self.is_bid else min(self.keys())
+
+    def top(self, n: int) -> List[Tuple[float, float]]:
+        prices = sorted(self.keys(), reverse=self.is_bid)[:n]
+        return [(p, self[p]) for p in prices]
+
+    def levels(self) -> Iterator[Tuple[float, float]]: # every level, best first
+        for p in sorted(self.keys(), reverse=self.is_bid):
+            yield p, self[p]
+
+    def next_worse(self, price: float) -> Optional[float]: # scans every level, like best()
+        if self.is_bid:
+            return max((p for p in self.keys() if p < price), default=None)
+        return min((p for p in self.keys() if p > price), default=None)
+
+    def next_better(self, price: float) -> Optional[float]:
+        if self.is_bid:
+            return min((p for p in self.keys() if p > price), default=None)
+        return max((p for p in self.keys() if p < price), default=None)
+
+    def drop_worse(self, price: float) -> int:
+        far = [p for p in self.keys() if (p < price if self.is_bid else p > price)]
+        if len(far) > len(self) // 2: # a dict never shrinks its table on delete → rebuild it
+            kept = {p: q for p, q in self.items() if not (p < price if self.is_bid else p > price)}
+            self.clear()
+            self.update(kept)
+        else:
+            for p in far:
+                del self[p]
+        return len(far)
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self) + sum(sys.getsizeof(p) + sys.getsizeof(q) for p, q in self.items())
+
+
+class SortedBookSide:
+    """
+    Sorted price ladder: a dict (price -> qty) plus a sorted list of prices.
+
+    The list is oriented so the BEST price is always the LAST element:
+      bids -> ascending  [..., 90104.9, 90105.0]   best = highest
+      asks -> descending [..., 90106.3, 90106.2]   best = lowest
+    so best() is O(1) (keys[-1]) and finding where a price goes is a
+    binary search, O(log n). Most diffs touch levels near the top of the book,
+    i.e. near the end of the list, so inserting/removing there only shifts
+    a handful of entries.
+    """
+
+    __slots__ = ("is_bid", "_qty", "_keys")
+
+    def __init__(self, is_bid: bool):
+        self.is_bid = is_bid
+        self._qty: Dict[float, float] = {} # price -> quantity
+        self._keys: List[float] = [] # sorted prices (asks stored negated, so one ascending list works for both sides)
+
+    def _key(self, price: float) -> float:
+        # asks are stored as -price so that the lowest ask ends up last in an ascending list
+        return price if self.is_bid else -price
+
+    def __setitem__(self, price: float, qty: float):
+        if price not in self._qty: # new level → insert its price in sorted position
+            keys = self._keys
+            k = self._key(price)
+            keys.insert(bisect_left(keys, k), k)
+        self._qty[price] = qty # existing level → only the quantity changes
+
+    def __getitem__(self, price: float) -> float:
+        return self._qty[price]
+
+    def __delitem__(self, price: float):
+        del self._qty[price]
+        keys = self._keys
+        k = self._key(price)
+        del keys[bisect_left(keys, k)]
+
+    def pop(self, price: float, default=None):
+        if price not in self._qty:
+            return default
+        qty = self._qty[price]
+        del self[price]
+        return qty
+
+    def get(self, price: float, default=None):
+        return self._qty.get(price, default)
+
+    def __contains__(self, price: float) -> bool:
+        return price in self._qty
+
+    def __len__(self) -> int:
+        return len(self._qty)
+
+    def __bool__(self) -> bool:
+        return bool(self._qty)
+
+    def __iter__(self):
+        return iter(self._qty)
+
+    def keys(self):
+        return self._qty.keys()
+
+    def items(self):
+        return self._qty.items()
+
+    def clear(self):
+        self._qty.clear()
+        self._keys.clear()
+
+    def best(self) -> Optional[float]:
+        if not self._keys:
+            return None
+        k = self._keys[-1]
+        return k if self.is_bid else -k
+
+    def top(self, n: int) -> List[Tuple[float, float]]:
+        # walk backwards from the end of the list = best price first
+        qty = self._qty
+        out = []
+        for k in reversed(self._keys[-n:] if n > 0 else []):
+            p = k if self.is_bid else -k
+            out.append((p, qty[p]))
+        return out
+
+    def levels(self) -> Iterator[Tuple[float, float]]: # every level, best first
+        qty = self._qty
+        for k in reversed(self._keys):
+            p = k if self.is_bid else -k
+            yield p, qty[p]
+
+    def next_worse(self, price: float) -> Optional[float]:
+        # worse = further from the end of the list; `price` itself doesn't have to be a level
+        i = bisect_left(self._keys, self._key(price))
+        if i == 0:
+            return None
+        k = self._keys[i - 1]
+        return k if self.is_bid else -k
+
+    def next_better(self, price: float) -> Optional[float]:
+        keys = self._keys
+        i = bisect_right(keys, self._key(price))
+        if i == len(keys):
+            return None
+        k = keys[i]
+        return k if self.is_bid else -k
+
+    def drop_worse(self, price: float) -> int:
+        # worst levels are at the front of the list → one slice delete
+        keys = self._keys
+        i = bisect_left(keys, self._key(price))
+        qty = self._qty
+        if i > len(keys) // 2: # most of the side goes: rebuild, a dict never shrinks its table on delete
+            del keys[:i]
+            self._qty = {p: qty[p] for p in ((k if self.is_bid else -k) for k in keys)}
+        else:
+            for k in keys[:i]:
+                del qty[k if self.is_bid else -k]
+            del keys[:i]
+        return i
+
+    def nbytes(self) -> int:
+        size = sys.getsizeof(self._qty) + sys.getsizeof(self._keys)
+        size += sum(sys.getsizeof(p) + sys.getsizeof(q) for p, q in self._qty.items())
+        if not self.is_bid: # negated ask keys are separate objects (bid keys are the dict's own)
+            size += sum(sys.getsizeof(k) for k in self._keys)
+        return size
+
+
+class TickArrayBookSide:
+    """
+    Array-backed side for integer-tick books (see ticks.py).
+
+    Prices are ints, so a level lives at index (price - base) of a plain list of
+    quantities: set/remove are one list write, best() is O(1) (cached), and when
+    the best level is removed we walk to the next non-empty slot, which is
+    usually only a few ticks away.
+
+    The array covers a fixed window of `window` ticks around the touch. Levels
+    outside the window (far from the best price) go into a small dict and are
+    moved back in when the window re-centres. A quantity of 0 means "no level".
+    """
+
+    __slots__ = ("is_bid", "window", "_qty", "_base", "_count", "_best", "_far")
+
+    def __init__(self, is_bid: bool, window: int = 1 << 16):
+        self.is_bid = is_bid
+        self.window = window
+        self._qty: List[int] = [] # quantity per tick, index = price - _base
+        self._base: int = 0
+        self._count = 0 # non-empty slots in the array
+        self._best: Optional[int] = None # best price in the array
+        self._far: Dict[int, int] = {} # levels outside the window
+
+    def _recentre(self, price: int):
+        # Put `price` near the edge of the window that the touch moves towards,
+        # leaving most of the window for the levels behind it.
+        levels = dict(self.items())
+        cap = self.window
+        self._base = price - cap + cap // 8 if self.is_bid else price - cap // 8
+        self._qty = [0] * cap
+        self._count = 0
+        self._best = None
+        self._far = {}
+        for p, q in levels.items():
+            self._set(p, q)
+
+    def _set(self, price: int, qty: int):
+        i = price - self._base
+        if 0 <= i < len(self._qty):
+            arr = self._qty
+            if not arr[i]:
+                self._count += 1
+            arr[i] = qty
+            best = self._best
+            if best is None or (price > best if self.is_bid else price < best):
+                self._best = price
+        else:
+            self._far[price] = qty
+
+    def __setitem__(self, price: int, qty: int):
+        i = price - self._base
+        if not (0 <= i < len(self._qty)):
+            best = self.best()
+            if best is None or (price > best if self.is_bid else price < best):
+                self._recentre(price) # new best outside the window → move the window
+        self._set(price, qty)
+
+    def __getitem__(self, price: int) -> int:
+        qty = self.get(price)
+        if qty is None:
+            raise KeyError(price)
+        return qty
+
+    def pop(self, price: int, default=None):
+        i = price - self._base
+        arr = self._qty
+        if not (0 <= i < len(arr)):
+            return self._far.pop(price, default)
+        qty = arr[i]
+        if not qty:
+            return default
+        arr[i] = 0
+        self._count -= 1
+        if price == self._best:
+            self._best = self._next_best(i)
+            if self._best is None and self._far: # array ran dry, bring far levels back
+                far_best = max(self._far) if self.is_bid else min(self._far)
+                self._recentre(far_best)
+        return qty
+
+    def __delitem__(self, price: int):
+        if self.pop(price) is None:
+            raise KeyError(price)
+
+    def _next_best(self, i: int) -> Optional[int]:
+        if not self._count:
+            return None
+        arr = self._qty
+        step = -1 if self.is_bid else 1
+        i += step
+        while not arr[i]: # safe: _count > 0 means a non-empty slot exists on the far side
+            i += step
+        return self._base + i
+
+    def get(self, price: int, default=None):
+        i = price - self._base
+        if 0 <= i < len(self._qty):
+            qty = self._qty[i]
+            return qty if qty else default
+        return self._far.get(price, default)
+
+    def __contains__(self, price: int) -> bool:
+        return self.get(price) is not None
+
+    def __len__(self) -> int:
+        return self._count + len(self._far)
+
+    def __bool__(self) -> bool:
+        return self._count > 0 or bool(self._far)
+
+    def items(self):
+        base = self._base
+        for i, qty in enumerate(self._qty):
+            if qty:
+                yield base + i, qty
+        yield from self._far.items()
+
+    def keys(self):
+        return [p for p, _ in self.items()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def clear(self):
+        self._qty = []
+        self._base = 0
+        self._count = 0
+        self._best = None
+        self._far = {}
+
+    def best(self) -> Optional[int]:
+        if self._best is not None:
+            return self._best
+        if self._far: # only far levels left (e.g. right after a snapshot wider than the window)
+            return max(self._far) if self.is_bid else min(self._far)
+        return None
+
+    def levels(self) -> Iterator[Tuple[int, int]]: # every level, best first
+        if self._best is not None:
+            arr = self._qty
+            base = self._base
+            step = -1 if self.is_bid else 1
+            i = self._best - base
+            while 0 <= i < len(arr):
+                if arr[i]:
+                    yield base + i, arr[i]
+                i += step
+        for p in sorted(self._far, reverse=self.is_bid): # far levels are always behind the window
+            yield p, self._far[p]
+
+    def top(self, n: int) -> List[Tuple[int, int]]:
+        # same walk as levels(), without the generator (this runs on every diff when publishing, see shm_book.py)
+        out = []
+        if n <= 0:
+            return out
+        if self._best is not None:
+            arr = self._qty
+            base = self._base
+            step = -1 if self.is_bid else 1
+            i = self._best - base
+            size = len(arr)
+            while 0 <= i < size:
+                q = arr[i]
+                if q:
+                    out.append((base + i, q))
+                    if len(out) == n:
+                        return out
+                i += step
+        for p in sorted(self._far, reverse=self.is_bid):
+            out.append((p, self._far[p]))
+            if len(out) == n:
+                break
+        return out
+
+    def _walk(self, price: int, step: int) -> Optional[int]:
+        # first non-empty slot from price + step in direction step (array part only)
+        arr = self._qty
+        i = price - self._base + step
+        if step > 0:
+            i = max(i, 0)
+        else:
+            i = min(i, len(arr) - 1)
+        while 0 <= i < len(arr):
+            if arr[i]:
+                return self._base + i
+            i += step
+        return None
+
+    def next_worse(self, price: int) -> Optional[int]:
+        # nearest in the array, then the far levels (usually none) can only be closer if they sit in between
+        if self.is_bid:
+            p = self._walk(price, -1) if self._count else None
+            far = max((f for f in self._far if f < price), default=None) if self._far else None
+            return far if p is None or (far is not None and far > p) else p
+        p = self._walk(price, 1) if self._count else None
+        far = min((f for f in self._far if f > price), default=None) if self._far else None
+        return far if p is None or (far is not None and far < p) else p
+
+    def next_better(self, price: int) -> Optional[int]:
+        if self.is_bid:
+            p = self._walk(price, 1) if self._count else None
+            far = min((f for f in self._far if f > price), default=None) if self._far else None
+            return far if p is None or (far is not None and far < p) else p
+        p = self._walk(price, -1) if self._count else None
+        far = max((f for f in self._far if f < price), default=None) if self._far else None
+        return far if p is None or (far is not None and far > p) else p
+
+    def drop_worse(self, price: int) -> int:
+        # the slots behind `price` are one slice of the array (lower indices for bids, higher for asks)
+        arr = self._qty
+        i = min(max(price - self._base if self.is_bid else price - self._base + 1, 0), len(arr))
+        part = arr[:i] if self.is_bid else arr[i:]
+        n = len(part) - part.count(0)
+        if n:
+            if self.is_bid:
+                arr[:i] = [0] * i
+            else:
+                arr[i:] = [0] * (len(arr) - i)
+            self._count -= n
+            if self._best is not None and (self._best < price if self.is_bid else self._best > price):
+                self._best = None # everything in the array was behind `price`
+        far = [p for p in self._far if (p < price if self.is_bid else p > price)]
+        for p in far:
+            del self._far[p]
+        return n + len(far)
+
+    def nbytes(self) -> int:
+        # the array is one pointer per tick; small quantities are shared int objects, so count the big ones
+        size = sys.getsizeof(self._qty) + sys.getsizeof(self._far)
+        size += sum(sys.getsizeof(q) for q in self._qty if q > 256)
+        size += sum(sys.getsizeof(p) + sys.getsizeof(q) for p, q in self._far.items())
+        return size
+
+
+# Backends that OrderBookEngine(book_side=...) accepts
+BOOK_SIDES = {
+    "dict": DictBookSide,
+    "sorted": SortedBookSide,
+    "ticks": TickArrayBookSide, # integer prices only (tick mode)
+}
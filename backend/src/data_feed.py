@@ -1,77 +1,314 @@
 import asyncio #allows asynchronous code to run
-import json
+import os
 import time
 import websockets
 from market_handler import MarketDecoder, DepthDiff, Trade
 from asyncio import Queue
 from order_book_engine import OrderBookEngine
 from market_maker import MarketMaker
+from ticks import TICK_SPECS
+from feed_log import FeedRecorder
+from snapshot_sync import AsyncSnapshotSync
+from latency import LatencyStats
+from telemetry import CONSOLE, Telemetry, StdoutSink, NdjsonSink, BinarySink
+from trade_analytics import TradeAnalytics
+from book_checkpoint import BookCheckpoint
+from shm_book import TopOfBookPublisher
+from ingest_queue import ConflatingQueue
+from ingest_ring import Ingestor
+from tick_store import TickStoreWriter
+from diagnostics import Counters, SamplingProfiler, ControlServer, install_signals
+from typing import Optional
 
 
 SYMBOL = "btcusdt"  # lowercase for WebSockets
-WS_URL = f"wss://stream.binance.com:9443/stream?streams={SYMBOL}@depth@100ms/{SYMBOL}@trade&timeUnit=MICROSECOND"
+# Where market data comes from. Override with MM_WS_BASE / MM_REST_URL to point at a local
+# stand-in, e.g. exchange_sim.py: MM_WS_BASE=ws://127.0.0.1:9443/stream MM_REST_URL=http://127.0.0.1:9444
+WS_BASE = os.environ.get("MM_WS_BASE", "wss://stream.binance.com:9443/stream")
+REST_URL = os.environ.get("MM_REST_URL", "https://api.binance.com")
+WS_URL = f"{WS_BASE}?streams={SYMBOL}@depth@100ms/{SYMBOL}@trade&timeUnit=MICROSECOND"
+RECONNECT_DELAY_S = 1.0 # after the socket drops, wait this long and reconnect (the book resyncs on the gap)
+USE_TICKS = False # True → integer tick mode: prices/qtys parsed into int ticks/lots, array-backed book (see ticks.py)
+RECORD_PATH = None # e.g. "session.feed" → record every raw frame + snapshot for offline replay (see feed_log.py / replay.py)
+CHECKPOINT_PATH = None # e.g. "btcusdt.book" → checkpoint the book every CHECKPOINT_INTERVAL_S and warm-start from it (see book_checkpoint.py)
+CHECKPOINT_INTERVAL_S = 1.0
+SHM_NAME = None # e.g. "mm_btcusdt" → publish the top SHM_DEPTH levels to shared memory for other local processes (see shm_book.py)
+SHM_DEPTH = 20
+CONFLATE_AT = None # e.g. 1 → merge not-yet-consumed depth diffs once this many events are queued (see ingest_queue.py); None = plain queue, put() waits when full
+QUEUE_REPORT_S = None # e.g. 10 → print queue depth / conflation ratio / event age (or the ingest ring's stats) every N seconds; None = off
+INGEST = None # "thread" | "process" → socket reads + decoding on their own thread / process, handed over through a ring (see ingest_ring.py); None = all on this loop
+INGEST_RING_BYTES = 1 << 23
+INGEST_BATCH = 256 # max events the strategy loop takes from the ring at a time
+DEPTH_WINDOW = None # e.g. 200 → keep only the best 200 levels per side at full fidelity, evict the rest (see order_book_engine.py)
+DEPTH_WINDOW_BPS = None # or e.g. 25 → keep only levels within 25 bps of the touch (one of the two)
+MEMORY_REPORT_S = None # e.g. 60 → print the book's level count / memory every N seconds; None = off
+CONTROL_SOCKET = None # e.g. "/tmp/mm_feed.sock" → local socket for `python diagnostics.py counters|profile N` (see diagnostics.py)
+DIAG_SIGNALS = True # kill -USR1 <pid> → sample all threads for PROFILE_SECONDS into a folded stack file; kill -USR2 <pid> → print counters
+PROFILE_SECONDS = 10
+PROFILE_INTERVAL_S = 0.005 # one stack sample per thread every 5ms while a profile runs (nothing runs otherwise)
+PROFILE_DIR = "."
+TICK_STORE_PATH = None # e.g. "btcusdt.ticks" → append every consumed trade / depth update to a columnar store for research (see tick_store.py)
+
+TELEMETRY = None # status output written by a background thread instead: "stdout" | "ndjson" | "binary"; None = print inline (see telemetry.py)
+TELEMETRY_PATH = "telemetry.ndjson" # file for the "ndjson" / "binary" sinks
+BOOK_PRINT_MS = 250 # top-of-book line at most every N ms
+LATENCY = False # True → per-stage latency histograms (see latency.py)
+LATENCY_REPORT_S = 10 # print + dump the histograms every N seconds
+LATENCY_DUMP_PATH = "latency.json"
+TRADE_WINDOWS_S = (1, 10, 60) # rolling VWAP / flow / volatility windows (see trade_analytics.py); None = off
+TRADE_REPORT_S = 10 # print the trade window table every N seconds
+
+def handle_event(ev, book: OrderBookEngine, maker: MarketMaker, lat: Optional[LatencyStats] = None): # One decoded event → book + strategy. Shared by the live consumer and the replay driver.
+    if lat is not None: # instrumented path (kept separate so the default path has no timing calls at all)
+        _handle_event_timed(ev, book, maker, lat)
+        return
+
+    if isinstance(ev, DepthDiff):
+        book.on_depth_diff(ev)
+        maker.on_book_update()
+
+    elif isinstance(ev, Trade): # Trades do not change the book structure
+        maker.on_trade(ev)
+
+def _handle_event_timed(ev, book: OrderBookEngine, maker: MarketMaker, lat: LatencyStats):
+    now = time.perf_counter_ns
+    if ev.ts_event_us: # exchange → us (two different wall clocks, so clamp clock skew at 0)
+        lat.record("exchange_to_recv", max(0, ev.ts_recv_us - ev.ts_event_us) * 1000)
+
+    if isinstance(ev, DepthDiff):
+        t0 = now()
+        book.on_depth_diff(ev)
+        t1 = now()
+        maker.on_book_update()
+        t2 = now()
+        lat.record("book_update", t1 - t0)
+        lat.record("strategy", t2 - t1)
+        if ev.t_recv_ns and (maker.bid_quote is not None or maker.ask_quote is not None):
+            lat.record("tick_to_quote", t2 - ev.t_recv_ns) # receive → quotes ready
+
+    elif isinstance(ev, Trade):
+        t0 = now()
+        maker.on_trade(ev)
+        lat.record("trade", now() - t0)
+
+def make_telemetry():
+    if TELEMETRY is None:
+        return CONSOLE
+    sinks = {"stdout": StdoutSink, "ndjson": lambda: NdjsonSink(TELEMETRY_PATH), "binary": lambda: BinarySink(TELEMETRY_PATH)}
+    return Telemetry(sinks[TELEMETRY](), book_interval_ms=BOOK_PRINT_MS, sample={"not_synced": 50, "buffering": 10}).start()
+
+def consume_event(ev, book: OrderBookEngine, maker: MarketMaker, lat: Optional[LatencyStats] = None, trades: Optional[TradeAnalytics] = None, publisher: Optional[TopOfBookPublisher] = None, store: Optional[TickStoreWriter] = None): # everything the strategy side does with one decoded event
+    if lat is not None and ev.t_enq_ns:
+        lat.record("queue_wait", time.perf_counter_ns() - ev.t_enq_ns)
+    handle_event(ev, book, maker, lat)
+    if trades is not None and isinstance(ev, Trade): # keep the trade instead of throwing it away
+        trades.on_trade(ev)
+    elif publisher is not None and isinstance(ev, DepthDiff): # new top of book → shared memory
+        publisher.publish(ev)
+    if store is not None: # one list append; the columns are built and written on the store's own thread
+        store.on_event(ev)
+
+def report_book(tel, book: OrderBookEngine, maker: MarketMaker):
+    if book.synced:
+        if tel.book_due(): # conflated: the values are only gathered when a line is actually due
+            s = maker.status()
+            tel.book(book.to_price(book.best_bid()), book.to_price(book.best_ask()),
+                     s['inventory'], s['pnl'], s['bid'], s['ask'])
+    else:
+        tel.event("not_synced")
 
 # Consumer: Order Book Updater
-async def book_consumer(q: Queue, book: OrderBookEngine, maker: MarketMaker): # This function reads events from the queue and updates the order book
+async def book_consumer(q: Queue, book: OrderBookEngine, maker: MarketMaker, lat: Optional[LatencyStats] = None, trades: Optional[TradeAnalytics] = None, publisher: Optional[TopOfBookPublisher] = None, store: Optional[TickStoreWriter] = None): # This function reads events from the queue and updates the order book
     """
     Consumes decoded market events and updates the order book.
     """
     while True:
         ev = await q.get() # await q.get() → wait until new data arrives
+        consume_event(ev, book, maker, lat, trades, publisher, store)
+
+async def ring_consumer(ingest: Ingestor, book: OrderBookEngine, maker: MarketMaker, tel, lat: Optional[LatencyStats] = None, trades: Optional[TradeAnalytics] = None, publisher: Optional[TopOfBookPublisher] = None, store: Optional[TickStoreWriter] = None): # INGEST mode: the socket is read elsewhere, events arrive in batches
+    while True:
+        for ev in await ingest.get_batch():
+            if lat is not None and ev.t_recv_ns:
+                lat.record("decode", ev.t_enq_ns - ev.t_recv_ns) # measured on the ingest side, recorded here
+            consume_event(ev, book, maker, lat, trades, publisher, store)
+        report_book(tel, book, maker) # once per batch
+
+async def latency_reporter(lat: LatencyStats, every_s: float, path: Optional[str]): # periodic snapshot: print + dump file
+    while True:
+        await asyncio.sleep(every_s)
+        print(lat.format())
+        if path:
+            lat.dump(path)
 
-        if isinstance(ev, DepthDiff):
-            book.on_depth_diff(ev)
-            maker.on_book_update()
+async def queue_reporter(q, every_s: float): # periodic ingestion metrics (interval values) for a ConflatingQueue or an Ingestor
+    while True:
+        await asyncio.sleep(every_s)
+        print(q.format(q.stats(reset=True)))
 
-        elif isinstance(ev, Trade): # Trades do not change the book structure
-            maker.on_trade(ev)
+async def trade_reporter(trades: TradeAnalytics, every_s: float): # periodic rolling-window table
+    while True:
+        await asyncio.sleep(every_s)
+        print(trades.format())
+
+async def memory_reporter(book: OrderBookEngine, every_s: float): # periodic book size / depth window counters
+    while True:
+        await asyncio.sleep(every_s)
+        print(book.format_memory())
+
+async def receive_loop(q: Queue, decoder: MarketDecoder, book: OrderBookEngine, maker: MarketMaker, tel, lat: Optional[LatencyStats] = None, recorder: Optional[FeedRecorder] = None): # socket → decode → queue, on this loop
+    while True: # reconnect forever: a dropped socket only costs a resync
+        try:
+            async with websockets.connect(WS_URL, ping_interval=15, ping_timeout=10) as ws: # Opens the WebSocket connection to Binance. , pinginterval means sending an intenval every 15 seconds, ping_timeout means if Binance doesn't respond within 10 seconds, the connection closes.
+
+                print(f"Successful Connection {WS_URL}") # prints if connection is successful
+                while True: #Loop forever to continuously recieve incoming messages
+                    raw = await ws.recv() # Raw text frame, Asynchronously wait for the next message from Binance.This is the real-time data.
+                    t_recv_ns = time.perf_counter_ns() if lat is not None else 0 # monotonic, for latency stages
+
+                    ts_recv_us = int(time.time() * 1_000_000) # Capture the local time (in milliseconds) at the exact moment you received the message, Useful for latency calculations and logging.
+                    if recorder:
+                        recorder.write_frame(raw, ts_recv_us) # raw frame exactly as received
+                    ev = decoder.parse_frame(raw, ts_recv_us) # Raw frame → DepthDiff / Trade (json.loads + decoder.parse_combined)
+
+                    if ev is None:
+                        continue  # Skip unknown / heartbeat / unexpected messages.
+
+                    if lat is not None:
+                        ev.t_recv_ns = t_recv_ns
+                        ev.t_enq_ns = time.perf_counter_ns()
+                        lat.record("decode", ev.t_enq_ns - t_recv_ns)
+
+                    await q.put(ev) # This hands off the event to the next stage (order book, strategy, logger, etc). Depth diffs the consumer hasn't got to yet are merged (ConflatingQueue).
+
+                    report_book(tel, book, maker)
+        except (websockets.ConnectionClosed, OSError) as e:
+            print(f"[WS] disconnected ({e!r}) → reconnecting in {RECONNECT_DELAY_S}s")
+            await asyncio.sleep(RECONNECT_DELAY_S)
 
 #we create a single websocket that listens to two streams at once ,  we are getting both trade events and depth events in one socket
 async def main(): # A coroutine that will run asynchronously (non-blocking).
-    q: Queue = Queue(maxsize=10000) # This queue will store clean events (Trade or DepthDiff). Later, your order book or strategy will read from this queue. maxsize=10000 → protects you from memory exploding.
+    if INGEST and RECORD_PATH:
+        raise ValueError("RECORD_PATH records on the receive loop: set INGEST = None to record")
 
-    decoder = MarketDecoder(expect_microseconds=True) #creates the decoder object, uses the class MarketDecoder from market_handler.py
+    tick_spec = TICK_SPECS[SYMBOL.upper()] if USE_TICKS else None
+
+    decoder = MarketDecoder(expect_microseconds=True, tick_specs={SYMBOL.upper(): tick_spec} if tick_spec else None) #creates the decoder object, uses the class MarketDecoder from market_handler.py
 
     # Create order book engine
-    book = OrderBookEngine(symbol="BTCUSDT")
+    book = OrderBookEngine(symbol="BTCUSDT", book_side="ticks" if tick_spec else "sorted", tick_spec=tick_spec, rest_url=REST_URL,
+                          depth_window=DEPTH_WINDOW, depth_window_bps=DEPTH_WINDOW_BPS)
+
+    recorder = FeedRecorder(RECORD_PATH) if RECORD_PATH else None
+    if recorder:
+        book.on_snapshot = recorder.write_snapshot # every snapshot the book loads goes into the log too
 
-    # IMPORTANT: snapshot before consuming diffs
-    book.load_snapshot()
+    # Warm restart: start from the last checkpoint if there is a valid one. If the live
+    # diffs still connect to it, the book syncs without any REST round trip;
+    # if they don't, it falls back to a REST snapshot like a cold start.
+    checkpoint = BookCheckpoint(book, CHECKPOINT_PATH, interval_s=CHECKPOINT_INTERVAL_S) if CHECKPOINT_PATH else None
+    if checkpoint is not None:
+        if checkpoint.restore():
+            print(f"[CHECKPOINT] warm start from lastUpdateId={checkpoint.restored_from}")
+        checkpoint.start()
+
+    # IMPORTANT: the snapshot is fetched in the background, never inline.
+    # The first diff asks for it, diffs keep buffering meanwhile, and the book
+    # bridges the buffer once it arrives (same on every gap).
+    snapshot_sync = AsyncSnapshotSync(book)
+    snapshot_sync.start()
 
     #Create market maker engine
     maker = MarketMaker(book) # MarketMaker reads prices from the book
 
-    #Start Consumer once
-    consumer_task = asyncio.create_task(book_consumer(q, book, maker))
+    tel = make_telemetry()
+    book.telemetry = tel
+    maker.telemetry = tel
 
-    async with websockets.connect(WS_URL, ping_interval=15, ping_timeout=10) as ws: # Opens the WebSocket connection to Binance. , pinginterval means sending an intenval every 15 seconds, ping_timeout means if Binance doesn't respond within 10 seconds, the connection closes.
+    lat = LatencyStats() if LATENCY else None
 
-        print(f"Successful Connection {WS_URL}") # prints if connection is successful
-        while True: #Loop forever to continuously recieve incoming messages
-            raw = await ws.recv() # Raw text frame, Asynchronously wait for the next message from Binance.This is the real-time data.
+    # INGEST mode: the socket is read and decoded on another thread / process; the ring replaces the queue
+    ingest = Ingestor(WS_URL, SYMBOL, tick_spec, mode=INGEST, ring_bytes=INGEST_RING_BYTES, batch=INGEST_BATCH,
+                      stamp_ns=lat is not None, reconnect_delay_s=RECONNECT_DELAY_S) if INGEST else None
+    q: Optional[Queue] = None
+    if ingest is not None:
+        ingest.start()
+    else:
+        # This queue will store clean events (Trade or DepthDiff). Later, your order book or strategy will read from this queue. maxsize=10000 → protects you from memory exploding.
+        q = Queue(maxsize=10000) if CONFLATE_AT is None else ConflatingQueue(maxsize=10000, conflate_at=CONFLATE_AT)
+    if QUEUE_REPORT_S:
+        if ingest is not None:
+            asyncio.create_task(queue_reporter(ingest, QUEUE_REPORT_S))
+        elif isinstance(q, ConflatingQueue):
+            asyncio.create_task(queue_reporter(q, QUEUE_REPORT_S))
 
-            ts_recv_us = int(time.time() * 1_000_000) # Capture the local time (in milliseconds) at the exact moment you received the message, Useful for latency calculations and logging.
-            msg = json.loads(raw) # Convert the raw JSON string into a Python dict so you can access fields easily.
+    if MEMORY_REPORT_S:
+        asyncio.create_task(memory_reporter(book, MEMORY_REPORT_S))
 
-            ev = decoder.parse_combined(msg, ts_recv_us) #sends to the function parse_combined in market_handler.py under class MarketDecoder. uses the oject decoder created above
+    if lat is not None:
+        asyncio.create_task(latency_reporter(lat, LATENCY_REPORT_S, LATENCY_DUMP_PATH))
 
-            if ev is None:
-                continue  # Skip unknown / heartbeat / unexpected messages.
+    trades = TradeAnalytics(TRADE_WINDOWS_S, tick_spec=tick_spec) if TRADE_WINDOWS_S else None
+    if trades is not None:
+        asyncio.create_task(trade_reporter(trades, TRADE_REPORT_S))
 
-            await q.put(ev) # This hands off the event to the next stage (order book, strategy, logger, etc).
+    publisher = TopOfBookPublisher(book, SHM_NAME, SHM_DEPTH) if SHM_NAME else None
+
+    # what the strategy consumed (so conflated diffs stay conflated), not the raw frames: RECORD_PATH is for those
+    store = TickStoreWriter(TICK_STORE_PATH, SYMBOL, tick_spec) if TICK_STORE_PATH else None
+
+    # Runtime diagnostics: the counters are kept by each component anyway, this only
+    # collects them when asked; the profiler thread only exists while a profile runs.
+    counters = Counters()
+    counters.register("book", book.counters)
+    if ingest is not None:
+        counters.register("ingest", ingest.stats)
+    elif isinstance(q, ConflatingQueue):
+        counters.register("queue", lambda: {**q.stats(), "maxsize": q.maxsize})
+    else:
+        counters.register("queue", lambda: {"depth": q.qsize(), "maxsize": q.maxsize})
+    counters.register("snapshot_sync", snapshot_sync.status)
+    counters.register("maker", maker.status)
+    counters.register("orders", maker.orders.status)
+    if tel is not CONSOLE:
+        counters.register("telemetry", tel.status)
+    if checkpoint is not None:
+        counters.register("checkpoint", checkpoint.status)
+    if store is not None:
+        counters.register("store", store.status)
+    profiler = SamplingProfiler(PROFILE_INTERVAL_S, PROFILE_DIR)
+    if DIAG_SIGNALS:
+        install_signals(counters, profiler, PROFILE_SECONDS)
+    control = await ControlServer(CONTROL_SOCKET, counters, profiler, PROFILE_SECONDS).start() if CONTROL_SOCKET else None
+
+    #Start Consumer once
+    consumer_task = asyncio.create_task(book_consumer(q, book, maker, lat, trades, publisher, store)) if ingest is None else None
 
-            if book.synced:
-                s = maker.status()
-                print(
-                    f"[BOOK] BB={book.best_bid()} "
-                    f"BA={book.best_ask()} "
-                    f"INV={s['inventory']} "
-                    f"PNL={s['pnl']} "
-                    f"BID={s['bid']} "
-                    f"ASK={s['ask']}"
-                )
-            else:
-                print("Book not synced")
+    try:
+        if ingest is not None:
+            await ring_consumer(ingest, book, maker, tel, lat, trades, publisher, store)
+        else:
+            await receive_loop(q, decoder, book, maker, tel, lat, recorder)
+    finally:
+        if control is not None:
+            control.close() # removes the socket file
+        if ingest is not None:
+            ingest.stop()
+        if checkpoint is not None:
+            await checkpoint.stop() # final checkpoint on the way out
+        if consumer_task is not None:
+            consumer_task.cancel() # nothing touches the publisher / store after this
+        if publisher is not None:
+            publisher.close() # removes the segment
+        if store is not None:
+            store.close() # writes the last partial chunks
+            print(f"[TICKSTORE] {store.status()}")
+        if tel is not CONSOLE:
+            tel.close() # drain what's left in the ring
+        if recorder:
+            recorder.close() # flush whatever is still buffered
+        if lat is not None and LATENCY_DUMP_PATH:
+            lat.dump(LATENCY_DUMP_PATH)
 
 if __name__ == "__main__":
     asyncio.run(main())
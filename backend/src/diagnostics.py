@@ -0,0 +1,238 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+# Looking inside a running data_feed process.
+#
+#   Counters         -> registry of named sources, each a function returning a dict of
+#                       counters the component keeps anyway (book.counters(), q.stats(), ...).
+#                       Nothing is computed until someone asks: the hot path only does int adds.
+#   SamplingProfiler -> on demand only. A daemon thread grabs every thread's Python stack
+#                       (sys._current_frames) every interval_s for duration_s seconds and writes
+#                       them in folded format ("thread;outer;...;inner count" per line), which
+#                       flamegraph.pl, speedscope and inferno read as is. Off = no cost at all.
+#   ControlServer    -> local unix socket, one command per connection:
+#                         counters                  -> JSON of all sources
+#                         profile [seconds] [path]  -> profile, answers once the file is written
+#
+# From a shell:
+#   python diagnostics.py counters
+#   python diagnostics.py profile 10
+#   kill -USR1 <pid>   → profile for PROFILE_SECONDS      kill -USR2 <pid>   → print counters
+#
+# The profiler only sees threads of this process: with INGEST = "process" the
+# ingest side is a separate process and shows up as waiting on the ring.
+
+DEFAULT_SOCKET = "/tmp/mm_feed.sock"
+
+
+class Counters:
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], dict]] = {}
+
+    def register(self, name: str, fn: Callable[[], dict]):
+        """ fn() is only called when a snapshot is taken; it must not reset anything """
+        self._sources[name] = fn
+
+    def snapshot(self) -> dict:
+        out = {"ts_us": int(time.time() * 1_000_000)}
+        for name, fn in self._sources.items():
+            try:
+                out[name] = fn()
+            except Exception as e: # a broken source must not take the others (or the feed) down
+                out[name] = {"error": repr(e)}
+        return out
+
+    def format(self, snap: Optional[dict] = None) -> str:
+        s = self.snapshot() if snap is None else snap
+        lines = []
+        for name, vals in s.items():
+            if name == "ts_us":
+                continue
+            lines.append(f"[COUNTERS] {name}: " + " ".join(f"{k}={v}" for k, v in vals.items()))
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    def __init__(self, interval_s: float = 0.005, out_dir: str = "."):
+        self.interval_s = interval_s
+        self.out_dir = out_dir
+        self._thread: Optional[threading.Thread] = None
+        self._labels = {} # code object -> "qualname (file.py:line)"
+        self.last_path: Optional[str] = None
+        self.last_samples = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration_s: float, path: Optional[str] = None) -> Optional[str]:
+        """ Profile every thread for duration_s in the background. Returns the output path, None if one is already running """
+        if self.running:
+            return None
+        if path is None:
+            path = os.path.join(self.out_dir, f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+        self._thread = threading.Thread(target=self._run, args=(duration_s, path), name="profiler", daemon=True)
+        self._thread.start()
+        return path
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _run(self, duration_s: float, path: str):
+        me = threading.get_ident()
+        stacks = Counter() # (thread name, (code, ...) outermost first) -> samples
+        n = 0
+        interval = self.interval_s
+        end = time.monotonic() + duration_s
+        while time.monotonic() < end:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                codes.reverse()
+                stacks[(names.get(ident, str(ident)), tuple(codes))] += 1
+            n += 1
+            time.sleep(interval)
+        self._write(stacks, n, duration_s, path)
+
+    def _write(self, stacks: Counter, n: int, duration_s: float, path: str):
+        busy = Counter() # main thread (the strategy loop) self time per function when not waiting in select(), for the summary line
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            for (thread, codes), count in stacks.most_common():
+                labels = [self._label(c) for c in codes]
+                f.write(";".join([thread] + labels) + f" {count}\n")
+                if thread == "MainThread" and codes and codes[-1].co_name != "select":
+                    busy[labels[-1]] += count
+        os.replace(tmp, path)
+        self.last_path = path
+        self.last_samples = n
+        busy_n = sum(busy.values())
+        top = ", ".join(f"{label} {100 * c / busy_n:.0f}%" for label, c in busy.most_common(3)) if busy_n else "-"
+        print(f"[PROFILE] {n} samples over {duration_s:g}s → {path}; main loop busy {100 * busy_n / (n or 1):.1f}% (top: {top})")
+
+
+class ControlServer:
+    def __init__(self, path: str, counters: Counters, profiler: SamplingProfiler, profile_seconds: float = 10):
+        self.path = path
+        self.counters = counters
+        self.profiler = profiler
+        self.profile_seconds = profile_seconds
+        self._server = None
+
+    async def start(self):
+        if os.path.exists(self.path): # left over from a previous run
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, self.path)
+        os.chmod(self.path, 0o600) # local user only
+        print(f"[DIAG] control socket {self.path}")
+        return self
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            cmd = (await reader.readline()).decode().split()
+            writer.write((json.dumps(await self._command(cmd), default=str) + "\n").encode())
+            await writer.drain()
+        except (ConnectionError, UnicodeDecodeError):
+            pass
+        finally:
+            writer.close()
+
+    async def _command(self, cmd: list) -> dict:
+        if not cmd or cmd[0] == "counters":
+            return self.counters.snapshot()
+        if cmd[0] == "profile":
+            try:
+                seconds = float(cmd[1]) if len(cmd) > 1 else self.profile_seconds
+            except ValueError:
+                return {"error": f"bad duration {cmd[1]!r}"}
+            path = self.profiler.start(seconds, cmd[2] if len(cmd) > 2 else None)
+            if path is None:
+                return {"error": "a profile is already running"}
+            while self.profiler.running: # answer once the file is there (the loop keeps running meanwhile)
+                await asyncio.sleep(0.1)
+            return {"path": path, "samples": self.profiler.last_samples, "seconds": seconds}
+        return {"error": f"unknown command {cmd[0]!r}", "commands": ["counters", "profile [seconds] [path]"]}
+
+
+def install_signals(counters: Counters, profiler: SamplingProfiler, profile_seconds: float):
+    """ SIGUSR1 → profile for profile_seconds, SIGUSR2 → print counters (call from the running loop) """
+    loop = asyncio.get_running_loop()
+
+    def on_profile():
+        if profiler.start(profile_seconds) is None:
+            print("[PROFILE] already running")
+        else:
+            print(f"[PROFILE] sampling for {profile_seconds:g}s")
+
+    try:
+        loop.add_signal_handler(signal.SIGUSR1, on_profile)
+        loop.add_signal_handler(signal.SIGUSR2, lambda: print(counters.format()))
+    except (NotImplementedError, AttributeError): # no SIGUSR1/2 (Windows): the control socket still works
+        pass
+
+
+def request(path: str, line: str, timeout: Optional[float] = None) -> dict:
+    """ Client side: send one command, return the decoded answer """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(path)
+        s.sendall(line.encode() + b"\n")
+        buf = b""
+        while not buf.endswith(b"\n"):
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+    return json.loads(buf)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Talk to a running data_feed over its control socket")
+    ap.add_argument("--sock", default=DEFAULT_SOCKET)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("counters", help="print every counter source as JSON")
+    p = sub.add_parser("profile", help="sample all threads, write a folded stack file")
+    p.add_argument("seconds", type=float, nargs="?", default=10.0)
+    p.add_argument("path", nargs="?", help="output file (default: profile-<pid>-<time>.folded in PROFILE_DIR)")
+    args = ap.parse_args()
+
+    if args.cmd == "counters":
+        print(json.dumps(request(args.sock, "counters", timeout=5), indent=2))
+    else:
+        line = f"profile {args.seconds}" + (f" {os.path.abspath(args.path)}" if args.path else "")
+        print(json.dumps(request(args.sock, line, timeout=args.seconds + 30), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""
+Local stand-in for Binance spot market data, for end-to-end and load tests.
+
+Serves, on localhost:
+  ws://HOST:PORT/stream?streams=btcusdt@depth@100ms/btcusdt@trade&timeUnit=MICROSECOND
+      combined-stream frames in Binance's exact compact layout
+  http://HOST:REST_PORT/api/v3/depth?symbol=BTCUSDT&limit=1000
+      depth snapshots taken from the same book the stream is generated from,
+      so lastUpdateId always lines up with the diffs
+
+Driven by a synthetic order-flow generator (random-walk mid, adds / cancels
+near the touch, trades at the touch) or by a recorded session (feed_log.py).
+Everything a live connection never lets us control is a flag:
+
+    python exchange_sim.py --rate 2000                                  # 2000 events/s per symbol
+    python exchange_sim.py --burst 10:2:20                              # every 10s, 2s at 20x the rate
+    python exchange_sim.py --gap-prob 0.001 --disconnect-every 30       # drop diffs, kick clients
+    python exchange_sim.py --snapshot-delay-ms 500 --snapshot-fail-prob 0.2
+    python exchange_sim.py --replay session.feed --speed 5
+
+Point the feed at it:
+
+    MM_WS_BASE=ws://127.0.0.1:9443/stream MM_REST_URL=http://127.0.0.1:9444 python data_feed.py
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import websockets
+
+from feed_log import REC_FRAME, REC_SNAPSHOT, read_feed_log
+
+
+class SimBook:
+    """ The exchange's own book for one symbol: int ticks → qty string, plus the update id """
+
+    def __init__(self, symbol: str, tick: str = "0.01"):
+        self.symbol = symbol.upper()
+        self.decimals = len(tick.split(".")[1]) if "." in tick else 0
+        self.bids: Dict[int, str] = {}
+        self.asks: Dict[int, str] = {}
+        self.last_update_id = 1
+
+    def fmt(self, ticks: int) -> str:
+        return f"{ticks / 10 ** self.decimals:.{self.decimals}f}"
+
+    def ticks(self, price: str) -> int:
+        return round(float(price) * 10 ** self.decimals)
+
+    def apply(self, bids: List[List[str]], asks: List[List[str]]):
+        for side, levels in ((self.bids, bids), (self.asks, asks)):
+            for p, q in levels:
+                if float(q) == 0.0:
+                    side.pop(self.ticks(p), None)
+                else:
+                    side[self.ticks(p)] = q
+
+    def snapshot(self, limit: int) -> dict:
+        return {
+            "lastUpdateId": self.last_update_id,
+            "bids": [[self.fmt(p), self.bids[p]] for p in sorted(self.bids, reverse=True)[:limit]],
+            "asks": [[self.fmt(p), self.asks[p]] for p in sorted(self.asks)[:limit]],
+        }
+
+
+# ---------------------------------------------------------------- order flow
+
+class SyntheticFlow:
+    """
+    Random-walk mid; each depth event touches a few levels near the touch
+    (mostly adds/updates, some cancels), trades hit the best level on one side.
+    """
+
+    def __init__(self, book: SimBook, mid: float = 90000.0, levels: int = 1000, seed: int = 0):
+        self.book = book
+        self.rnd = random.Random(seed)
+        self.mid = book.ticks(f"{mid}")
+        self.trade_id = 1
+        for i in range(1, levels + 1): # start with a full, one-tick-wide book
+            book.bids[self.mid - i] = self._qty()
+            book.asks[self.mid + i - 1] = self._qty()
+
+    def _qty(self) -> str:
+        return f"{self.rnd.expovariate(1.0):.5f}"
+
+    def depth(self) -> Tuple[list, list]:
+        rnd, book = self.rnd, self.book
+        moved = rnd.random() < 0.2 # mid drifts by a tick
+        if moved:
+            self.mid += rnd.choice((-1, 1))
+        bids, asks = [], []
+        for _ in range(rnd.randint(1, 12)):
+            off = int(rnd.expovariate(0.15)) # mostly near the touch
+            q = "0.00000000" if rnd.random() < 0.3 else self._qty()
+            if rnd.random() < 0.5:
+                bids.append([book.fmt(self.mid - 1 - off), q])
+            else:
+                asks.append([book.fmt(self.mid + off), q])
+        if not moved:
+            return bids, asks
+        # keep the book uncrossed after a mid move
+        best_bid = max(book.bids) if book.bids else None
+        while best_bid is not None and best_bid >= self.mid:
+            bids.append([book.fmt(best_bid), "0.00000000"])
+            del book.bids[best_bid]
+            best_bid = max(book.bids) if book.bids else None
+        best_ask = min(book.asks) if book.asks else None
+        while best_ask is not None and best_ask < self.mid:
+            asks.append([book.fmt(best_ask), "0.00000000"])
+            del book.asks[best_ask]
+            best_ask = min(book.asks) if book.asks else None
+        return bids, asks
+
+    def trade(self) -> Tuple[int, str, str, bool]:
+        """ (trade id, price, qty, buyer is maker) """
+        rnd, book = self.rnd, self.book
+        sell = rnd.random() < 0.5 # taker sells into the best bid
+        side = book.bids if sell else book.asks
+        price = (max(side) if side else self.mid - 1) if sell else (min(side) if side else self.mid)
+        self.trade_id += 1
+        return self.trade_id, book.fmt(price), f"{rnd.expovariate(50):.5f}", sell
+
+
+def depth_frame(symbol: str, E: int, U: int, u: int, bids: list, asks: list) -> str:
+    s = symbol.lower()
+    data = json.dumps({"e": "depthUpdate", "E": E, "s": symbol, "U": U, "u": u, "b": bids, "a": asks}, separators=(",", ":"))
+    return f'{{"stream":"{s}@depth@100ms","data":{data}}}'
+
+
+def trade_frame(symbol: str, E: int, t: int, p: str, q: str, m: bool) -> str:
+    s = symbol.lower()
+    return (f'{{"stream":"{s}@trade","data":{{"e":"trade","E":{E},"s":"{symbol}","t":{t},"p":"{p}","q":"{q}",'
+            f'"T":{E},"m":{"true" if m else "false"},"M":true}}}}')
+
+
+# ---------------------------------------------------------------- server
+
+class ExchangeSim:
+    def __init__(
+            self,
+            symbols: List[str],
+            host: str = "127.0.0.1",
+            ws_port: int = 9443,
+            rest_port: int = 9444,
+            rate: float = 200.0, # events/s per symbol (synthetic)
+            trade_ratio: float = 0.3, # share of those events that are trades
+            burst: Optional[Tuple[float, float, float]] = None, # (every_s, length_s, factor)
+            gap_prob: float = 0.0, # chance a diff is applied to the book but never sent
+            disconnect_every: Optional[float] = None, # seconds between kicking every client
+            snapshot_delay_ms: float = 0.0,
+            snapshot_fail_prob: float = 0.0, # chance a snapshot request gets HTTP 503
+            replay_path: Optional[str] = None,
+            speed: float = 1.0, # replay speed multiplier
+            seed: int = 0,
+    ):
+        self.host, self.ws_port, self.rest_port = host, ws_port, rest_port
+        self.rate = rate
+        self.trade_ratio = trade_ratio
+        self.burst = burst
+        self.gap_prob = gap_prob
+        self.disconnect_every = disconnect_every
+        self.snapshot_delay_ms = snapshot_delay_ms
+        self.snapshot_fail_prob = snapshot_fail_prob
+        self.replay_path = replay_path
+        self.speed = speed
+        self.rnd = random.Random(seed)
+
+        self.books: Dict[str, SimBook] = {s.upper(): SimBook(s) for s in symbols}
+        self.flows = {s: SyntheticFlow(b, seed=seed + i) for i, (s, b) in enumerate(self.books.items())} if not replay_path else {}
+        self.clients: Dict[object, Tuple[Set[str], bool]] = {} # ws → (streams, microseconds?)
+        self._t0 = time.monotonic()
+
+        # counters
+        self.sent = 0
+        self.gaps = 0
+        self.disconnects = 0
+        self.snapshots = 0
+        self.snapshot_errors = 0
+
+    # ---- websocket side
+
+    async def _ws_handler(self, ws):
+        url = urlsplit(ws.request.path)
+        qs = parse_qs(url.query)
+        streams = set("/".join(qs.get("streams", [])).split("/")) - {""}
+        self.clients[ws] = (streams, qs.get("timeUnit", [""])[0].upper() == "MICROSECOND")
+        try:
+            await ws.wait_closed()
+        finally:
+            self.clients.pop(ws, None)
+
+    def _publish(self, stream: str, frame_us: str, frame_ms: Optional[str] = None):
+        for ws, (streams, micro) in list(self.clients.items()):
+            if stream in streams:
+                websockets.broadcast([ws], frame_us if micro or frame_ms is None else frame_ms)
+        self.sent += 1
+
+    def _factor(self) -> float:
+        if self.burst is None:
+            return 1.0
+        every, length, factor = self.burst
+        return factor if (time.monotonic() - self._t0) % every < length else 1.0
+
+    def _emit_depth(self, symbol: str, bids: list, asks: list, now_us: int):
+        book = self.books[symbol]
+        book.apply(bids, asks)
+        U = book.last_update_id + 1
+        book.last_update_id = U + self.rnd.randint(0, 3) # Binance ids advance by more than one per event
+        if self.gap_prob and self.rnd.random() < self.gap_prob:
+            self.gaps += 1 # the book moved on but nobody heard about it
+            return
+        u = book.last_update_id
+        self._publish(f"{symbol.lower()}@depth@100ms",
+                      depth_frame(symbol, now_us, U, u, bids, asks),
+                      depth_frame(symbol, now_us // 1000, U, u, bids, asks))
+
+    async def _synthetic(self):
+        owed = 0.0
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(0.001)
+            now = time.monotonic()
+            owed += (now - last) * self.rate * self._factor()
+            last = now
+            n = int(owed)
+            owed -= n
+            for _ in range(n): # catch up in a batch: the wire sees the real rate even though sleep() is coarse
+                now_us = time.time_ns() // 1000
+                for symbol, flow in self.flows.items():
+                    if self.rnd.random() < self.trade_ratio:
+                        t, p, q, m = flow.trade()
+                        self._publish(f"{symbol.lower()}@trade", trade_frame(symbol, now_us, t, p, q, m),
+                                      trade_frame(symbol, now_us // 1000, t, p, q, m))
+                    else:
+                        self._emit_depth(symbol, *flow.depth(), now_us)
+
+    def _load_replay(self) -> list:
+        """
+        Frames of the recorded session. The book of the symbol the log was recorded for (snapshots
+        don't name it, so it's read from the frames) starts from the first recorded snapshot.
+        """
+        frames = []
+        snap = None
+        symbol = None
+        for kind, ts, payload in read_feed_log(self.replay_path):
+            if kind == REC_SNAPSHOT:
+                if snap is None:
+                    snap = json.loads(payload)
+            elif kind == REC_FRAME:
+                frames.append((ts, payload))
+                if symbol is None:
+                    symbol = json.loads(payload).get("data", {}).get("s")
+        if snap is not None and symbol is not None:
+            book = self.books.get(symbol.upper())
+            if book is None:
+                raise ValueError(f"{self.replay_path} was recorded for {symbol}, which isn't served (--symbols {symbol.lower()})")
+            book.apply(snap["bids"], snap["asks"])
+            book.last_update_id = snap["lastUpdateId"]
+        return frames
+
+    async def _replay(self, frames: list):
+        # diffs the starting snapshot already contains are skipped
+        t0_rec = frames[0][0] if frames else 0
+        t0 = time.monotonic()
+        for ts, raw in frames:
+            raw = raw.decode() if isinstance(raw, (bytes, bytearray)) else raw
+            delay = (ts - t0_rec) / 1e6 / (self.speed * self._factor()) - (time.monotonic() - t0)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            msg = json.loads(raw)
+            stream, data = msg["stream"], msg["data"]
+            if data.get("e") == "depthUpdate":
+                book = self.books.setdefault(data["s"], SimBook(data["s"]))
+                if data["u"] <= book.last_update_id:
+                    continue
+                book.apply(data["b"], data["a"])
+                book.last_update_id = data["u"]
+                if self.gap_prob and self.rnd.random() < self.gap_prob:
+                    self.gaps += 1
+                    continue
+            self._publish(stream, raw) # recorded frames go out byte for byte
+        print("[SIM] replay finished")
+
+    async def _disconnector(self):
+        while True:
+            await asyncio.sleep(self.disconnect_every)
+            for ws in list(self.clients):
+                await ws.close(1001, "simulated disconnect")
+            self.disconnects += 1
+
+    # ---- REST side (just enough HTTP/1.1 for requests.get)
+
+    async def _rest_handler(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            line = await reader.readline()
+            while (await reader.readline()).strip(): # headers: ignored
+                pass
+            parts = line.decode().split()
+            url = urlsplit(parts[1]) if len(parts) > 1 else urlsplit("/")
+            qs = parse_qs(url.query)
+            status, body = 404, {"code": -1, "msg": "not found"}
+            if url.path == "/api/v3/depth":
+                book = self.books.get(qs.get("symbol", [""])[0].upper())
+                if book is None:
+                    status, body = 400, {"code": -1121, "msg": "Invalid symbol."}
+                else:
+                    if self.snapshot_delay_ms:
+                        await asyncio.sleep(self.snapshot_delay_ms / 1000)
+                    if self.snapshot_fail_prob and self.rnd.random() < self.snapshot_fail_prob:
+                        self.snapshot_errors += 1
+                        status, body = 503, {"code": -1, "msg": "simulated failure"}
+                    else:
+                        self.snapshots += 1
+                        status, body = 200, book.snapshot(int(qs.get("limit", ["100"])[0]))
+            elif url.path == "/api/v3/ping":
+                status, body = 200, {}
+            payload = json.dumps(body, separators=(",", ":")).encode()
+            reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 503: "Service Unavailable"}[status]
+            writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    # ---- run
+
+    async def _stats(self, every_s: float = 5.0):
+        while True:
+            await asyncio.sleep(every_s)
+            print(f"[SIM] clients={len(self.clients)} sent={self.sent} gaps={self.gaps} disconnects={self.disconnects} "
+                  f"snapshots={self.snapshots} snapshot_errors={self.snapshot_errors}")
+
+    async def run(self):
+        frames = self._load_replay() if self.replay_path else None # before serving: a log for another symbol fails here
+        rest = await asyncio.start_server(self._rest_handler, self.host, self.rest_port)
+        async with websockets.serve(self._ws_handler, self.host, self.ws_port, max_size=None), rest:
+            print(f"[SIM] ws://{self.host}:{self.ws_port}/stream  http://{self.host}:{self.rest_port}/api/v3/depth")
+            tasks = [asyncio.create_task(self._replay(frames) if self.replay_path else self._synthetic()),
+                     asyncio.create_task(self._stats())]
+            if self.disconnect_every:
+                tasks.append(asyncio.create_task(self._disconnector()))
+            await asyncio.gather(*tasks)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local Binance-compatible market data simulator")
+    ap.add_argument("--symbols", default="BTCUSDT", help="comma separated; with --replay it must include the recorded symbol")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--ws-port", type=int, default=9443)
+    ap.add_argument("--rest-port", type=int, default=9444)
+    ap.add_argument("--rate", type=float, default=200.0, help="events/s per symbol")
+    ap.add_argument("--trade-ratio", type=float, default=0.3)
+    ap.add_argument("--burst", help="EVERY_S:LENGTH_S:FACTOR, e.g. 10:2:20")
+    ap.add_argument("--gap-prob", type=float, default=0.0)
+    ap.add_argument("--disconnect-every", type=float, default=None, help="seconds")
+    ap.add_argument("--snapshot-delay-ms", type=float, default=0.0)
+    ap.add_argument("--snapshot-fail-prob", type=float, default=0.0)
+    ap.add_argument("--replay", help="serve a recorded feed log instead of synthetic flow")
+    ap.add_argument("--speed", type=float, default=1.0)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    sim = ExchangeSim(
+        [s.strip() for s in args.symbols.split(",") if s.strip()],
+        host=args.host, ws_port=args.ws_port, rest_port=args.rest_port,
+        rate=args.rate, trade_ratio=args.trade_ratio,
+        burst=tuple(float(x) for x in args.burst.split(":")) if args.burst else None,
+        gap_prob=args.gap_prob, disconnect_every=args.disconnect_every,
+        snapshot_delay_ms=args.snapshot_delay_ms, snapshot_fail_prob=args.snapshot_fail_prob,
+        replay_path=args.replay, speed=args.speed, seed=args.seed,
+    )
+    try:
+        asyncio.run(sim.run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
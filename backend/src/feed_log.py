@@ -0,0 +1,92 @@
+import json
+import os
+import struct
+import time
+from typing import Iterator, Tuple
+
+# Binary feed log: everything needed to re-run a session offline.
+#
+# File layout (append-only):
+#   MAGIC (8 bytes)
+#   record, record, record, ...
+#
+# Every record is a fixed 13-byte header followed by the payload:
+#   kind        u8   (REC_FRAME = raw WS frame, REC_SNAPSHOT = REST snapshot JSON)
+#   ts_recv_us  i64  (our receive timestamp, microseconds)
+#   length      u32  (payload size in bytes)
+#   payload     length bytes, stored exactly as received (no re-encoding)
+#
+# A record cut short by a crash is simply ignored by the reader.
+
+MAGIC = b"MMFEED01"
+REC_FRAME = 0
+REC_SNAPSHOT = 1
+
+_HEADER = struct.Struct("<BqI")
+
+
+class FeedRecorder:
+    """
+    Appends raw WS frames + REST snapshots to a feed log.
+    Writes go through a large file buffer, so write_frame() is a struct pack
+    and a buffered write — no syscall per frame.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 1 << 20):
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new_file:
+            with open(path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{path} is not a feed log")
+        self.path = path
+        self._f = open(path, "ab", buffering=buffer_size)
+        if new_file:
+            self._f.write(MAGIC)
+        self.records = 0
+
+    def _write(self, kind: int, ts_recv_us: int, payload: bytes):
+        self._f.write(_HEADER.pack(kind, ts_recv_us, len(payload)))
+        self._f.write(payload)
+        self.records += 1
+
+    def write_frame(self, raw, ts_recv_us: int):
+        """ raw = whatever ws.recv() returned (str for text frames, bytes for binary) """
+        self._write(REC_FRAME, ts_recv_us, raw.encode() if isinstance(raw, str) else raw)
+
+    def write_snapshot(self, data: dict, ts_recv_us: int | None = None):
+        if ts_recv_us is None:
+            ts_recv_us = int(time.time() * 1_000_000)
+        self._write(REC_SNAPSHOT, ts_recv_us, json.dumps(data, separators=(",", ":")).encode())
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_feed_log(path: str) -> Iterator[Tuple[int, int, bytes]]:
+    """ Yields (kind, ts_recv_us, payload) for every complete record, in file order """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a feed log")
+        data = f.read()
+
+    view = memoryview(data)
+    pos = 0
+    end = len(data)
+    hsize = _HEADER.size
+    unpack = _HEADER.unpack_from
+    while pos + hsize <= end:
+        kind, ts_recv_us, length = unpack(data, pos)
+        pos += hsize
+        if pos + length > end: # truncated last record
+            break
+        yield kind, ts_recv_us, bytes(view[pos:pos + length])
+        pos += length
@@ -0,0 +1,133 @@
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+from latency import LogHistogram
+from market_handler import DepthDiff
+
+# Queue between the receive loop and book_consumer that conflates depth diffs.
+#
+# With a plain asyncio.Queue, a slow consumer makes the receive loop block on
+# put(), the socket buffers fill up and every event is handled later and later.
+# Here, a DepthDiff that arrives while the previous queued event is another
+# DepthDiff that nobody has taken yet is MERGED into it instead of queued:
+#
+#   queued  U=101 u=105 bids {90000.0: 1.2}
+#   new     U=106 u=108 bids {90000.0: 0.0, 89999.9: 3.1}
+#   merged  U=101 u=108 bids {90000.0: 0.0, 89999.9: 3.1}   (later quantity wins)
+#
+# Levels are absolute quantities, so applying the merged diff gives exactly the
+# same book as applying both, and the book's sync/gap checks still work on
+# U..u. Diffs are only merged when their ids follow on (so a real gap still
+# reaches the book), never across a trade (event order is kept), and trades are
+# never merged or dropped. put() only waits when the queue is full of things
+# that can't be merged.
+
+
+class ConflatingQueue(asyncio.Queue):
+    def __init__(self, maxsize: int = 10000, conflate_at: int = 1):
+        """ conflate_at: merge only once at least this many events are waiting (1 = whenever possible, 0 = never) """
+        super().__init__(maxsize)
+        self.conflate_at = conflate_at
+        self._tail_levels = None # (bids dict, asks dict) of the last queued diff once something was merged into it
+
+        # metrics
+        self.diffs_in = 0
+        self.diffs_out = 0
+        self.trades_in = 0
+        self.merged = 0
+        self.max_depth = 0
+        self.age = LogHistogram() # ns from receive (ts_recv_us) to taken by the consumer
+
+    def _init(self, maxsize):
+        self._queue = deque()
+
+    def _can_merge(self, ev) -> bool:
+        q = self._queue
+        if not self.conflate_at or len(q) < self.conflate_at or not isinstance(ev, DepthDiff):
+            return False
+        tail = q[-1]
+        if not isinstance(tail, DepthDiff) or tail.symbol != ev.symbol:
+            return False
+        return ev.pu == tail.u if ev.pu is not None else ev.U == tail.u + 1 # contiguous, else let the book see the gap
+
+    def _merge(self, ev: DepthDiff):
+        tail = self._queue[-1]
+        if self._tail_levels is None:
+            self._tail_levels = (dict(tail.bids), dict(tail.asks))
+        bids, asks = self._tail_levels
+        bids.update(ev.bids)
+        asks.update(ev.asks)
+        tail.u = ev.u # pu stays the first diff's: the merged diff follows on from the same place
+        tail.ts_event_us = ev.ts_event_us # the book state it brings us to is as of the newest diff
+        tail.ts_recv_us = ev.ts_recv_us
+        self.merged += 1
+        self.diffs_in += 1
+
+    def _put(self, ev):
+        if self._tail_levels is not None: # tail won't grow any more → freeze its level lists
+            self._freeze_tail()
+        self._queue.append(ev)
+        if isinstance(ev, DepthDiff):
+            self.diffs_in += 1
+        else:
+            self.trades_in += 1
+        if len(self._queue) > self.max_depth:
+            self.max_depth = len(self._queue)
+
+    def _freeze_tail(self):
+        tail = self._queue[-1]
+        bids, asks = self._tail_levels
+        tail.bids = list(bids.items())
+        tail.asks = list(asks.items())
+        self._tail_levels = None
+
+    def _get(self):
+        q = self._queue
+        if self._tail_levels is not None and len(q) == 1: # taking the diff that is still being merged into
+            self._freeze_tail()
+        ev = q.popleft()
+        if isinstance(ev, DepthDiff):
+            self.diffs_out += 1
+        if ev.ts_recv_us:
+            self.age.record(max(0, time.time_ns() - ev.ts_recv_us * 1000))
+        return ev
+
+    def put_nowait(self, ev):
+        if self._can_merge(ev): # merging never needs a free slot (and adds no task: one get() takes both)
+            self._merge(ev)
+            return
+        super().put_nowait(ev)
+
+    async def put(self, ev):
+        if self._can_merge(ev): # → put() only ever waits for events that can't be merged
+            self._merge(ev)
+            return
+        await super().put(ev)
+
+    # ---- metrics
+
+    def stats(self, reset: bool = False) -> dict:
+        s = {
+            "depth": self.qsize(),
+            "max_depth": self.max_depth,
+            "diffs_in": self.diffs_in,
+            "diffs_out": self.diffs_out,
+            "trades": self.trades_in,
+            "conflation_ratio": round(self.diffs_in / self.diffs_out, 3) if self.diffs_out else None, # diffs received per diff applied
+            "age_p50_ms": self.age.percentile(50) / 1e6,
+            "age_p99_ms": self.age.percentile(99) / 1e6,
+            "age_max_ms": self.age.max / 1e6,
+        }
+        if reset:
+            self.diffs_in = self.diffs_out = self.trades_in = self.merged = 0
+            self.max_depth = self.qsize()
+            self.age.reset()
+        return s
+
+    def format(self, stats: Optional[dict] = None) -> str:
+        s = self.stats() if stats is None else stats
+        ratio = f"{s['conflation_ratio']:.2f}x" if s["conflation_ratio"] else "-"
+        return (f"[QUEUE] depth={s['depth']} max={s['max_depth']} diffs {s['diffs_in']}→{s['diffs_out']} ({ratio}) "
+                f"trades={s['trades']} age p50={s['age_p50_ms']:.2f}ms p99={s['age_p99_ms']:.2f}ms max={s['age_max_ms']:.2f}ms")
@@ -0,0 +1,431 @@
+import asyncio
+import multiprocessing as mp
+import struct
+import sys
+import threading
+import time
+from itertools import chain
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional
+
+from market_handler import DepthDiff, MarketDecoder, Trade
+from ticks import TICK_SPECS, TickSpec
+
+# Ingestion off the strategy loop.
+#
+#   ingest thread / process                     strategy loop (data_feed)
+#   -----------------------                     -------------------------
+#   ws.recv() → ts_recv_us → parse_frame        drain(batch) → handle_event → book / maker
+#   encode → SpscRing  ─────── shared ring ───► decode
+#
+# Socket reads, receive timestamps and decoding happen on their own thread
+# ("thread": shares the GIL, but recv() releases it and a slow on_book_update no
+# longer holds up reading the socket) or their own process ("process": a second
+# core; the ring lives in shared memory).
+#
+# SpscRing is a preallocated single-producer / single-consumer byte ring: the
+# producer only ever writes `head`, the consumer only ever writes `tail`, so
+# neither side takes a lock. Events go through it as compact binary records
+# (fixed header + f64 or i64 level pairs), not pickles. The consumer takes
+# whatever is there in one batch and publishes its tail once per batch.
+#
+# When the consumer runs out of events it raises a `waiting` flag and sleeps on
+# a pipe; the producer writes one byte to it after its next push. If the ring is
+# full, the producer waits (and counts it) instead of dropping: a dropped diff
+# would only turn into a gap and a resync.
+
+MAGIC = b"MMRING01"
+U32 = struct.Struct("<I")
+U64 = struct.Struct("<Q")
+# header, one 64-byte line per writer
+CAPACITY = 8 # u64
+HEAD = 64 # u64, producer: bytes written
+PUSHED = 72 # u64, producer: events pushed
+FULL_WAITS = 80 # u64, producer: pushes that found the ring full
+TAIL = 128 # u64, consumer: bytes read
+WAITING = 136 # u32, consumer: 1 = asleep, wake me
+DATA = 192
+WRAP = 0xFFFFFFFF # length marker: rest of the ring is unused, record continues at 0
+PREFIX = 8 # u32 length + pad, so payloads stay 8-byte aligned
+
+
+def _align8(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """ Open the owner's ring without tracking it here: only the owner unlinks it """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    # Before 3.13 attaching registers the segment with this process's resource tracker. With a tracker
+    # of its own, the consumer would unlink the ring at exit ("leaked shared_memory") under the owner.
+    # Unregistering afterwards is no good either: a spawned child shares the parent's tracker, so that
+    # would drop the owner's registration. So the attach is simply never registered.
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+
+class SpscRing:
+    """ Byte ring in shared memory: length-prefixed records, 8-byte aligned """
+
+    def __init__(self, capacity: int = 1 << 23, name: Optional[str] = None, create: bool = True):
+        if create:
+            if capacity & (capacity - 1):
+                raise ValueError("capacity must be a power of two")
+            self.shm = shared_memory.SharedMemory(name, create=True, size=DATA + capacity)
+            self.buf = self.shm.buf
+            self.buf[:DATA] = bytes(DATA)
+            self.buf[:8] = MAGIC
+            U64.pack_into(self.buf, CAPACITY, capacity)
+        else:
+            self.shm = _attach(name)
+            self.buf = self.shm.buf
+            if bytes(self.buf[:8]) != MAGIC:
+                raise ValueError(f"{name!r} is not an ingest ring")
+            capacity = U64.unpack_from(self.buf, CAPACITY)[0]
+        self.name = self.shm.name
+        self.owner = create
+        self.capacity = capacity
+        self.max_record = capacity // 4
+        self._mask = capacity - 1
+        self._head = U64.unpack_from(self.buf, HEAD)[0] # producer's own copy
+        self._tail = U64.unpack_from(self.buf, TAIL)[0] # consumer's own copy
+        self._tail_seen = self._tail # producer's last look at the consumer's tail
+        self._next = self._head
+        self._pushed = 0
+        self.max_backlog = 0 # consumer: most bytes waiting when it came to drain
+
+    # ---- producer side
+
+    def reserve(self, n: int) -> int:
+        """ Offset in self.buf to write an n-byte record at, or -1 if the ring is full. Follow with commit() """
+        need = _align8(n + PREFIX)
+        if need > self.max_record:
+            raise ValueError(f"record of {n} bytes doesn't fit a {self.capacity}-byte ring")
+        head = self._head
+        pos = head & self._mask
+        skip = self.capacity - pos if need > self.capacity - pos else 0 # records never wrap → skip the ring's end
+        end = head + skip + need
+        if end - self._tail_seen > self.capacity:
+            self._tail_seen = U64.unpack_from(self.buf, TAIL)[0]
+            if end - self._tail_seen > self.capacity:
+                return -1
+        if skip:
+            U32.pack_into(self.buf, DATA + pos, WRAP)
+            pos = 0
+        U32.pack_into(self.buf, DATA + pos, n)
+        self._next = end
+        return DATA + pos + PREFIX
+
+    def commit(self):
+        """ Publish the reserved record: the consumer can see it from now on """
+        self._head = self._next
+        self._pushed += 1
+        U64.pack_into(self.buf, PUSHED, self._pushed)
+        U64.pack_into(self.buf, HEAD, self._head) # last: the record is complete before the consumer can reach it
+
+    def consumer_waiting(self) -> bool:
+        """ True (once) if the consumer went to sleep and should be woken """
+        if U32.unpack_from(self.buf, WAITING)[0]:
+            U32.pack_into(self.buf, WAITING, 0)
+            return True
+        return False
+
+    def count_full(self):
+        U64.pack_into(self.buf, FULL_WAITS, U64.unpack_from(self.buf, FULL_WAITS)[0] + 1)
+
+    # ---- consumer side
+
+    def drain(self, decode, max_n: int = 512) -> list:
+        """ decode(buf, offset, size) for up to max_n records, oldest first; frees their space in one go """
+        buf = self.buf
+        head = U64.unpack_from(buf, HEAD)[0]
+        tail = self._tail
+        mask, cap = self._mask, self.capacity
+        if head - tail > self.max_backlog:
+            self.max_backlog = head - tail
+        out = []
+        while tail < head and len(out) < max_n:
+            pos = tail & mask
+            n = U32.unpack_from(buf, DATA + pos)[0]
+            if n == WRAP:
+                tail += cap - pos
+                continue
+            out.append(decode(buf, DATA + pos + PREFIX, n))
+            tail += (n + PREFIX + 7) & ~7
+        if tail != self._tail:
+            self._tail = tail
+            U64.pack_into(buf, TAIL, tail)
+        return out
+
+    def empty(self) -> bool:
+        return U64.unpack_from(self.buf, HEAD)[0] == self._tail
+
+    def set_waiting(self, waiting: bool):
+        U32.pack_into(self.buf, WAITING, int(waiting))
+
+    def used(self) -> int:
+        if self.buf is None:
+            return 0
+        return U64.unpack_from(self.buf, HEAD)[0] - U64.unpack_from(self.buf, TAIL)[0]
+
+    def counters(self) -> dict:
+        buf = self.buf
+        if buf is None: # closed
+            return {"pushed": self._pushed, "full_waits": 0}
+        return {
+            "pushed": U64.unpack_from(buf, PUSHED)[0],
+            "full_waits": U64.unpack_from(buf, FULL_WAITS)[0],
+        }
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# ---------------------------------------------------------------- event records
+
+K_DEPTH = 1
+K_TRADE = 2
+# kind, flags (depth: has pu / trade: taker sold), n_bids, n_asks, U, u, pu, ts_event_us, ts_recv_us, t_recv_ns, t_enq_ns
+DEPTH = struct.Struct("<BBxxIIxxxxqqqqqqq")
+TRADE_F = struct.Struct("<BB6xqddqqqq") # kind, flags, trade_id, price, qty, ts_event_us, ts_recv_us, t_recv_ns, t_enq_ns
+TRADE_T = struct.Struct("<BB6xqqqqqqq") # same with int ticks / lots
+
+
+class EventCodec:
+    """ DepthDiff / Trade ⇄ ring records for one symbol (float mode: f64 levels, tick mode: i64) """
+
+    def __init__(self, symbol: str, tick_spec: Optional[TickSpec] = None):
+        self.symbol = symbol.upper()
+        self.fmt = "q" if tick_spec is not None else "d"
+        self.trade = TRADE_T if tick_spec is not None else TRADE_F
+
+    def encode(self, ring: SpscRing, ev) -> bool:
+        """ Write ev into the ring; False if it is full """
+        if type(ev) is DepthDiff:
+            bids, asks = ev.bids, ev.asks
+            n = 2 * (len(bids) + len(asks))
+            off = ring.reserve(DEPTH.size + 8 * n)
+            if off < 0:
+                return False
+            # header and levels in one pack_into (struct caches the compiled format per level count)
+            struct.pack_into(f"{DEPTH.format}{n}{self.fmt}", ring.buf, off, K_DEPTH, ev.pu is not None, len(bids), len(asks),
+                             ev.U, ev.u, ev.pu or 0, ev.ts_event_us, ev.ts_recv_us, ev.t_recv_ns, ev.t_enq_ns,
+                             *chain.from_iterable(bids), *chain.from_iterable(asks))
+        else:
+            off = ring.reserve(self.trade.size)
+            if off < 0:
+                return False
+            self.trade.pack_into(ring.buf, off, K_TRADE, ev.taker_side == "sell", ev.trade_id, ev.price, ev.qty,
+                                 ev.ts_event_us, ev.ts_recv_us, ev.t_recv_ns, ev.t_enq_ns)
+        ring.commit()
+        return True
+
+    def decode(self, buf, off: int, size: int):
+        if buf[off] == K_DEPTH:
+            _, has_pu, nb, na, U, u, pu, ts_event, ts_recv, t_recv, t_enq = DEPTH.unpack_from(buf, off)
+            vals = buf[off + DEPTH.size:off + size].cast(self.fmt).tolist()
+            b = iter(vals[:2 * nb]) # zip(it, it) pairs up consecutive values
+            a = iter(vals[2 * nb:])
+            return DepthDiff("depth_diff", ts_event, ts_recv, self.symbol, U, u, pu if has_pu else None,
+                             list(zip(b, b)), list(zip(a, a)), t_recv, t_enq)
+        _, sell, trade_id, price, qty, ts_event, ts_recv, t_recv, t_enq = self.trade.unpack_from(buf, off)
+        return Trade("trade", ts_event, ts_recv, self.symbol, trade_id, price, qty, "sell" if sell else "buy", t_recv, t_enq)
+
+
+# ---------------------------------------------------------------- producer
+
+def produce(ring: SpscRing, url: str, symbol: str, tick_key: Optional[str], wake, stop, stamp_ns: bool,
+            reconnect_delay_s: float = 1.0):
+    """ Producer loop (ingest thread / process): recv → timestamp → decode → ring, reconnecting until stop is set """
+    from websockets.exceptions import ConnectionClosed
+    from websockets.sync.client import connect
+
+    tick_spec = TICK_SPECS[tick_key] if tick_key else None
+    decoder = MarketDecoder(expect_microseconds=True, tick_specs={symbol.upper(): tick_spec} if tick_spec else None)
+    codec = EventCodec(symbol, tick_spec)
+    now_ns = time.perf_counter_ns # monotonic and system-wide on Linux → comparable across processes
+
+    while not stop.is_set():
+        try:
+            with connect(url, ping_interval=15, ping_timeout=10) as ws:
+                print(f"[INGEST] connected {url}")
+                while not stop.is_set():
+                    try:
+                        raw = ws.recv(timeout=0.5) # wake up now and then to notice stop
+                    except TimeoutError:
+                        continue
+                    t_recv_ns = now_ns() if stamp_ns else 0
+                    ts_recv_us = int(time.time() * 1_000_000)
+                    ev = decoder.parse_frame(raw, ts_recv_us)
+                    if ev is None:
+                        continue
+                    if stamp_ns:
+                        ev.t_recv_ns = t_recv_ns
+                        ev.t_enq_ns = now_ns()
+                    if not codec.encode(ring, ev):
+                        ring.count_full()
+                        while not codec.encode(ring, ev): # full: wait for the consumer, never drop
+                            if stop.is_set():
+                                return
+                            time.sleep(0.0002)
+                    if ring.consumer_waiting():
+                        wake.send_bytes(b"\x01")
+        except (ConnectionClosed, OSError) as e:
+            if stop.is_set():
+                break
+            print(f"[INGEST] disconnected ({e!r}) → reconnecting in {reconnect_delay_s}s")
+            stop.wait(reconnect_delay_s)
+
+
+def _produce_in_process(ring_name: str, *args):
+    ring = SpscRing(name=ring_name, create=False)
+    try:
+        produce(ring, *args)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+
+# ---------------------------------------------------------------- consumer
+
+class Ingestor:
+    """
+    Runs the producer on a thread or process and hands the strategy loop batches of events.
+
+        ingest = Ingestor(WS_URL, "BTCUSDT", mode="process")
+        ingest.start()
+        while True:
+            for ev in await ingest.get_batch():
+                handle_event(ev, book, maker)
+    """
+
+    def __init__(self, url: str, symbol: str, tick_spec: Optional[TickSpec] = None, mode: str = "thread",
+                 ring_bytes: int = 1 << 23, batch: int = 256, stamp_ns: bool = False, reconnect_delay_s: float = 1.0):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"unknown ingest mode {mode!r}")
+        self.url = url
+        self.symbol = symbol.upper()
+        self.tick_key = tick_spec.symbol if tick_spec is not None else None
+        self.mode = mode
+        self.batch = batch
+        self.stamp_ns = stamp_ns # t_recv_ns / t_enq_ns for LatencyStats
+        self.reconnect_delay_s = reconnect_delay_s
+        self.ring = SpscRing(ring_bytes)
+        self.codec = EventCodec(symbol, tick_spec)
+        self._ctx = mp.get_context("spawn")
+        self._wake_r, self._wake_w = self._ctx.Pipe(duplex=False)
+        self._wake_ev: Optional[asyncio.Event] = None
+        self._stop = None
+        self._worker = None
+
+        # consumer-side metrics (since last stats(reset=True))
+        self.events = 0
+        self.batches = 0
+        self.max_batch = 0
+        self.sleeps = 0
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._wake_ev = asyncio.Event()
+        loop.add_reader(self._wake_r.fileno(), self._on_wake)
+        if self.mode == "thread":
+            self._stop = threading.Event()
+            target, ring = produce, self.ring
+            self._worker = threading.Thread
+        else:
+            self._stop = self._ctx.Event()
+            target, ring = _produce_in_process, self.ring.name # the process attaches to the segment by name
+            self._worker = self._ctx.Process
+        args = (ring, self.url, self.symbol, self.tick_key, self._wake_w, self._stop, self.stamp_ns, self.reconnect_delay_s)
+        self._worker = self._worker(target=target, args=args, name="ingest", daemon=True)
+        self._worker.start()
+
+    def _on_wake(self):
+        while self._wake_r.poll():
+            self._wake_r.recv_bytes()
+        self._wake_ev.set()
+
+    def drain(self) -> list:
+        """ Whatever is in the ring right now (up to `batch` events), without waiting """
+        evs = self.ring.drain(self.codec.decode, self.batch)
+        if evs:
+            self.events += len(evs)
+            self.batches += 1
+            if len(evs) > self.max_batch:
+                self.max_batch = len(evs)
+        return evs
+
+    async def get_batch(self, idle_timeout: float = 0.05) -> list:
+        """ Next batch; sleeps on the wake pipe while the ring is empty """
+        ring = self.ring
+        while True:
+            evs = self.drain()
+            if evs:
+                await asyncio.sleep(0) # a busy ring must not starve the loop's other tasks (snapshot fetch, reporters)
+                return evs
+            self._wake_ev.clear()
+            ring.set_waiting(True)
+            if not ring.empty(): # pushed between drain() and raising the flag
+                ring.set_waiting(False)
+                continue
+            self.sleeps += 1
+            # the timer is only a safety net: the flag and the head live in different cache
+            # lines and Python can't fence them, so a wakeup could in theory be missed.
+            # (Not asyncio.wait_for: on 3.11 it can swallow a cancel that races the wakeup.)
+            timer = asyncio.get_running_loop().call_later(idle_timeout, self._wake_ev.set)
+            try:
+                await self._wake_ev.wait()
+            finally:
+                timer.cancel()
+                ring.set_waiting(False)
+
+    def stop(self):
+        if self._worker is None:
+            return
+        self._stop.set()
+        self._worker.join(timeout=2.0)
+        if self.mode == "process" and self._worker.is_alive():
+            self._worker.terminate()
+            self._worker.join()
+        self._worker = None
+        try:
+            asyncio.get_running_loop().remove_reader(self._wake_r.fileno())
+        except RuntimeError: # no loop any more
+            pass
+        self.ring.close()
+
+    # ---- metrics
+
+    def stats(self, reset: bool = False) -> dict:
+        c = self.ring.counters()
+        s = {
+            "mode": self.mode,
+            "events": self.events,
+            "batches": self.batches,
+            "avg_batch": round(self.events / self.batches, 1) if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "sleeps": self.sleeps,
+            "ring_used": self.ring.used(),
+            "ring_max_backlog": self.ring.max_backlog,
+            "ring_bytes": self.ring.capacity,
+            "pushed": c["pushed"],
+            "full_waits": c["full_waits"],
+        }
+        if reset:
+            self.events = self.batches = self.max_batch = self.sleeps = 0
+            self.ring.max_backlog = 0
+        return s
+
+    def format(self, stats: Optional[dict] = None) -> str:
+        s = self.stats() if stats is None else stats
+        return (f"[INGEST] {s['mode']} events={s['events']} batches={s['batches']} avg={s['avg_batch']} max={s['max_batch']} "
+                f"sleeps={s['sleeps']} ring {s['ring_used']}/{s['ring_bytes']}B (max {s['ring_max_backlog']}B) full_waits={s['full_waits']}")
@@ -0,0 +1,166 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+# Per-stage latency histograms (HDR-style: log-bucketed, fixed memory).
+#
+# Values are nanoseconds (ints). Each power of two is split into 64 linear
+# sub-buckets, so any recorded value is reported within ~1.6% of its true
+# value, from 1 ns up to ~2^47 ns (~39 hours). One histogram is a flat
+# list of ~2.7k counters no matter how many values go in.
+#
+# Stages recorded by the pipeline (see data_feed.handle_event / main):
+#   decode            recv → DepthDiff/Trade ready         (parse_frame)
+#   queue_wait        put on the asyncio Queue → taken off
+#   book_update       OrderBookEngine.on_depth_diff        (_apply_diff / sync)
+#   strategy          MarketMaker.on_book_update           (quote computation + emission)
+#   trade             MarketMaker.on_trade
+#   exchange_to_recv  Binance event time → our receive time (wall clocks, skew clamped to 0)
+#   tick_to_quote     our receive time → new quotes out     (monotonic)
+
+SUB_BITS = 7
+SUB_COUNT = 1 << SUB_BITS # values below this get one bucket each
+HALF = SUB_COUNT >> 1 # linear sub-buckets per power of two above that
+MAX_SHIFT = 40
+N_BUCKETS = SUB_COUNT + MAX_SHIFT * HALF
+
+
+def bucket_high(i: int) -> int:
+    """ Highest value that lands in bucket i """
+    if i < SUB_COUNT:
+        return i
+    j = i - SUB_COUNT
+    shift = j // HALF + 1
+    top = j % HALF + HALF
+    return ((top + 1) << shift) - 1
+
+
+class LogHistogram:
+    __slots__ = ("counts", "count", "total", "max", "min")
+
+    def __init__(self):
+        self.counts: List[int] = [0] * N_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.min = 0
+
+    def record(self, v: int):
+        # bucket index: exact below SUB_COUNT, then 64 linear steps per power of two
+        if v < SUB_COUNT:
+            i = v if v > 0 else 0
+        else:
+            shift = v.bit_length() - SUB_BITS
+            i = SUB_COUNT + (shift - 1) * HALF + (v >> shift) - HALF if shift <= MAX_SHIFT else N_BUCKETS - 1
+        self.counts[i] += 1
+        if self.count == 0 or v < self.min:
+            self.min = v
+        if v > self.max:
+            self.max = v
+        self.count += 1
+        self.total += v
+
+    def percentile(self, p: float) -> int:
+        if self.count == 0:
+            return 0
+        target = max(1, int(self.count * p / 100.0 + 0.5))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c:
+                seen += c
+                if seen >= target:
+                    return min(bucket_high(i), self.max)
+        return self.max
+
+    def merge(self, other: "LogHistogram"):
+        if other.count == 0:
+            return
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.min = other.min if self.count == 0 else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def reset(self):
+        self.counts = [0] * N_BUCKETS
+        self.count = self.total = self.max = self.min = 0
+
+    def summary(self) -> dict: # microseconds, for humans
+        return {
+            "count": self.count,
+            "mean_us": round(self.total / self.count / 1000, 3) if self.count else 0.0,
+            "p50_us": self.percentile(50) / 1000,
+            "p99_us": self.percentile(99) / 1000,
+            "p99.9_us": self.percentile(99.9) / 1000,
+            "max_us": self.max / 1000,
+        }
+
+
+class LatencyStats:
+    """
+    One LogHistogram per stage, created on first use.
+
+    Hot-path callers hold `lat` and check `if lat is not None:` before taking any
+    timestamps, so passing latency=None (the default everywhere) costs one
+    comparison per event.
+    """
+
+    def __init__(self):
+        self.hists: Dict[str, LogHistogram] = {}
+        self.started = time.time()
+
+    def record(self, stage: str, ns: int):
+        h = self.hists.get(stage)
+        if h is None:
+            h = self.hists[stage] = LogHistogram()
+        h.record(ns)
+
+    def snapshot(self, reset: bool = False) -> Dict[str, dict]:
+        """ {stage: {count, mean_us, p50_us, p99_us, p99.9_us, max_us}}; reset=True starts a new interval """
+        snap = {stage: h.summary() for stage, h in self.hists.items()}
+        if reset:
+            for h in self.hists.values():
+                h.reset()
+            self.started = time.time()
+        return snap
+
+    def format(self, snap: Optional[Dict[str, dict]] = None) -> str:
+        snap = self.snapshot() if snap is None else snap
+        lines = [f"{'stage':<17}{'count':>10}{'p50':>10}{'p99':>10}{'p99.9':>10}{'max':>11}   (µs)"]
+        for stage, s in snap.items():
+            lines.append(f"{stage:<17}{s['count']:>10}{s['p50_us']:>10.1f}{s['p99_us']:>10.1f}{s['p99.9_us']:>10.1f}{s['max_us']:>11.1f}")
+        return "\n".join(lines)
+
+    def dump(self, path: str):
+        """ Summary + raw bucket counts (so dumps from several runs/processes can be merged) """
+        data = {
+            "since": self.started,
+            "written": time.time(),
+            "summary": self.snapshot(),
+            "buckets": {
+                stage: {"count": h.count, "total": h.total, "min": h.min, "max": h.max,
+                        "counts": {i: c for i, c in enumerate(h.counts) if c}}
+                for stage, h in self.hists.items()
+            },
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp, path) # readers never see a half-written file
+
+    @staticmethod
+    def load(path: str) -> "LatencyStats":
+        with open(path) as f:
+            data = json.load(f)
+        stats = LatencyStats()
+        stats.started = data.get("since", stats.started)
+        for stage, b in data["buckets"].items():
+            h = LogHistogram()
+            for i, c in b["counts"].items():
+                h.counts[int(i)] = c
+            h.count, h.total, h.min, h.max = b["count"], b["total"], b["min"], b["max"]
+            stats.hists[stage] = h
+        return stats
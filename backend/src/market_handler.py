@@ -1,10 +1,13 @@
 from __future__ import annotations
-from dataclasses import dataclass #@dataclass creates simple data containers (less boilerplate).
-from typing import List, Tuple, Optional, Literal
+import json
+from dataclasses import dataclass, field #@dataclass creates simple data containers (less boilerplate).
+from typing import Dict, List, Tuple, Optional, Literal
+from ticks import TickSpec
 
 EventType = Literal["depth_diff", "trade"] # A type that can only be depth_diff or trade
 
-@dataclass
+# slots=True → no per-object __dict__: smaller objects and faster to create (one of each per WS frame)
+@dataclass(slots=True)
 class DepthDiff:
     etype: EventType     #tells us the kind of event("depth_diff")
     ts_event_us: int     # is Binance’s event timestamp in microseconds
@@ -13,31 +16,40 @@ class DepthDiff:
     U: int               # first update id
     u: int               # last update id
     pu: Optional[int]    # previous final update id (may be None)
-    bids: List[Tuple[float, float]]  # [(price, qty), ...]
+    bids: List[Tuple[float, float]]  # [(price, qty), ...]  ((ticks, lots) ints in tick mode)
     asks: List[Tuple[float, float]] # bids and asks are lists of (price, quantity) updates.
+    # monotonic stamps for latency instrumentation (0 = not measured); not part of equality
+    t_recv_ns: int = field(default=0, compare=False, repr=False)
+    t_enq_ns: int = field(default=0, compare=False, repr=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Trade:
     etype: EventType
     ts_event_us: int
     ts_recv_us: int
     symbol: str
     trade_id: int
-    price: float
-    qty: float
+    price: float   # int ticks in tick mode
+    qty: float     # int lots in tick mode
     taker_side: Literal["buy","sell"]  # buy=lifting ask, sell=hitting bid
+    t_recv_ns: int = field(default=0, compare=False, repr=False)
+    t_enq_ns: int = field(default=0, compare=False, repr=False)
 # taker_side: "buy" = aggressive buyer (lifted ask), "sell" = aggressive seller (hit bid).
 
+
 class MarketDecoder: # This class only converts raw Binance JSON → your DepthDiff/Trade objects.
     """
     Stateless decoder that converts Binance WS messages into normalized events.  “Stateless” = it doesn't keep order book state; just parsing
     Use this if you already have the WebSocket connection elsewhere.
     """
 
-    def __init__(self, expect_microseconds: bool = True):
+    def __init__(self, expect_microseconds: bool = True, tick_specs: Optional[Dict[str, TickSpec]] = None):
         # If your WS URL has &timeUnit=MICROSECOND, set True; else False.
         self.expect_microseconds = expect_microseconds
+        # Integer tick mode (opt-in): symbol -> TickSpec. Symbols listed here get
+        # prices as int ticks and quantities as int lots instead of floats (see ticks.py).
+        self.tick_specs = tick_specs or {}
 
     def _to_us(self, E: int | float | None, fallback_us: int) -> int: # Takes Binance’s E (event time) and returns microseconds. If E missing/bad → use your local receive time (fallback_us). If expect_microseconds=True → already µs; else convert ms → µs.
         if E is None:
@@ -49,6 +61,16 @@ class MarketDecoder: # This class only converts raw Binance JSON → your DepthD
         return Ei if self.expect_microseconds else Ei * 1000
 
 
+    # Hot path: raw WS frame (str/bytes) → DepthDiff / Trade. json.loads is C and doesn't care about
+    # key order or number formats; the per-level conversion is the same as parse_combined's.
+    def parse_frame(self, raw, ts_recv_us: int):
+        """ Raw combined-stream frame → DepthDiff / Trade, or None for anything we don't use / can't parse """
+        try:
+            msg = json.loads(raw)
+        except ValueError:
+            return None
+        return self.parse_combined(msg, ts_recv_us)
+
     # This function decides whether the message is: a depth update, a trade or something else
     # If stream == "btcusdt@depth@100ms" → send to _depth_from_payload
     # If stream == "btcusdt@trade" → send to _trade_from_payload
@@ -100,9 +122,15 @@ class MarketDecoder: # This class only converts raw Binance JSON → your DepthD
     def _depth_from_payload(self, d: dict, ts_recv_us: int): 
         evt_us = self._to_us(d.get("E"), ts_recv_us) #self._to_us is a function written in this code that converts into microseconds, if Binance didn't send E, then fallback to ts_recv_us.
 
-        bids = [(float(p), float(q)) for p, q in d.get("b", [])] # d.get("b", []) = list of bid updates,  Each bid is [price, quantity], Convert both to floats, Output shape: [(price, qty), (price, qty), ...]
+        spec = self.tick_specs.get(d.get("s")) if self.tick_specs else None
+        if spec is not None: # tick mode: parse the strings straight into (ticks, lots) ints, no float in between
+            tc, pt, ql = spec.ticks_cache, spec.price_to_ticks, spec.qty_to_lots # cache hit inline, saves a call per level
+            bids = [(tc[p] if p in tc else pt(p), ql(q)) for p, q in d.get("b", [])]
+            asks = [(tc[p] if p in tc else pt(p), ql(q)) for p, q in d.get("a", [])]
+        else:
+            bids = [(float(p), float(q)) for p, q in d.get("b", [])] # d.get("b", []) = list of bid updates,  Each bid is [price, quantity], Convert both to floats, Output shape: [(price, qty), (price, qty), ...]
 
-        asks = [(float(p), float(q)) for p, q in d.get("a", [])] # same thing as bids but for asks
+            asks = [(float(p), float(q)) for p, q in d.get("a", [])] # same thing as bids but for asks
 
         return DepthDiff( # this creates a clean object
             etype="depth_diff", # So your system knows this is a depth update.
@@ -119,14 +147,19 @@ class MarketDecoder: # This class only converts raw Binance JSON → your DepthD
     def _trade_from_payload(self, d: dict, ts_recv_us: int):
         evt_us = self._to_us(d.get("E"), ts_recv_us)
         taker_side = "sell" if d.get("m", True) else "buy" # m = true → buyer is market maker → taker is seller, m = false → taker is buyer
+        spec = self.tick_specs.get(d.get("s")) if self.tick_specs else None
+        if spec is not None: # tick mode
+            price, qty = spec.price_to_ticks(d["p"]), spec.qty_to_lots(d["q"])
+        else:
+            price, qty = float(d["p"]), float(d["q"])
         return Trade( #return a clean object
             etype="trade",
             ts_event_us=evt_us,
             ts_recv_us=ts_recv_us,
             symbol=d.get("s", "UNKNOWN"),
             trade_id=int(d["t"]),
-            price=float(d["p"]),
-            qty=float(d["q"]),
+            price=price,
+            qty=qty,
             taker_side=taker_side,
         )
 
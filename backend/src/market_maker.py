@@ -1,15 +1,18 @@
+import math
 from dataclasses import dataclass # This allows us to create **simple data containers**  (no logic, just data). Think of it like a **struct**
 from typing import Optional
 from market_handler import Trade  # Imports **real trade events** coming from Binance
 from order_book_engine import OrderBookEngine # Imports your order book.
+from order_manager import OrderManager
+from telemetry import CONSOLE
 
 # The market maker does NOT build prices itself. It reads the book to know where the market is.
 
 @dataclass
 class Quote: # This represents one order you place. For Example: Quote("buy", 87847.87, 0.001). Meaning “I want to buy 0.001 BTC at price 87847.87”
     side: str # This is your own order, not from the exchange.
-    price: float
-    qty: float
+    price: float # int ticks in tick mode
+    qty: float   # int lots in tick mode
 
 class MarketMaker:  # This class is your market-making engine. It decides prices, tracks inventory, tracks profit
     def __init__(
@@ -19,6 +22,10 @@ class MarketMaker:  # This class is your market-making engine. It decides prices
             max_inventory: float = 0.01,
             spread_offset: float = 0.01,
             inventory_skew: float = 0.02,
+            max_spread: float = 0.5,
+            use_microprice: bool = False,
+            levels: int = 1,
+            level_spacing: float = 0.01,
     ):
         self.book = book # Store a reference to your **live order book, The market maker **reads prices from here**: - best bid - best ask - spread
 
@@ -33,13 +40,41 @@ class MarketMaker:  # This class is your market-making engine. It decides prices
         self.inventory_skew = inventory_skew # Controls **how aggressively prices move** based on inventory.
         # Example: If you bought too much → lower prices to sell faster, If you sold too much → raise prices to buy back
 
-        # active quotes
-        self.bid_quote: Optional[Quote] = None # These store your current open orders. At any time: You may have one buy quote, One sell quote or None
+        # Quote ladder: `levels` quotes per side, level k sits k * level_spacing behind the first one.
+        # The resting orders live in the OrderManager (see order_manager.py); every book update only sends what changed.
+        if levels > 1 and level_spacing <= 0:
+            raise ValueError("levels > 1 needs level_spacing > 0 (the ladder prices must differ)")
+        self.levels = levels
+        self.level_spacing = level_spacing
+        self.orders = OrderManager()
+
+        # best resting quote per side (None if nothing rests there), kept up to date from self.orders
+        self.bid_quote: Optional[Quote] = None
         self.ask_quote: Optional[Quote] = None
 
         # PnL(Profit and Loss)
         self.realized_pnl = 0.0 # Tracks **actual money earned/lost** from completed trades. Buy → PnL decreases, Sell → PnL increases
 
+        self.max_spread = max_spread # don't quote when the market is wider than this
+
+        self.use_microprice = use_microprice # quote around BookSignals.microprice() instead of the mid (needs book.signals, see signals.py)
+
+        self.telemetry = CONSOLE # where [FILL] messages go (see telemetry.py); default = print
+
+        # Integer tick mode: if the book is in ticks, do all the quote math in ticks/lots too.
+        # Params are given in normal units and converted ONCE here; status() converts back.
+        self.tick_spec = book.tick_spec
+        spec = self.tick_spec
+        if spec is not None:
+            self.inventory = 0 # lots
+            self.max_inventory = spec.qty_to_lots_f(max_inventory) # lots
+            self.quote_size = spec.qty_to_lots_f(quote_size) # lots
+            self.spread_offset = spec.price_to_ticks_f(spread_offset) # ticks (0.01 → 1 tick for BTCUSDT)
+            self.inventory_skew = inventory_skew * spec.lot / spec.tick # ticks of skew per lot held
+            self.max_spread = spec.price_to_ticks_f(self.max_spread) # ticks
+            self.level_spacing = max(1, spec.price_to_ticks_f(level_spacing)) # ticks
+            self.realized_pnl = 0 # ticks × lots, exact integer
+
     
     # This function decides where to place buy and sell orders every time the order book changes.
     # Look at the market → decide my prices → place quotes safely
@@ -59,9 +94,12 @@ class MarketMaker:  # This class is your market-making engine. It decides prices
             return
         
         mid = (bb+ ba)/2 # Calculate Mid Price and Spread
-        spread = bb - ba
+        if self.use_microprice and self.book.signals is not None: # fair price leaning towards the thinner side, O(1)
+            mid = self.book.signals.microprice()
+        spread = ba - bb # ask is above bid, so this is >= 0
 
-        if spread > 0.5: # If the market is too wide, market is unstable, high risk, low liquidity, so dont place any orders. This is RISK MANAGEMENT
+        if spread > self.max_spread: # If the market is too wide, market is unstable, high risk, low liquidity, so dont place any orders. This is RISK MANAGEMENT
+            self.orders.cancel_all()
             self.bid_quote = None
             self.ask_quote = None
             return
@@ -79,65 +117,99 @@ class MarketMaker:  # This class is your market-making engine. It decides prices
         bid_price = mid - self.spread_offset - skew
         ask_price = mid + self.spread_offset - skew
 
-        # Enforce Inventory Limits
-        if self.inventory >= self.max_inventory: # If you already own too much BTC: Stop buying
-            bid_price = None
-
-        if self.inventory <= -self.max_inventory: # If you already sold too much BTC:Stop selling
-            ask_price = None
-
-        # Create Quotes
-        if bid_price:
-            self.bid_quote = (
-                Quote("buy", bid_price, self.quote_size)
-            )
+        if self.tick_spec is not None: # tick mode: quotes must sit on a tick → round away from the mid
+            bid_price = math.floor(bid_price)
+            ask_price = math.ceil(ask_price)
+
+        # Build the ladders. Enforce Inventory Limits per level: a level is only quoted if
+        # everything in front of it could fill without going past max_inventory
+        # (levels = 1: stop buying once you own too much BTC, stop selling once you sold too much)
+        size, inv, cap = self.quote_size, self.inventory, self.max_inventory
+        if self.levels == 1: # plain two-sided quote
+            bids = [(bid_price, size)] if inv < cap else []
+            asks = [(ask_price, size)] if inv > -cap else []
         else:
-            None
-
-        if ask_price:
-            self.ask_quote = (
-                Quote("sell", ask_price, self.quote_size)
-            )
-        else:
-            None
-    
+            step = self.level_spacing
+            bids = []
+            asks = []
+            for k in range(self.levels):
+                if inv + k * size < cap:
+                    bids.append((bid_price - k * step, size))
+                if inv - k * size > -cap:
+                    asks.append((ask_price + k * step, size))
+
+        # Only the difference to what is already resting gets sent / cancelled
+        changed = self.orders.sync("buy", bids)
+        changed = self.orders.sync("sell", asks) or changed
+        if changed or self.bid_quote is None or self.ask_quote is None:
+            self.refresh_quotes()
+
+    def refresh_quotes(self): # bid_quote / ask_quote ← best resting orders (also after fills applied from outside, see backtest.py)
+        o = self.orders.bids.best()
+        q = self.bid_quote
+        if o is None:
+            self.bid_quote = None
+        elif q is None or q.price != o.price or q.qty != o.remaining:
+            self.bid_quote = Quote("buy", o.price, o.remaining)
+        o = self.orders.asks.best()
+        q = self.ask_quote
+        if o is None:
+            self.ask_quote = None
+        elif q is None or q.price != o.price or q.qty != o.remaining:
+            self.ask_quote = Quote("sell", o.price, o.remaining)
 
     def on_trade(self, trade: Trade): # This runs every time a trade happens in the market.
         """
         Simulate fills using trade prints
         """
         # A trade print means: Someone actually bought or sold at a real price.
-
-        if self.bid_quote and trade.price <= self.bid_quote.price: # What this checks: Do I currently have a buy order (bid_quote)? Did the market trade at or below my buy price? If yes → someone sold into me.
+        # Did the market trade at or below one of my buy prices? Then someone sold into me (at or above a sell price: bought from me).
         # Example
-        # Your buy quote:
-        # BUY 0.001 BTC @ 100.00
+        # Your buy quotes:
+        # BUY 0.001 BTC @ 100.00, BUY 0.001 BTC @ 99.99
         # Market trade:
-        # TRADE at 99.98
-        # ✅ Trade price ≤ your bid price
-        # 👉 Your buy order gets filled.
-            self.inventory += self.bid_quote.qty # You now own BTC.
-
-            self.realized_pnl -= trade.price*self.bid_quote.qty # You spent money, so PnL goes down.
-            print(f"[FILL] BUY {trade.price}")
-            self.bid_quote = None # Order is done.
-
-        if self.ask_quote and trade.price >= self.ask_quote.price:
-            # Similar to that of buy
-            self.inventory -= self.ask_quote.qty # You sold BTC
-            self.realized_pnl += trade.price*self.ask_quote.qty # We gained money, so PnL goes up
-
-            print(f"[FILL] SELL {trade.price}")
-
-            self.ask_quote = None # Order is done
-
+        # TRADE 0.0015 BTC at 99.98
+        # ✅ Trade price ≤ both bid prices
+        # 👉 100.00 fills completely, 99.99 fills 0.0005 (partial), both at their own price.
+        # Only the levels the print reaches are looked at (order_manager.py), not the whole ladder.
+        fills = self.orders.match(trade.price, trade.qty)
+        if not fills:
+            return
+        for o, qty in fills:
+            if o.side == "buy":
+                self.inventory += qty # You now own BTC.
+                self.realized_pnl -= o.price * qty # You spent money, so PnL goes down.
+                self.telemetry.event("fill", "BUY", self.book.to_price(o.price))
+            else:
+                self.inventory -= qty # You sold BTC
+                self.realized_pnl += o.price * qty # We gained money, so PnL goes up
+                self.telemetry.event("fill", "SELL", self.book.to_price(o.price))
+        self.refresh_quotes() # a filled order is done; the next book update quotes the level again
+
+
+    # Position, cash and resting orders in internal units (lots / ticks in tick mode), so another
+    # MarketMaker can carry on exactly where this one stopped (multi_feed.py moves a symbol between shards)
+    def export_state(self) -> dict:
+        return {"inventory": self.inventory, "realized_pnl": self.realized_pnl, "orders": self.orders.export()}
+
+    def restore_state(self, state: dict):
+        self.inventory = state["inventory"]
+        self.realized_pnl = state["realized_pnl"]
+        self.orders.restore(state["orders"])
+        self.refresh_quotes()
 
     def status(self): # This function is called when you want to see what’s going on inside your market maker
         # Think of it like: “Show me my current position.”
+        # This is the reporting edge: in tick mode this is where ticks/lots become floats.
+        spec = self.tick_spec
+        inventory = spec.lots_to_qty(self.inventory) if spec else self.inventory
+        pnl = self.realized_pnl * spec.tick * spec.lot if spec else self.realized_pnl
         return {
-            "inventory" : round(self.inventory, 6),
-            "pnl" : round(self.realized_pnl, 2),
-            "bid": self.bid_quote.price if self.bid_quote else None,
-            "ask": self.ask_quote.price if self.ask_quote else None,
+            "inventory" : round(inventory, 6),
+            "pnl" : round(pnl, 2),
+            "bid": self.book.to_price(self.bid_quote.price) if self.bid_quote else None,
+            "ask": self.book.to_price(self.ask_quote.price) if self.ask_quote else None,
+            "bid_levels": len(self.orders.bids),
+            "ask_levels": len(self.orders.asks),
         }
 
@@ -0,0 +1,328 @@
+import asyncio
+import multiprocessing as mp
+import queue
+import time
+from typing import Dict, List, Optional
+
+import websockets
+
+from data_feed import RECONNECT_DELAY_S, REST_URL, WS_BASE, handle_event
+from market_handler import MarketDecoder
+from market_maker import MarketMaker
+from order_book_engine import OrderBookEngine
+from snapshot_sync import AsyncSnapshotSync
+
+# Multi-symbol market making, sharded across worker processes.
+#
+#   main process                          worker process (one per shard)
+#   ------------                          ------------------------------
+#   one WS connection, all symbols        its own asyncio loop
+#   recv + ts_recv_us                     parse_frame → OrderBookEngine → MarketMaker
+#   route raw frame by symbol  ──batch──► one book + maker + snapshot sync per symbol
+#   health table / rebalance  ◄─report──  events, lag, busy %, per-symbol state
+#
+# The main process never decodes: it only reads the symbol out of the stream
+# name, so one core can feed many shards. When a shard falls behind, its
+# busiest symbol is moved to the least loaded shard. The new shard starts that
+# book from a fresh snapshot, but the maker carries on: the old shard hands its
+# inventory, PnL and resting orders over (drop → handoff report → assign).
+#
+# Endpoints come from data_feed.py (MM_WS_BASE / MM_REST_URL), so this can run
+# against exchange_sim.py too.
+
+SYMBOLS = ["btcusdt", "ethusdt", "bnbusdt", "solusdt", "xrpusdt", "dogeusdt", "adausdt", "trxusdt"]
+
+
+def stream_url(symbols: List[str], ws_base: str = WS_BASE) -> str:
+    streams = "/".join(f"{s}@depth@100ms/{s}@trade" for s in symbols)
+    return f"{ws_base}?streams={streams}&timeUnit=MICROSECOND"
+
+
+def stream_symbol(raw) -> Optional[str]:
+    """ '{"stream":"btcusdt@trade",...' → "BTCUSDT" without parsing the JSON """
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode()
+    if not raw.startswith('{"stream":"'):
+        return None
+    end = raw.find("@", 11)
+    return raw[11:end].upper() if end != -1 else None
+
+
+# ---------------------------------------------------------------- worker side
+
+class _SymbolState:
+    def __init__(self, symbol: str, rest_url: str, maker_kwargs: dict, book_kwargs: dict):
+        self.book = OrderBookEngine(symbol, rest_url=rest_url, **book_kwargs)
+        self.maker = MarketMaker(self.book, **maker_kwargs)
+        self.sync = AsyncSnapshotSync(self.book)
+        self.sync.start()
+        self.events = 0 # since last report
+
+
+async def _shard_main(shard_id: int, inbox, reports, symbols: List[str], rest_url: str, maker_kwargs: dict, book_kwargs: dict, report_interval: float):
+    loop = asyncio.get_running_loop()
+    decoder = MarketDecoder(expect_microseconds=True)
+    states: Dict[str, _SymbolState] = {}
+    for s in symbols:
+        states[s] = _SymbolState(s, rest_url, maker_kwargs, book_kwargs)
+
+    processed = 0 # frames taken off the inbox (including dropped ones) → main computes lag from this
+    busy = 0.0 # seconds spent processing since last report
+    last_report = time.monotonic()
+
+    while True:
+        try:
+            # blocking get runs in a thread so snapshot fetches keep progressing on the loop
+            msg = await loop.run_in_executor(None, inbox.get, True, report_interval)
+        except queue.Empty:
+            msg = None
+
+        if msg is not None:
+            kind = msg[0]
+            if kind == "frames":
+                t0 = time.perf_counter()
+                for raw, ts_recv_us in msg[1]:
+                    ev = decoder.parse_frame(raw, ts_recv_us)
+                    st = states.get(ev.symbol) if ev is not None else None
+                    if st is not None: # symbol may have just been moved away → drop
+                        handle_event(ev, st.book, st.maker)
+                        st.events += 1
+                processed += len(msg[1])
+                busy += time.perf_counter() - t0
+            elif kind == "assign": # ("assign", symbol, maker state from the old shard or None)
+                if msg[1] not in states:
+                    st = states[msg[1]] = _SymbolState(msg[1], rest_url, maker_kwargs, book_kwargs)
+                    if msg[2] is not None:
+                        st.maker.restore_state(msg[2])
+            elif kind == "drop":
+                st = states.pop(msg[1], None)
+                if st is not None:
+                    await st.sync.stop()
+                # always answer, so the main process can assign the symbol to its new shard
+                reports.put({"shard": shard_id, "handoff": msg[1], "maker": st.maker.export_state() if st is not None else None})
+            elif kind == "stop":
+                break
+
+        await asyncio.sleep(0) # let snapshot tasks run
+
+        now = time.monotonic()
+        if now - last_report >= report_interval:
+            elapsed = now - last_report
+            reports.put({
+                "shard": shard_id,
+                "processed": processed,
+                "busy": busy / elapsed, # fraction of wall time spent on book + strategy work
+                "symbols": {
+                    s: {
+                        "rate": st.events / elapsed, # events/s
+                        "synced": st.book.synced,
+                        "last_update_id": st.book.last_update_id,
+                        "best_bid": st.book.best_bid(),
+                        "best_ask": st.book.best_ask(),
+                        **st.maker.status(),
+                        "book_mem": st.book.memory(), # levels held + bytes, per symbol
+                    }
+                    for s, st in states.items()
+                },
+            })
+            for st in states.values():
+                st.events = 0
+            busy = 0.0
+            last_report = now
+
+    for st in states.values():
+        await st.sync.stop()
+
+
+def shard_worker(shard_id: int, inbox, reports, symbols: List[str], rest_url: str, maker_kwargs: dict, book_kwargs: dict, report_interval: float):
+    """ Process entry point """
+    try:
+        asyncio.run(_shard_main(shard_id, inbox, reports, symbols, rest_url, maker_kwargs, book_kwargs, report_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+# ------------------------------------------------------------------ main side
+
+class ShardedRunner:
+    def __init__(
+            self,
+            symbols: List[str],
+            n_shards: int = 4,
+            ws_base: str = WS_BASE,
+            rest_url: str = REST_URL,
+            maker_kwargs: Optional[dict] = None,
+            book_kwargs: Optional[dict] = None, # e.g. {"depth_window": 200}: OrderBookEngine options for every symbol
+            batch_size: int = 64, # frames per inbox message (one pickle + one pipe write per batch)
+            flush_interval: float = 0.002, # max time a frame waits in a partial batch
+            report_interval: float = 1.0,
+            max_lag: int = 2000, # frames sent but not yet processed before a shard counts as behind
+            max_busy: float = 0.85,
+            rebalance_cooldown: float = 10.0,
+            reconnect_delay_s: float = RECONNECT_DELAY_S,
+    ):
+        self.symbols = [s.upper() for s in symbols]
+        self.n_shards = max(1, min(n_shards, len(self.symbols)))
+        self.ws_base = ws_base
+        self.rest_url = rest_url
+        self.maker_kwargs = maker_kwargs or {}
+        self.book_kwargs = book_kwargs or {}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.report_interval = report_interval
+        self.max_lag = max_lag
+        self.max_busy = max_busy
+        self.rebalance_cooldown = rebalance_cooldown
+        self.reconnect_delay_s = reconnect_delay_s
+
+        # round-robin initial placement
+        self.assignment: Dict[str, int] = {s: i % self.n_shards for i, s in enumerate(self.symbols)}
+        self._ctx = mp.get_context("spawn") # same behaviour on Linux and macOS
+        self.inboxes = [self._ctx.Queue() for _ in range(self.n_shards)]
+        self.reports = self._ctx.Queue()
+        self.procs: List[mp.Process] = []
+        self._batches: List[list] = [[] for _ in range(self.n_shards)]
+        self.sent = [0] * self.n_shards # frames handed to each shard
+        self.health: Dict[int, dict] = {} # latest report per shard
+        self._last_rebalance = 0.0
+        self.moves = 0
+        self._moving: Dict[str, int] = {} # symbol → new shard, until the old shard has handed the maker over
+        self.reconnects = 0
+
+    def start(self):
+        for i in range(self.n_shards):
+            mine = [s for s, sh in self.assignment.items() if sh == i]
+            p = self._ctx.Process(
+                target=shard_worker,
+                args=(i, self.inboxes[i], self.reports, mine, self.rest_url, self.maker_kwargs, self.book_kwargs, self.report_interval),
+                daemon=True,
+            )
+            p.start()
+            self.procs.append(p)
+
+    def stop(self):
+        self.flush()
+        for q in self.inboxes:
+            q.put(("stop",))
+        for p in self.procs:
+            p.join(timeout=5)
+
+    def route(self, raw, ts_recv_us: int):
+        sym = stream_symbol(raw)
+        shard = self.assignment.get(sym)
+        if shard is None:
+            return
+        batch = self._batches[shard]
+        batch.append((raw, ts_recv_us))
+        if len(batch) >= self.batch_size:
+            self._send(shard)
+
+    def _send(self, shard: int):
+        batch = self._batches[shard]
+        self._batches[shard] = []
+        self.inboxes[shard].put(("frames", batch))
+        self.sent[shard] += len(batch)
+
+    def flush(self):
+        for i, batch in enumerate(self._batches):
+            if batch:
+                self._send(i)
+
+    def lag(self, shard: int) -> int:
+        h = self.health.get(shard)
+        return self.sent[shard] - (h["processed"] if h else 0)
+
+    def poll_reports(self):
+        while True:
+            try:
+                r = self.reports.get_nowait()
+            except queue.Empty:
+                break
+            if "handoff" in r: # the old shard dropped a moved symbol: its maker state goes on to the new shard
+                sym = r["handoff"]
+                self.inboxes[self._moving.pop(sym, self.assignment[sym])].put(("assign", sym, r["maker"]))
+                continue
+            self.health[r["shard"]] = r
+
+    def move(self, symbol: str, to_shard: int):
+        src = self.assignment[symbol]
+        if src == to_shard:
+            return
+        self.flush() # frames already routed stay in order on the old shard, then it drops the book
+        self.inboxes[src].put(("drop", symbol))
+        self.assignment[symbol] = to_shard # the new shard ignores its frames until the handoff arrives (it resyncs anyway)
+        self._moving[symbol] = to_shard
+        self.moves += 1
+        print(f"[SHARDS] moved {symbol}: shard {src} → shard {to_shard}")
+
+    def rebalance(self):
+        """ Move the busiest symbol off a shard that is behind, onto the least loaded shard """
+        if len(self.health) < self.n_shards or time.monotonic() - self._last_rebalance < self.rebalance_cooldown:
+            return
+        if self._moving: # one move at a time: wait for the handoff
+            return
+        load = {i: self.health[i]["busy"] for i in range(self.n_shards)}
+        behind = [i for i in range(self.n_shards) if self.lag(i) > self.max_lag or load[i] > self.max_busy]
+        if not behind:
+            return
+        src = max(behind, key=lambda i: (self.lag(i), load[i]))
+        dst = min(range(self.n_shards), key=lambda i: (load[i], self.lag(i)))
+        if dst == src or dst in behind:
+            return
+        rates = {s: v["rate"] for s, v in self.health[src]["symbols"].items() if self.assignment.get(s) == src}
+        if len(rates) < 2: # a single symbol can't be split further
+            return
+        self.move(max(rates, key=rates.get), dst)
+        self._last_rebalance = time.monotonic()
+
+    def status_lines(self) -> List[str]:
+        lines = []
+        for i in range(self.n_shards):
+            h = self.health.get(i)
+            if h is None:
+                lines.append(f"[SHARD {i}] no report yet")
+                continue
+            syms = " ".join(
+                f"{s}:{'ok' if v['synced'] else 'sync'}/{v['rate']:.0f}/s/{v['book_mem']['bytes'] / 1024:.0f}KB"
+                for s, v in sorted(h["symbols"].items())
+            )
+            lines.append(f"[SHARD {i}] busy={h['busy']:.0%} lag={self.lag(i)} {syms}")
+        return lines
+
+    async def _housekeeping(self):
+        last_print = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+            self.poll_reports()
+            self.rebalance()
+            if time.monotonic() - last_print >= self.report_interval:
+                last_print = time.monotonic()
+                for line in self.status_lines():
+                    print(line)
+
+    async def run(self):
+        self.start()
+        keeper = asyncio.create_task(self._housekeeping())
+        url = stream_url([s.lower() for s in self.symbols], self.ws_base)
+        try:
+            while True: # reconnect forever; the shards keep their books and resync on the gap
+                try:
+                    async with websockets.connect(url, ping_interval=15, ping_timeout=10, max_size=None) as ws:
+                        print(f"Successful Connection ({len(self.symbols)} symbols, {self.n_shards} shards)")
+                        while True:
+                            raw = await ws.recv()
+                            ts_recv_us = int(time.time() * 1_000_000)
+                            self.route(raw, ts_recv_us)
+                except (websockets.ConnectionClosed, OSError) as e:
+                    self.flush() # frames from before the drop still go out ahead of the new connection's
+                    self.reconnects += 1
+                    print(f"[WS] disconnected ({e!r}) → reconnecting in {self.reconnect_delay_s}s")
+                    await asyncio.sleep(self.reconnect_delay_s)
+        finally: # real shutdown only (cancelled / Ctrl-C / a bug), not a dropped socket
+            keeper.cancel()
+            self.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(ShardedRunner(SYMBOLS, n_shards=4).run())
@@ -1,15 +1,39 @@
+import math
 import requests
 from collections import deque
-from typing import Dict
+from typing import Callable, Optional
 from market_handler import DepthDiff
+from book_side import BOOK_SIDES
+from ticks import TickSpec
+from telemetry import CONSOLE
 
 class OrderBookEngine:
-    def __init__(self, symbol: str, snapshot_limit: int=1000 ): # This __init__ function creates and prepares a fresh, empty order book that is not yet trusted until it syncs with the exchange.
+    def __init__(
+            self,
+            symbol: str,
+            snapshot_limit: int=1000,
+            book_side: str = "sorted",
+            tick_spec: Optional[TickSpec] = None,
+            snapshot_provider: Optional[Callable[[], dict]] = None,
+            rest_url: str = "https://api.binance.com",
+            depth_window: Optional[int] = None,
+            depth_window_bps: Optional[float] = None,
+    ): # This __init__ function creates and prepares a fresh, empty order book that is not yet trusted until it syncs with the exchange.
         
         self.symbol = symbol.upper()
         # price -> quantity
-        self.bids: Dict[float, float] = {} #stores the bids
-        self.asks: Dict[float, float] = {} #stores the asks
+        # book_side picks the data structure for each side (see book_side.py):
+        # - "sorted" → sorted price ladder, best bid/ask in O(1)
+        # - "dict"   → plain dict, best bid/ask scans every level
+        # - "ticks"  → array indexed by tick offset (needs tick_spec)
+        # tick_spec switches the book to integer tick mode: prices are int ticks and
+        # quantities int lots (the decoder must be created with the same spec).
+        if book_side == "ticks" and tick_spec is None:
+            raise ValueError("book_side='ticks' needs a tick_spec")
+        self.tick_spec = tick_spec
+        side_cls = BOOK_SIDES[book_side]
+        self.bids = side_cls(is_bid=True) #stores the bids
+        self.asks = side_cls(is_bid=False) #stores the asks
 
         self.last_update_id: int | None=None # This stores the **latest sequence number** you have applied , - `None` → “I have no snapshot yet”
         self.synced: bool = False
@@ -23,10 +47,54 @@ class OrderBookEngine:
         # - `100` → top 100 bids + asks
         # - `1000` → deeper book (more realistic)
 
-    def load_snapshot(self): # This function downloads a full starting order book from Binance once
-
+        # Where snapshots come from. Default = Binance REST. A replay passes the
+        # recorded snapshots instead so the book never touches the network.
+        self.rest_url = rest_url.rstrip("/") # REST base URL (point it at a local stand-in for testing)
+        self.snapshot_provider = snapshot_provider or self.fetch_snapshot
+        self.on_snapshot: Optional[Callable[[dict], None]] = None # called with every raw snapshot dict (used by the feed recorder)
+
+        # Non-blocking mode (see snapshot_sync.py): instead of fetching the snapshot inline,
+        # the book calls snapshot_requester() and keeps buffering diffs until
+        # complete_snapshot(data) is called with the result.
+        self.snapshot_requester: Optional[Callable[[], None]] = None
+        self.snapshot_pending: bool = False # a snapshot was requested and hasn't arrived yet
+
+        self.telemetry = CONSOLE # where status messages go (see telemetry.py); default = print
+
+        self.signals = None # BookSignals (see signals.py) sets itself here; None = no per-level bookkeeping
+
+        # Depth window (memory-bounded book): only levels near the touch are kept, at full fidelity.
+        # depth_window=K → the best K levels per side; depth_window_bps=X → everything within X bps of the touch.
+        # Levels further out are evicted in batches (a side holds 1x-3x the window, so eviction is rare)
+        # and updates behind the eviction edge are dropped. If the touch comes back to within one
+        # window of the edge, the levels past it are unknown → fresh snapshot, exactly like a gap.
+        if depth_window is not None and depth_window_bps is not None:
+            raise ValueError("use depth_window (levels) or depth_window_bps, not both")
+        self.depth_window = depth_window
+        self.depth_window_bps = depth_window_bps
+        self.windowed = depth_window is not None or depth_window_bps is not None
+        self.bid_edge = None # worst price still tracked on each side (None = nothing evicted)
+        self.ask_edge = None
+        self._window_lost = False
+        self.window_dropped = 0 # level updates ignored because they were behind the edge
+        self.window_evicted = 0 # levels removed by eviction
+        self.window_resyncs = 0
+
+        # Hot-path counters: always on, plain int adds (read with counters(), see diagnostics.py)
+        self.diffs_applied = 0
+        self.levels_applied = 0 # level updates across all applied diffs
+        self.max_diff_levels = 0 # most level updates in a single diff
+        self.stale_diffs = 0 # already applied (u <= last_update_id) → ignored
+        self.gaps = 0
+        self.stale_snapshots = 0 # snapshots too old to bridge the buffer
+        self.snapshot_requests = 0 # every resync: first sync, gaps, stale snapshots, lost window
+        self.try_sync_calls = 0
+        self.try_sync_steps = 0 # buffered diffs looked at inside _try_sync
+        self.max_buffer = 0 # most diffs buffered while waiting for a snapshot
+
+    def fetch_snapshot(self) -> dict:
         """ Fetch initial order book snapshot from Binance REST API """ 
-        url = "https://api.binance.com/api/v3/depth"   # Give me the current full order book state at this moment
+        url = f"{self.rest_url}/api/v3/depth"   # Give me the current full order book state at this moment
         params = { 
             "symbol": self.symbol, 
             "limit": self.snapshot_limit 
@@ -37,9 +105,6 @@ class OrderBookEngine:
         # - WebSocket reconnect - If your WS disconnects for even 1 second, then we need re-snapshot
         # - Engine restart / crash , then we Re-Snapshot
 
-        resp = requests.get(url, params=params, timeout=5)
-        data = resp.json()
-
         """
         You receive a response like:
             {
@@ -48,13 +113,45 @@ class OrderBookEngine:
             "asks": [["90106.20", "0.51"], ...]
             }
         """
+        resp = requests.get(url, params=params, timeout=5)
+        resp.raise_for_status()
+        return resp.json()
+
+    def load_snapshot(self): # This function downloads a full starting order book from Binance once (blocking)
+        self._install_snapshot(self.snapshot_provider())
+
+    def complete_snapshot(self, data: dict): # Non-blocking mode: the requested snapshot has arrived → install it and try to bridge the buffer
+        self._install_snapshot(data)
+        self._try_sync()
+
+    def _install_snapshot(self, data: dict):
+        if self.on_snapshot is not None:
+            self.on_snapshot(data)
+        self.apply_snapshot(data)
+        self.snapshot_pending = False
+
+    def _request_snapshot(self): # Ask for a fresh snapshot: inline (blocking) by default, or via snapshot_requester
+        if self.snapshot_pending: # one is already on its way
+            return
+        self.snapshot_requests += 1
+        if self.snapshot_requester is None:
+            self.load_snapshot()
+            return
+        self.snapshot_pending = True
+        self.snapshot_requester()
 
+    def apply_snapshot(self, data: dict): # Replaces the whole book with a snapshot dict (REST response format)
         # Reset local book , You wipe everything you had before Because the snapshot is the source of truth.
         self.bids.clear()
         self.asks.clear()
 
+        # float mode → float keys; tick mode → parse the strings straight into int ticks/lots
+        spec = self.tick_spec
+        to_price = spec.price_to_ticks if spec else float
+        to_qty = spec.qty_to_lots if spec else float
+
         for price, qty in data["bids"]:
-            self.bids[float(price)] = float(qty)
+            self.bids[to_price(price)] = to_qty(qty)
 
         """
         Now your book becomes:
@@ -66,31 +163,66 @@ class OrderBookEngine:
         """
         # We do the same for asks as we did for bids
         for price, qty in data["asks"]:
-            self.asks[float(price)] = float(qty)
+            self.asks[to_price(price)] = to_qty(qty)
 
         self.last_update_id = data["lastUpdateId"]
+        if self.windowed:
+            self._reset_window()
+        if self.signals is not None:
+            self.signals.rebuild()
         self.synced = False # Why? You fetched snapshot But you haven’t replayed buffered diffs yet So the book is not live yet.
 
 
+    def restore_levels(self, bids, asks, last_update_id: int):
+        """
+        Warm start from already parsed levels (a checkpoint, see book_checkpoint.py).
+        Installed exactly like a snapshot, but without asking for one: the first
+        live diffs bridge it in _try_sync, or trigger a REST snapshot if they can't.
+        """
+        if self.on_snapshot is not None: # keep recordings replayable: log it in snapshot format
+            spec = self.tick_spec
+            fmt_p = (lambda p: f"{spec.ticks_to_price(p):.{spec.price_decimals}f}") if spec else repr
+            fmt_q = (lambda q: f"{spec.lots_to_qty(q):.{spec.qty_decimals}f}") if spec else repr
+            self.on_snapshot({
+                "lastUpdateId": last_update_id,
+                "bids": [[fmt_p(p), fmt_q(q)] for p, q in bids],
+                "asks": [[fmt_p(p), fmt_q(q)] for p, q in asks],
+            })
+        self.bids.clear()
+        self.asks.clear()
+        for price, qty in bids:
+            self.bids[price] = qty
+        for price, qty in asks:
+            self.asks[price] = qty
+        self.last_update_id = last_update_id
+        if self.windowed:
+            self._reset_window()
+        if self.signals is not None:
+            self.signals.rebuild()
+        self.synced = False
+        self.snapshot_loaded = True # the first diff must not fetch a snapshot: it tries to bridge this one
+        self.snapshot_pending = False
+
     #Apply DIFF. ( on_depth_diff() decides what to do with each depth update: )
     def on_depth_diff(self, diff: DepthDiff):  # This function is called every time a depth update arrives from the WebSocket.
         # STEP 1: first ever diff → trigger snapshot
         if not self.snapshot_loaded:
             self.buffer.append(diff)
-            self.load_snapshot()
             self.snapshot_loaded = True
+            self._request_snapshot()
+            self._try_sync()
             return
         if not self.synced:
-            print(
-            f"[BUFFERING] "
-            f"U={diff.U} u={diff.u} last={self.last_update_id}"
-            )
+            self.telemetry.event("buffering", diff.U, diff.u, self.last_update_id)
             self.buffer.append(diff) # Store the update in the buffer
+            if len(self.buffer) > self.max_buffer:
+                self.max_buffer = len(self.buffer)
             self._try_sync() # Try to see if snapshot + buffer can now be connected
             return
         
         # Ignore old Updates
         if diff.u <= self.last_update_id:  # If the update you received is older than what you already applied, ignore it.
+            self.stale_diffs += 1
             return
         # ( example:
         # last_update_id = 100
@@ -100,29 +232,58 @@ class OrderBookEngine:
         
 
         # Detect a GAP
-        if diff.U > self.last_update_id + 1:  # This is the most critical safety check. This means you missed some updates, your order book is now wrong
+        if self._is_gap(diff):  # This is the most critical safety check. This means you missed some updates, your order book is now wrong
 
-            print("[ORDERBOOK] Gap Detected - > Resync")
-            self.load_snapshot()
+            self.telemetry.event("gap")
+            self.gaps += 1
+            self.synced = False
             self.buffer.clear()
+            self.buffer.append(diff) # keep it: the new snapshot may bridge right here
+            self._request_snapshot()
+            self._try_sync()
             return
         
         self._apply_diff(diff)
+        if self._window_lost:
+            self._window_resync()
+
+    def _is_gap(self, diff: DepthDiff) -> bool:
+        # pu (previous final update id, futures streams) must equal the last id we applied;
+        # without pu (spot) the diff must start at most at last_update_id + 1
+        if diff.pu is not None:
+            return diff.pu != self.last_update_id
+        return diff.U > self.last_update_id + 1
 
 
     # _try_sync() tries to connect the snapshot with the buffered depth updates so the order book becomes correct and usable.
     def _try_sync(self): # It is called: After snapshot , Every time a new diff is buffered
 
-        if self.last_update_id is None: #. If you haven’t fetched the snapshot yet: You don’t know the starting state You can’t syncSo you just wait
+        self.try_sync_calls += 1
+        if self.last_update_id is None or self.snapshot_pending: #. If you haven’t got the snapshot yet: You don’t know the starting state You can’t sync so you just wait
             return
 
         while self.buffer: # Loop over buffered diffs This means: “As long as there are buffered updates, try to process them.
             diff = self.buffer[0] # Look at the FIRST buffered diff,  Updates must be applied in order
+            self.try_sync_steps += 1
 
             if diff.u <= self.last_update_id: # Discard diffs that are too old
                 self.buffer.popleft()
                 continue
 
+            if self.synced: # already bridged → the rest of the buffer must follow on without a gap
+                if self._is_gap(diff):
+                    self.telemetry.event("gap_buffered")
+                    self.gaps += 1
+                    self.synced = False
+                    self._request_snapshot()
+                    return
+                self._apply_diff(diff)
+                self.buffer.popleft()
+                if self._window_lost:
+                    self._window_resync()
+                    return
+                continue
+
             # Check the BRIDGING CONDITION (MOST IMPORTANT)
 
             if diff.U <= self.last_update_id + 1 <= diff.u: #this means its correct
@@ -130,17 +291,37 @@ class OrderBookEngine:
                 self._apply_diff(diff) # Apply this diff to the order book
                 self.buffer.popleft() # Remove it from buffer
                 self.synced = True # Mark order book as synced
-                print("[ORDERBOOK] Book synced")
+                self.telemetry.event("synced")
+                if self._window_lost:
+                    self._window_resync()
+                    return
+                continue
 
-            # still waiting for correct diff
-            
-            
+            # The first usable diff starts AFTER the snapshot (U > last_update_id + 1):
+            # the snapshot is too old to ever bridge, so waiting won't help → get a newer one.
+            # We return instead of looping; the next diff (or snapshot) tries again.
+            self.telemetry.event("stale_snapshot")
+            self.stale_snapshots += 1
+            self._request_snapshot()
+            return
 
     def _apply_diff(self, diff: DepthDiff): # _apply_diff() takes a depth update and modifies your local order book so it matches the exchange.
         # It does not calculate anything — it just updates state.
         """
         Apply bid/ask updates
         """
+        n = len(diff.bids) + len(diff.asks)
+        self.diffs_applied += 1
+        self.levels_applied += n
+        if n > self.max_diff_levels:
+            self.max_diff_levels = n
+        if self.windowed:
+            self._apply_diff_window(diff)
+            return
+        if self.signals is not None:
+            self._apply_diff_signals(diff)
+            return
+
         for price, qty in diff.bids:
             if qty == 0.0: # Case A: Quantity = 0 → remove level
                 self.bids.pop(price, None) 
@@ -160,25 +341,170 @@ class OrderBookEngine:
                 self.asks[price] = qty
         
         self.last_update_id = diff.u
+
+    def _apply_diff_signals(self, diff: DepthDiff):
+        # Same as _apply_diff, but hands every (price, old qty, new qty) to the signals layer
+        signals = self.signals
+        for is_bid, side, levels in ((True, self.bids, diff.bids), (False, self.asks, diff.asks)):
+            for price, qty in levels:
+                old = side.get(price, 0)
+                if qty == 0.0:
+                    if not old:
+                        continue
+                    side.pop(price, None)
+                else:
+                    side[price] = qty
+                signals.on_level(is_bid, price, old, qty)
+        self.last_update_id = diff.u
+
+    # ------------------------------------------------------------ depth window
+
+    def _apply_diff_window(self, diff: DepthDiff):
+        # Same as _apply_diff (and _apply_diff_signals), but updates behind the eviction edge are dropped
+        signals = self.signals
+        dropped = 0
+        for is_bid, side, levels, edge in ((True, self.bids, diff.bids, self.bid_edge), (False, self.asks, diff.asks, self.ask_edge)):
+            for price, qty in levels:
+                if edge is not None and (price < edge if is_bid else price > edge):
+                    dropped += 1
+                    continue
+                if signals is not None:
+                    old = side.get(price, 0)
+                    if qty == 0.0:
+                        if not old:
+                            continue
+                        side.pop(price, None)
+                    else:
+                        side[price] = qty
+                    signals.on_level(is_bid, price, old, qty)
+                elif qty == 0.0:
+                    side.pop(price, None)
+                else:
+                    side[price] = qty
+        self.window_dropped += dropped
+        self.last_update_id = diff.u
+        self._check_window(keep=2, evict_at=3)
+
+    def _reset_window(self): # a fresh snapshot / checkpoint: everything in it is exact, trim it to the window right away
+        self.bid_edge = None
+        self.ask_edge = None
+        self._window_lost = False
+        self._check_window(keep=2, evict_at=2)
+
+    def _check_window(self, keep: int, evict_at: int):
+        # Per side: evict down to keep x window once the side holds more than evict_at x window,
+        # and flag the window as lost once less than 1x window is known in front of the edge.
+        for is_bid, side in ((True, self.bids), (False, self.asks)):
+            edge = self.bid_edge if is_bid else self.ask_edge
+            if self.depth_window is not None:
+                k = self.depth_window
+                n = len(side)
+                if n > evict_at * k:
+                    self._evict(is_bid, side, side.top(keep * k)[-1][0])
+                elif edge is not None and n < k:
+                    self._window_lost = True
+                continue
+            best = side.best()
+            if best is None:
+                if edge is not None:
+                    self._window_lost = True
+                continue
+            width = abs(best) * self.depth_window_bps / 10_000
+            dist = None if edge is None else (best - edge if is_bid else edge - best)
+            if dist is None or dist > evict_at * width:
+                new_edge = best - keep * width if is_bid else best + keep * width
+                if self.tick_spec is not None: # int ticks: stay inside the window
+                    new_edge = math.ceil(new_edge) if is_bid else math.floor(new_edge)
+                self._evict(is_bid, side, new_edge)
+            elif dist < width:
+                self._window_lost = True
+
+    def _evict(self, is_bid: bool, side, edge):
+        self.window_evicted += side.drop_worse(edge)
+        if is_bid:
+            self.bid_edge = edge
+        else:
+            self.ask_edge = edge
+        if self.signals is not None:
+            self.signals.rebuild()
+
+    def _window_resync(self):
+        self.telemetry.event("window_resync")
+        self.window_resyncs += 1
+        self._window_lost = False
+        self.synced = False
+        self.buffer.clear()
+        self._request_snapshot()
+
+    def memory(self) -> dict:
+        """ Levels held and their rough memory footprint, plus what the depth window dropped """
+        return {
+            "bid_levels": len(self.bids),
+            "ask_levels": len(self.asks),
+            "bytes": self.bids.nbytes() + self.asks.nbytes(),
+            "window_dropped": self.window_dropped,
+            "window_evicted": self.window_evicted,
+            "window_resyncs": self.window_resyncs,
+        }
+
+    def counters(self) -> dict:
+        """ Hot-path counters since start (cumulative, nothing is reset) """
+        return {
+            "synced": self.synced,
+            "last_update_id": self.last_update_id,
+            "diffs_applied": self.diffs_applied,
+            "levels_applied": self.levels_applied,
+            "levels_per_diff": round(self.levels_applied / self.diffs_applied, 2) if self.diffs_applied else None,
+            "max_diff_levels": self.max_diff_levels,
+            "stale_diffs": self.stale_diffs,
+            "gaps": self.gaps,
+            "stale_snapshots": self.stale_snapshots,
+            "snapshot_requests": self.snapshot_requests,
+            "window_resyncs": self.window_resyncs,
+            "try_sync_calls": self.try_sync_calls,
+            "try_sync_steps": self.try_sync_steps,
+            "buffered": len(self.buffer),
+            "max_buffer": self.max_buffer,
+            "bid_levels": len(self.bids),
+            "ask_levels": len(self.asks),
+        }
+
+    def format_memory(self, mem: Optional[dict] = None) -> str:
+        m = mem or self.memory()
+        line = f"[BOOKMEM] {self.symbol} levels={m['bid_levels']}/{m['ask_levels']} {m['bytes'] / 1024:.1f} KB"
+        if self.windowed:
+            line += f" dropped={m['window_dropped']} evicted={m['window_evicted']} resyncs={m['window_resyncs']}"
+        return line
                 
     
     def best_bid(self):
-        if self.bids:
-            return max(self.bids.keys())
-        else:
-            None
+        return self.bids.best() # highest bid, or None if the side is empty
     
     def best_ask(self):
-        if self.asks:
-            return min(self.asks.keys())
-        else:
-            None
+        return self.asks.best() # lowest ask, or None if the side is empty
 
     def spread(self):
-        if not self.bids or not self.asks:
+        bb = self.bids.best()
+        ba = self.asks.best()
+        if bb is None or ba is None:
             return None
         
-        return self.best_ask() - self.best_bid()
+        return ba - bb
+
+    def to_price(self, p):
+        """ Reporting edge: price as a float whatever mode the book is in """
+        if p is None or self.tick_spec is None:
+            return p
+        return self.tick_spec.ticks_to_price(p)
+
+    def to_qty(self, q):
+        if q is None or self.tick_spec is None:
+            return q
+        return self.tick_spec.lots_to_qty(q)
+
+    def top_levels(self, n: int = 10):
+        """ Top n levels of each side, best price first: (bids, asks) as lists of (price, qty) """
+        return self.bids.top(n), self.asks.top(n)
 
         
 
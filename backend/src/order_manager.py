@@ -0,0 +1,222 @@
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Our own resting quotes, one order per price per side, for MarketMaker's ladders.
+#   sync(side, ladder)      -> diff the desired [(price, qty), ...] against what is resting:
+#                              unchanged levels stay (keep their queue spot), only the rest is sent / cancelled
+#   match(price, qty)       -> a trade print at `price` fills only the orders it reaches, best first,
+#                              O(log n + fills), sharing the printed qty between them (partial fills)
+#   fill(order, qty)        -> a fill matched by the caller instead (backtest.py's queue model)
+#   best(side)              -> best resting order or None
+#   export() / restore()    -> resting orders as plain tuples, to carry them to another process (multi_feed.py moves)
+#   ack(order_id)           -> pending → live once the exchange confirms (only with a send callback)
+#
+# Order states: pending → live → partial → filled, or cancelled at any point before filled.
+# Without a send callback (simulation) new orders are live straight away.
+
+PENDING, LIVE, PARTIAL, FILLED, CANCELLED = "pending", "live", "partial", "filled", "cancelled"
+
+
+@dataclass(slots=True)
+class RestingOrder:
+    order_id: int
+    side: str        # "buy" / "sell"
+    price: float     # int ticks in tick mode
+    qty: float       # original size, int lots in tick mode
+    remaining: float
+    state: str = PENDING
+
+
+class OrderSide:
+    """
+    Resting orders of one side: dict (price -> order) plus a sorted list of keys.
+    Oriented like SortedBookSide: the BEST price is the LAST element
+      bids -> ascending prices, asks -> ascending negated prices
+    so a print at `price` reaches exactly the keys from bisect_left(keys, key(price)) to the end,
+    and fills (best first) pop from the end of the list.
+    """
+
+    def __init__(self, is_bid: bool):
+        self.is_bid = is_bid
+        self.orders: Dict[float, RestingOrder] = {}
+        self._keys: List[float] = []
+        self.last_ladder: Optional[list] = None # what the last sync() asked for, to skip unchanged ladders
+
+    def _key(self, price: float) -> float:
+        return price if self.is_bid else -price
+
+    def add(self, o: RestingOrder):
+        if o.price not in self.orders: # one order per price: a second key would outlive remove()
+            insort(self._keys, o.price if self.is_bid else -o.price)
+        self.orders[o.price] = o
+
+    def remove(self, price: float) -> RestingOrder:
+        o = self.orders.pop(price)
+        keys = self._keys
+        k = price if self.is_bid else -price
+        if keys[-1] == k: # usually the best level
+            keys.pop()
+        else:
+            del keys[bisect_left(keys, k)]
+        return o
+
+    def best(self) -> Optional[RestingOrder]:
+        return self.orders[self._key(self._keys[-1])] if self._keys else None
+
+    def levels(self) -> List[RestingOrder]: # best first
+        return [self.orders[self._key(k)] for k in reversed(self._keys)]
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+
+class OrderManager:
+    def __init__(self, send: Optional[Callable[[RestingOrder], None]] = None,
+                 cancel: Optional[Callable[[RestingOrder], None]] = None):
+        """ send / cancel: hooks to an exchange gateway; None = simulated, new orders are live at once """
+        self.bids = OrderSide(is_bid=True)
+        self.asks = OrderSide(is_bid=False)
+        self._send = send
+        self._cancel = cancel
+        self._by_id: Dict[int, RestingOrder] = {}
+        self._next_id = 1
+
+        # counters
+        self.sent = 0
+        self.cancelled = 0
+        self.kept = 0 # desired levels that were already resting → nothing sent
+        self.fills = 0
+
+    def side(self, side: str) -> OrderSide:
+        return self.bids if side == "buy" else self.asks
+
+    def best(self, side: str) -> Optional[RestingOrder]:
+        return self.side(side).best()
+
+    def sync(self, side: str, ladder: List[Tuple[float, float]]) -> bool:
+        """
+        Make the resting orders of `side` match ladder = [(price, qty), ...] with as few sends / cancels as possible.
+        Returns False if nothing had to change.
+        """
+        s = self.bids if side == "buy" else self.asks
+        orders = s.orders
+        if ladder == s.last_ladder and len(orders) == len(ladder): # same quotes as last time and nothing filled
+            self.kept += len(ladder)
+            return False
+        s.last_ladder = ladder
+        if orders:
+            want = dict(reversed(ladder)) # a repeated price keeps its first size, like the loop below
+            for price, o in list(orders.items()):
+                if want.get(price) != o.qty: # level gone, or size changed (cancel + resend)
+                    self.cancel(s.remove(price))
+        for price, qty in ladder:
+            if price in orders: # resting already (or a repeated price in the ladder: one order per price)
+                self.kept += 1
+                continue
+            o = RestingOrder(self._next_id, side, price, qty, qty)
+            self._next_id += 1
+            self.sent += 1
+            s.add(o)
+            if self._send is None:
+                o.state = LIVE
+            else:
+                self._by_id[o.order_id] = o
+                self._send(o)
+        return True
+
+    def cancel(self, o: RestingOrder):
+        o.state = CANCELLED
+        self.cancelled += 1
+        self._by_id.pop(o.order_id, None)
+        if self._cancel is not None:
+            self._cancel(o)
+
+    def cancel_all(self):
+        for s in (self.bids, self.asks):
+            for price in list(s.orders):
+                self.cancel(s.remove(price))
+            s.last_ladder = None
+
+    def ack(self, order_id: int):
+        o = self._by_id.pop(order_id, None)
+        if o is not None and o.state == PENDING:
+            o.state = LIVE
+
+    def match(self, price: float, qty: float) -> Sequence[Tuple[RestingOrder, float]]:
+        """
+        Fills caused by a trade print: bids at or above `price`, asks at or below it,
+        best first on each side, until the printed qty is used up. Returns [(order, fill_qty), ...],
+        or the empty tuple when the print reaches no order (no list allocated on that common path).
+        """
+        bk, ak = self.bids._keys, self.asks._keys
+        if (not bk or bk[-1] < price) and (not ak or ak[-1] < -price): # the print reaches neither best order (the common case)
+            return ()
+        fills = []
+        for s in (self.bids, self.asks):
+            keys = s._keys
+            k = s._key(price)
+            if not keys or keys[-1] < k:
+                continue
+            left = qty
+            i = len(keys) - 1
+            lo = bisect_left(keys, k)
+            done = []
+            while i >= lo and left > 0:
+                o = s.orders[s._key(keys[i])]
+                i -= 1
+                if o.state == PENDING: # not at the exchange yet
+                    continue
+                q = o.remaining if o.remaining <= left else left
+                left -= q
+                o.remaining -= q
+                fills.append((o, q))
+                self.fills += 1
+                if o.remaining <= 0:
+                    o.state = FILLED
+                    done.append(o.price)
+                    self._by_id.pop(o.order_id, None)
+                else:
+                    o.state = PARTIAL
+            for p in done:
+                s.remove(p)
+        return fills
+
+    def fill(self, o: RestingOrder, qty: float):
+        """ Apply a fill of `o` that the caller matched itself; a filled order stops resting """
+        if o.state in (FILLED, CANCELLED): # cancelled while the fill was in flight: nothing rests any more
+            return
+        o.remaining -= qty
+        self.fills += 1
+        if o.remaining <= 0:
+            o.state = FILLED
+            self._by_id.pop(o.order_id, None)
+            self.side(o.side).remove(o.price)
+        else:
+            o.state = PARTIAL
+
+    def export(self) -> List[tuple]:
+        return [(o.order_id, o.side, o.price, o.qty, o.remaining, o.state)
+                for s in (self.bids, self.asks) for o in s.orders.values()]
+
+    def restore(self, orders: List[tuple]):
+        """ Put exported orders back (same ids, states and remaining sizes); the next sync() diffs against them """
+        for order_id, side, price, qty, remaining, state in orders:
+            o = RestingOrder(order_id, side, price, qty, remaining, state)
+            s = self.side(side)
+            s.add(o)
+            s.last_ladder = None
+            if state == PENDING:
+                self._by_id[order_id] = o
+            if order_id >= self._next_id:
+                self._next_id = order_id + 1
+
+    def status(self) -> dict:
+        return {
+            "bids": len(self.bids),
+            "asks": len(self.asks),
+            "sent": self.sent,
+            "cancelled": self.cancelled,
+            "kept": self.kept,
+            "fills": self.fills,
+        }
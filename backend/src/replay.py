@@ -0,0 +1,154 @@
+"""
+Replay a recorded feed log (see feed_log.py) through the same pipeline as data_feed.main():
+
+    raw frame → MarketDecoder.parse_frame → handle_event → OrderBookEngine / MarketMaker
+
+Snapshots come from the log instead of the REST API, in the order they were
+recorded, and are handed over the moment the book asks for one (the n-th
+request gets the n-th recorded snapshot), so the same log always produces the
+same book and PnL.
+
+    python replay.py session.feed                 # as fast as possible
+    python replay.py session.feed --speed 1       # real time
+    python replay.py session.feed --speed 10      # 10x real time
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import time
+from typing import List, Optional
+
+from data_feed import handle_event
+from latency import LatencyStats
+from feed_log import REC_FRAME, REC_SNAPSHOT, read_feed_log
+from market_handler import MarketDecoder
+from market_maker import MarketMaker
+from order_book_engine import OrderBookEngine
+from ticks import TICK_SPECS, TickSpec
+
+
+class RecordedSnapshots:
+    """ snapshot_provider for OrderBookEngine: hands out the recorded snapshots one by one """
+
+    def __init__(self, snapshots: List[dict]):
+        self.snapshots = snapshots
+        self.served = 0
+
+    def __call__(self) -> dict:
+        if self.served >= len(self.snapshots):
+            raise RuntimeError(f"feed log has only {len(self.snapshots)} snapshot(s) but the book asked for another one")
+        data = self.snapshots[self.served]
+        self.served += 1
+        return data
+
+
+def book_digest(book: OrderBookEngine, maker: MarketMaker) -> str:
+    """ Fingerprint of the final state. repr() of a float is exact, so equal digests = bit-for-bit equal state """
+    h = hashlib.sha256()
+    h.update(repr((book.last_update_id, book.synced)).encode())
+    h.update(repr(list(book.bids.levels())).encode())
+    h.update(repr(list(book.asks.levels())).encode())
+    h.update(repr((maker.inventory, maker.realized_pnl)).encode())
+    return h.hexdigest()
+
+
+def replay(
+        path: str,
+        speed: Optional[float] = None,
+        symbol: str = "BTCUSDT",
+        tick_spec: Optional[TickSpec] = None,
+        book_side: Optional[str] = None,
+        maker_kwargs: Optional[dict] = None,
+        quiet: bool = True,
+        latency: Optional[LatencyStats] = None,
+) -> dict:
+    """
+    speed=None → as fast as possible; speed=2.0 → twice real time (paced on ts_recv_us).
+    quiet=True silences the engine's inline prints while replaying.
+    latency → per-stage histograms (decode / book_update / strategy / trade / tick_to_quote).
+    """
+    frames = []
+    snapshots = []
+    for kind, ts_recv_us, payload in read_feed_log(path):
+        if kind == REC_FRAME:
+            frames.append((ts_recv_us, payload))
+        elif kind == REC_SNAPSHOT:
+            snapshots.append(json.loads(payload))
+
+    decoder = MarketDecoder(expect_microseconds=True, tick_specs={symbol: tick_spec} if tick_spec else None)
+    book = OrderBookEngine(
+        symbol,
+        book_side=book_side or ("ticks" if tick_spec else "sorted"),
+        tick_spec=tick_spec,
+        snapshot_provider=RecordedSnapshots(snapshots),
+    )
+    maker = MarketMaker(book, **(maker_kwargs or {}))
+
+    events = 0
+    out = open(os.devnull, "w") if quiet else None
+    t_start = time.perf_counter()
+    with contextlib.redirect_stdout(out) if quiet else contextlib.nullcontext():
+        t0_rec = frames[0][0] if frames else 0
+        for ts_recv_us, payload in frames:
+            if speed:
+                delay = (ts_recv_us - t0_rec) / 1e6 / speed - (time.perf_counter() - t_start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            if latency is not None:
+                t_recv_ns = time.perf_counter_ns()
+                ev = decoder.parse_frame(payload, ts_recv_us)
+                if ev is None:
+                    continue
+                ev.t_recv_ns = t_recv_ns
+                latency.record("decode", time.perf_counter_ns() - t_recv_ns)
+            else:
+                ev = decoder.parse_frame(payload, ts_recv_us)
+                if ev is None:
+                    continue
+            handle_event(ev, book, maker, latency)
+            events += 1
+    elapsed = time.perf_counter() - t_start
+    if out:
+        out.close()
+
+    return {
+        "frames": len(frames),
+        "events": events,
+        "snapshots_used": book.snapshot_provider.served,
+        "elapsed_s": elapsed,
+        "events_per_s": events / elapsed if elapsed > 0 else 0.0,
+        "last_update_id": book.last_update_id,
+        "synced": book.synced,
+        "best_bid": book.to_price(book.best_bid()),
+        "best_ask": book.to_price(book.best_ask()),
+        "maker": maker.status(),
+        "digest": book_digest(book, maker),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay a recorded feed log")
+    ap.add_argument("path")
+    ap.add_argument("--speed", type=float, default=None, help="wall-clock speed multiplier (default: as fast as possible)")
+    ap.add_argument("--symbol", default="BTCUSDT")
+    ap.add_argument("--ticks", action="store_true", help="integer tick mode")
+    ap.add_argument("--latency", metavar="DUMP", nargs="?", const="", default=None,
+                    help="record per-stage latency histograms (optionally dump them to DUMP)")
+    args = ap.parse_args()
+
+    lat = LatencyStats() if args.latency is not None else None
+    res = replay(args.path, speed=args.speed, symbol=args.symbol.upper(),
+                 tick_spec=TICK_SPECS[args.symbol.upper()] if args.ticks else None, latency=lat)
+    for k, v in res.items():
+        print(f"{k:>15}: {v}")
+    if lat is not None:
+        print(lat.format())
+        if args.latency:
+            lat.dump(args.latency)
+
+
+if __name__ == "__main__":
+    main()
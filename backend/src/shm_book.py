@@ -0,0 +1,243 @@
+"""
+Top-of-book in shared memory, for other local processes (risk, hedging, monitoring).
+
+The process running the feed publishes the top `depth` levels of each side after
+every diff; any number of readers attach to the segment by name and read it
+without locks, sockets or copies of the whole book.
+
+    # feed side (data_feed.py: SHM_NAME = "mm_btcusdt")
+    pub = TopOfBookPublisher(book, "mm_btcusdt", depth=20)
+    pub.publish(diff)
+
+    # any other process
+    r = TopOfBookReader("mm_btcusdt")
+    tob = r.read()            # consistent copy: tob.bids[0], tob.last_update_id, ...
+
+    python shm_book.py mm_btcusdt     # live top-of-book printout
+
+Layout (fixed; prices/qtys are f64 in both float and tick mode):
+
+    magic "MMTOB001" | version u16 | pad | depth u32 | symbol 16s
+    seq u64                          ← seqlock, offset 32
+    last_update_id i64 | ts_event_us i64 | ts_recv_us i64 | ts_publish_us i64
+    n_bids u32 | n_asks u32 | synced u32 | pad
+    depth × (price, qty) bids, best first, then depth × (price, qty) asks
+
+Seqlock: the writer makes seq odd, writes, then makes it even again. A reader
+takes seq (waiting while it is odd), reads, and retries if seq changed
+meanwhile, so it never sees a half-written book and never blocks the writer.
+"""
+import struct
+import sys
+import time
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Optional, Tuple
+
+from order_book_engine import OrderBookEngine
+
+MAGIC = b"MMTOB001"
+VERSION = 1
+HEAD = struct.Struct("<8sHxxI16s")
+SEQ = struct.Struct("<Q")
+SEQ_OFFSET = 32
+BODY = struct.Struct("<qqqqIII4x")
+BODY_OFFSET = SEQ_OFFSET + SEQ.size
+LEVELS_OFFSET = BODY_OFFSET + BODY.size # 88, 8-byte aligned
+
+
+def segment_size(depth: int) -> int:
+    return LEVELS_OFFSET + depth * 4 * 8
+
+
+class TopOfBookPublisher:
+    def __init__(self, book: OrderBookEngine, name: str, depth: int = 20):
+        self.book = book
+        self.name = name
+        self.depth = depth
+        size = segment_size(depth)
+        try:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError: # left behind by a crashed run → replace it
+            old = shared_memory.SharedMemory(name)
+            old.close()
+            old.unlink()
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        buf = self.shm.buf
+        HEAD.pack_into(buf, 0, MAGIC, VERSION, depth, book.symbol.encode()[:16])
+        SEQ.pack_into(buf, SEQ_OFFSET, 0)
+        self._levels = buf[LEVELS_OFFSET:LEVELS_OFFSET + depth * 32].cast("d")
+        self._seq = 0
+        self.published = 0
+
+    def publish(self, diff=None):
+        """ Copy the current top of book into the segment (call after every applied diff) """
+        book = self.book
+        depth = self.depth
+        buf = self.shm.buf
+        bids = book.bids.top(depth)
+        asks = book.asks.top(depth)
+        spec = book.tick_spec
+        if spec is not None: # readers always get real prices/qtys
+            # int / int division is correctly rounded → same floats as ticks_to_price/lots_to_qty, without round()
+            pu, ps = spec.tick_units, 10 ** spec.price_decimals
+            lu, ls = spec.lot_units, 10 ** spec.qty_decimals
+            bids = [(p * pu / ps, q * lu / ls) for p, q in bids]
+            asks = [(p * pu / ps, q * lu / ls) for p, q in asks]
+
+        seq = self._seq + 1
+        SEQ.pack_into(buf, SEQ_OFFSET, seq) # odd: write in progress
+        BODY.pack_into(
+            buf, BODY_OFFSET,
+            book.last_update_id or 0,
+            diff.ts_event_us if diff is not None else 0,
+            diff.ts_recv_us if diff is not None else 0,
+            time.time_ns() // 1000,
+            len(bids), len(asks), int(book.synced),
+        )
+        levels = self._levels
+        i = 0
+        for p, q in bids:
+            levels[i] = p
+            levels[i + 1] = q
+            i += 2
+        i = 2 * depth
+        for p, q in asks:
+            levels[i] = p
+            levels[i + 1] = q
+            i += 2
+        self._seq = seq + 1
+        SEQ.pack_into(buf, SEQ_OFFSET, self._seq) # even: consistent again
+        self.published += 1
+
+    def close(self):
+        self._levels.release()
+        self.shm.close()
+        self.shm.unlink()
+
+
+# ---------------------------------------------------------------- reader side
+
+@dataclass(slots=True)
+class TopOfBook:
+    seq: int
+    symbol: str
+    last_update_id: int
+    ts_event_us: int
+    ts_recv_us: int
+    ts_publish_us: int
+    synced: bool
+    bids: List[Tuple[float, float]] # best first
+    asks: List[Tuple[float, float]]
+
+    def best_bid(self) -> Optional[float]:
+        return self.bids[0][0] if self.bids else None
+
+    def best_ask(self) -> Optional[float]:
+        return self.asks[0][0] if self.asks else None
+
+    def mid(self) -> Optional[float]:
+        if not self.bids or not self.asks:
+            return None
+        return (self.bids[0][0] + self.asks[0][0]) / 2
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    # Before 3.13 attaching registers the segment, and a reader with its own resource tracker would
+    # unlink it on exit. Unregistering afterwards drops the publisher's entry when the reader is a
+    # spawned child (same tracker), so the attach is kept out of the tracker instead.
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+
+class TopOfBookReader:
+    def __init__(self, name: str):
+        self.shm = _attach(name)
+        buf = self.shm.buf
+        magic, version, depth, symbol = HEAD.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.shm.close()
+            raise ValueError(f"{name!r} is not a top-of-book segment")
+        self.depth = depth
+        self.symbol = symbol.rstrip(b"\0").decode()
+        levels = buf[LEVELS_OFFSET:LEVELS_OFFSET + depth * 32].cast("d")
+        # zero-copy views straight into the segment: [p0, q0, p1, q1, ...]
+        self.bids_view = levels[:2 * depth]
+        self.asks_view = levels[2 * depth:]
+        self._levels = levels
+        self.retries = 0 # reads that raced a write and went round again
+
+    def seq(self) -> int:
+        return SEQ.unpack_from(self.shm.buf, SEQ_OFFSET)[0]
+
+    def begin(self) -> int:
+        """ Start a zero-copy read: returns the seq to hand to validate() afterwards """
+        while True:
+            seq = SEQ.unpack_from(self.shm.buf, SEQ_OFFSET)[0]
+            if not seq & 1:
+                return seq
+
+    def validate(self, seq: int) -> bool:
+        """ True if nothing was published since begin() → whatever was read from the views is consistent """
+        return SEQ.unpack_from(self.shm.buf, SEQ_OFFSET)[0] == seq
+
+    def read(self) -> TopOfBook:
+        """ Consistent copy of the whole segment (retries while racing the writer) """
+        buf = self.shm.buf
+        while True:
+            seq = self.begin()
+            last_update_id, ts_event_us, ts_recv_us, ts_publish_us, n_bids, n_asks, synced = BODY.unpack_from(buf, BODY_OFFSET)
+            n_bids = min(n_bids, self.depth) # a torn count is caught by validate(), but must not overrun first
+            n_asks = min(n_asks, self.depth)
+            b = self.bids_view[:2 * n_bids].tolist()
+            a = self.asks_view[:2 * n_asks].tolist()
+            if self.validate(seq):
+                return TopOfBook(seq, self.symbol, last_update_id, ts_event_us, ts_recv_us, ts_publish_us, bool(synced),
+                                 list(zip(b[0::2], b[1::2])), list(zip(a[0::2], a[1::2])))
+            self.retries += 1
+
+    def wait(self, last_seq: int, timeout: Optional[float] = None, poll_s: float = 0.0005) -> Optional[TopOfBook]:
+        """ Block (polling) until something newer than last_seq is published; None on timeout """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.seq() == last_seq:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_s)
+        return self.read()
+
+    def close(self):
+        self.bids_view.release()
+        self.asks_view.release()
+        self._levels.release()
+        self.shm.close()
+
+
+def main():
+    name = sys.argv[1] if len(sys.argv) > 1 else "mm_btcusdt"
+    r = TopOfBookReader(name)
+    seq = 0
+    try:
+        while True:
+            tob = r.wait(seq, timeout=5.0)
+            if tob is None:
+                print(f"[{name}] no update for 5s")
+                continue
+            seq = tob.seq
+            age_ms = (time.time_ns() // 1000 - tob.ts_recv_us) / 1000 if tob.ts_recv_us else 0.0
+            print(f"[{tob.symbol}] id={tob.last_update_id} BB={tob.best_bid()} BA={tob.best_ask()} "
+                  f"{'synced' if tob.synced else 'NOT SYNCED'} age={age_ms:.1f}ms")
+            time.sleep(0.25)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        r.close()
+
+
+if __name__ == "__main__":
+    main()
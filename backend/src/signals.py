@@ -0,0 +1,205 @@
+import math
+from typing import Optional
+
+# Microstructure signals, kept up to date from the level changes themselves.
+#
+#   signals = BookSignals(book, depth_levels=5, band_bps=10)
+#   ... book.on_depth_diff(diff) ...
+#   signals.microprice()        size-weighted mid of the touch
+#   signals.imbalance()         touch imbalance      (bid_qty - ask_qty) / (bid_qty + ask_qty), in [-1, 1]
+#   signals.depth_imbalance()   same over the top `depth_levels` levels of each side
+#   signals.book_pressure()     same over all depth within `band_bps` of each best price
+#
+# OrderBookEngine calls on_level(is_bid, price, old_qty, new_qty) for every level
+# a diff touches, so the cost per diff is O(changed levels):
+#   - top-N depth: each side remembers its "edge" (the N-th best price) and the
+#     sum above it. A change at or above the edge adjusts the sum; a level entering
+#     or leaving the top N swaps one level at the edge (one next_better /
+#     next_worse lookup on the book side).
+#   - band depth: changes inside the band adjust the sum. When a best price moves
+#     the band moves with it; the next read shifts the sum by the levels between the
+#     old and the new band limit (one next_worse lookup each), so a read costs
+#     O(levels the band edge crossed), not O(levels in the band).
+# Nothing here ever walks the whole book, except rebuild() after a snapshot.
+
+
+class _TopN:
+    __slots__ = ("side", "n", "qty", "count", "edge")
+
+    def __init__(self, side, n: int):
+        self.side = side
+        self.n = n
+        self.qty = 0 # sum of the quantities in the top n levels
+        self.count = 0 # levels in the set = min(n, len(side))
+        self.edge = None # worst price in the set
+
+    def rebuild(self):
+        top = self.side.top(self.n)
+        self.qty = sum(q for _, q in top)
+        self.count = len(top)
+        self.edge = top[-1][0] if top else None
+
+    def update(self, price, old, new):
+        # called AFTER the side itself was updated
+        side = self.side
+        edge = self.edge
+        better = edge is not None and (price > edge if side.is_bid else price < edge)
+        if old and new: # quantity change
+            if edge is not None and (better or price == edge):
+                self.qty += new - old
+        elif new: # new level
+            if self.count < self.n: # fewer than n levels → everything is in the set
+                self.qty += new
+                self.count += 1
+                if edge is None or not better:
+                    self.edge = price
+            elif better: # pushes the old edge out of the set
+                self.qty += new - side.get(edge, 0)
+                self.edge = side.next_better(edge)
+        elif edge is not None and (better or price == edge): # level inside the set removed
+            self.qty -= old
+            self.count -= 1
+            nxt = side.next_worse(edge) # first level behind the set moves up
+            if nxt is not None:
+                self.qty += side.get(nxt, 0)
+                self.count += 1
+                self.edge = nxt
+            elif price == edge:
+                self.edge = side.next_better(price) if self.count else None
+
+
+class _Band:
+    __slots__ = ("side", "bps", "qty", "limit")
+
+    def __init__(self, side, bps: float):
+        self.side = side
+        self.bps = bps
+        self.qty = 0 # depth between the best price and `limit`
+        self.limit = None # worst price inside the band (None = empty side)
+
+    def _limit(self, best):
+        if best is None:
+            return None
+        f = self.bps / 10_000
+        if self.side.is_bid:
+            limit = best * (1 - f)
+            return math.ceil(limit) if isinstance(best, int) else limit # tick mode: stay on a tick
+        limit = best * (1 + f)
+        return math.floor(limit) if isinstance(best, int) else limit
+
+    def rebuild(self):
+        side = self.side
+        is_bid = side.is_bid
+        limit = self.limit = self._limit(side.best())
+        qty = 0
+        if limit is not None:
+            for p, q in side.levels(): # best first → stops at the edge of the band
+                if (p < limit) if is_bid else (p > limit):
+                    break
+                qty += q
+        self.qty = qty
+
+    def update(self, price, old, new):
+        # qty always matches self.limit, even after the touch moved (value() catches the limit up)
+        limit = self.limit
+        if limit is not None and ((price >= limit) if self.side.is_bid else (price <= limit)):
+            self.qty += new - old
+
+    def value(self):
+        limit = self._limit(self.side.best())
+        old = self.limit
+        if limit != old:
+            if old is None or limit is None:
+                self.rebuild()
+            else:
+                self._shift(old, limit)
+        return self.qty
+
+    def _shift(self, old, new):
+        # only the levels between the old and the new limit enter (band widened) or leave (narrowed)
+        side = self.side
+        is_bid = side.is_bid
+        widen = new < old if is_bid else new > old
+        start, bound = (old, new) if widen else (new, old)
+        d = 0
+        p = side.next_worse(start)
+        while p is not None and ((p >= bound) if is_bid else (p <= bound)):
+            d += side.get(p, 0)
+            p = side.next_worse(p)
+        self.qty += d if widen else -d
+        self.limit = new
+
+
+def _imbalance(b, a) -> Optional[float]:
+    total = b + a
+    return (b - a) / total if total else None
+
+
+class BookSignals:
+    def __init__(self, book, depth_levels: int = 5, band_bps: float = 10.0):
+        self.book = book
+        self.depth_levels = depth_levels
+        self.band_bps = band_bps
+        self._top = (_TopN(book.bids, depth_levels), _TopN(book.asks, depth_levels)) # (bids, asks)
+        self._band = (_Band(book.bids, band_bps), _Band(book.asks, band_bps))
+        book.signals = self
+        self.rebuild()
+
+    # ---- called by OrderBookEngine
+
+    def rebuild(self):
+        """ Full recompute (after a snapshot) """
+        for t in self._top:
+            t.rebuild()
+        for b in self._band:
+            b.rebuild()
+
+    def on_level(self, is_bid: bool, price, old, new):
+        i = 0 if is_bid else 1
+        self._top[i].update(price, old, new)
+        self._band[i].update(price, old, new)
+
+    # ---- signals (float mode: prices/qtys; tick mode: ticks/lots, ratios are unitless)
+
+    def microprice(self):
+        """ (bb * ask_qty + ba * bid_qty) / (bid_qty + ask_qty): leans towards the side that is about to be eaten """
+        book = self.book
+        bb, ba = book.bids.best(), book.asks.best()
+        if bb is None or ba is None:
+            return None
+        bq, aq = book.bids.get(bb, 0), book.asks.get(ba, 0)
+        total = bq + aq
+        if not total:
+            return (bb + ba) / 2
+        return (bb * aq + ba * bq) / total
+
+    def imbalance(self) -> Optional[float]:
+        book = self.book
+        bb, ba = book.bids.best(), book.asks.best()
+        if bb is None or ba is None:
+            return None
+        return _imbalance(book.bids.get(bb, 0), book.asks.get(ba, 0))
+
+    def depth(self):
+        """ (bid qty, ask qty) summed over the top depth_levels levels """
+        return self._top[0].qty, self._top[1].qty
+
+    def depth_imbalance(self) -> Optional[float]:
+        return _imbalance(self._top[0].qty, self._top[1].qty)
+
+    def band_depth(self):
+        """ (bid qty, ask qty) within band_bps of each best price """
+        return self._band[0].value(), self._band[1].value()
+
+    def book_pressure(self) -> Optional[float]:
+        return _imbalance(*self.band_depth())
+
+    def as_dict(self) -> dict:
+        mp = self.microprice()
+        spec = self.book.tick_spec
+        return {
+            "microprice": mp * spec.tick if spec is not None and mp is not None else mp, # not snapped to a tick
+            "imbalance": self.imbalance(),
+            "depth_imbalance": self.depth_imbalance(),
+            "book_pressure": self.book_pressure(),
+        }
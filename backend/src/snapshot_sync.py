@@ -0,0 +1,112 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+from order_book_engine import OrderBookEngine
+
+# Non-blocking snapshot / resync for OrderBookEngine.
+#
+# Without this, the book fetches its REST snapshot inline (requests.get) from
+# inside on_depth_diff, which freezes the whole asyncio loop: ws.recv() stops,
+# the queue backs up and Binance may drop us.
+#
+# With it:
+#   book.on_depth_diff() needs a snapshot → calls request() → returns right away
+#   diffs keep arriving and keep being buffered
+#   run() fetches the snapshot in a worker thread, then book.complete_snapshot(data)
+#   bridges the buffer (U <= lastUpdateId + 1 <= u, then U/pu continuity)
+#   a snapshot that is too old to bridge simply triggers another request
+#
+# Requests are rate limited (min_interval between attempts) and failed fetches
+# back off exponentially, so a broken REST endpoint is never hammered.
+
+
+class AsyncSnapshotSync:
+    def __init__(
+            self,
+            book: OrderBookEngine,
+            fetch: Optional[Callable[[], dict]] = None,
+            min_interval: float = 1.0,
+            backoff_base: float = 0.5,
+            backoff_max: float = 30.0,
+            timeout: float = 10.0,
+    ):
+        self.book = book
+        self.fetch = fetch or book.snapshot_provider # blocking callable, runs in a worker thread
+        self.min_interval = min_interval # seconds between two snapshot requests, success or not
+        self.backoff_base = backoff_base # first retry delay after a failure, doubled each time
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        self._wanted = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_attempt = float("-inf")
+        self._failures = 0 # consecutive failed fetches
+
+        # counters
+        self.requests = 0
+        self.fetches = 0
+        self.errors = 0
+        self.last_fetch_s: Optional[float] = None # duration of the last successful fetch
+
+        book.snapshot_requester = self.request
+
+    def request(self): # called by the book (from inside on_depth_diff) → must not block
+        self.requests += 1
+        self._wanted.set()
+
+    def start(self) -> asyncio.Task:
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _delay(self, now: float) -> float:
+        wait = self._last_attempt + self.min_interval - now
+        if self._failures:
+            wait = max(wait, min(self.backoff_max, self.backoff_base * 2 ** (self._failures - 1)))
+        return wait
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wanted.wait() # sleeps until the book asks, no polling
+            self._wanted.clear()
+
+            wait = self._delay(loop.time())
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_attempt = loop.time()
+
+            t0 = time.perf_counter()
+            try:
+                data = await asyncio.wait_for(asyncio.to_thread(self.fetch), self.timeout)
+                if not isinstance(data, dict) or "lastUpdateId" not in data:
+                    raise ValueError(f"not a depth snapshot: {str(data)[:100]}")
+            except Exception as e: # network error, HTTP error, bad JSON, timeout... → retry with backoff
+                self._failures += 1
+                self.errors += 1
+                self.book.telemetry.event("snapshot_error", f"{type(e).__name__}: {e}", self._failures)
+                self._wanted.set()
+                continue
+
+            self._failures = 0
+            self.fetches += 1
+            self.last_fetch_s = time.perf_counter() - t0
+            self.book.complete_snapshot(data) # may call request() again if this snapshot is too old to bridge
+
+    def status(self) -> dict:
+        return {
+            "pending": self.book.snapshot_pending,
+            "requests": self.requests,
+            "fetches": self.fetches,
+            "errors": self.errors,
+            "last_fetch_s": self.last_fetch_s,
+        }
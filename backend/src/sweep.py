@@ -0,0 +1,176 @@
+"""
+Parameter sweep for MarketMaker over a recorded feed log, across a process pool.
+
+The log is decoded ONCE in the parent and the events are pickled into a cache
+file. Every worker unpickles that file once in its pool initializer (no JSON
+re-parsing, but each worker holds its own copy of the events) and then runs as
+many configs as it is given through backtest.py's exchange model.
+
+    # grid: every combination
+    python sweep.py session.feed -p spread_offset=0.01,0.02,0.05 -p inventory_skew=0,0.02
+
+    # random search: 50 samples, lo:hi ranges
+    python sweep.py session.feed -p spread_offset=0.005:0.05 -p max_inventory=0.01:0.05 --samples 50
+
+Sweepable: quote_size, max_inventory, spread_offset, inventory_skew, max_spread.
+"""
+import argparse
+import csv
+import itertools
+import json
+import mmap
+import multiprocessing as mp
+import os
+import pickle
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from backtest import make_backtester, run_events
+from feed_log import REC_FRAME, REC_SNAPSHOT, read_feed_log
+from market_handler import MarketDecoder
+from ticks import TICK_SPECS
+
+MAKER_PARAMS = ("quote_size", "max_inventory", "spread_offset", "inventory_skew", "max_spread")
+
+
+def decode_session(path: str, symbol: str, tick_spec=None):
+    """ → (snapshots, events): the whole log decoded once """
+    decoder = MarketDecoder(expect_microseconds=True, tick_specs={symbol: tick_spec} if tick_spec else None)
+    snapshots, events = [], []
+    for kind, ts_recv_us, payload in read_feed_log(path):
+        if kind == REC_FRAME:
+            ev = decoder.parse_frame(payload, ts_recv_us)
+            if ev is not None:
+                events.append(ev)
+        elif kind == REC_SNAPSHOT:
+            snapshots.append(json.loads(payload))
+    return snapshots, events
+
+
+def write_cache(path: str, snapshots: List[dict], events: list):
+    with open(path, "wb") as f:
+        pickle.dump((snapshots, events), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+# ---------------------------------------------------------------- worker side
+
+_session = None # (snapshots, events, symbol, tick_spec, sim_kwargs), set once per worker
+
+
+def _init_worker(cache_path: str, symbol: str, ticks: bool, sim_kwargs: dict):
+    global _session
+    # mmap only spares reading the file into a bytes copy first; loads() still builds
+    # this worker's own event objects, nothing is shared between workers
+    with open(cache_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        snapshots, events = pickle.loads(mm)
+    _session = (snapshots, events, symbol, TICK_SPECS[symbol] if ticks else None, sim_kwargs)
+
+
+def _run_config(config: dict) -> dict:
+    snapshots, events, symbol, tick_spec, sim_kwargs = _session
+    # the book never mutates the events or snapshots, so every run can reuse them
+    sim = make_backtester(snapshots, symbol, tick_spec, config, **sim_kwargs)
+    run_events(sim, events)
+    return {**config, **sim.report(), "elapsed_s": round(sim.elapsed_s, 3)}
+
+
+# ------------------------------------------------------------------ main side
+
+def grid(params: Dict[str, list]) -> List[dict]:
+    keys = list(params)
+    return [dict(zip(keys, combo)) for combo in itertools.product(*(params[k] for k in keys))]
+
+
+def random_search(ranges: Dict[str, tuple], samples: int, seed: int = 0) -> List[dict]:
+    rnd = random.Random(seed)
+    return [{k: round(rnd.uniform(lo, hi), 8) for k, (lo, hi) in ranges.items()} for _ in range(samples)]
+
+
+def sweep(
+        path: str,
+        configs: List[dict],
+        symbol: str = "BTCUSDT",
+        ticks: bool = False,
+        workers: Optional[int] = None,
+        sim_kwargs: Optional[dict] = None,
+) -> List[dict]:
+    """ One result row per config (config values + Backtester.report()), in config order """
+    t0 = time.perf_counter()
+    snapshots, events = decode_session(path, symbol, TICK_SPECS[symbol] if ticks else None)
+    fd, cache_path = tempfile.mkstemp(suffix=".events")
+    os.close(fd)
+    try:
+        write_cache(cache_path, snapshots, events)
+        print(f"[SWEEP] {len(events)} events decoded in {time.perf_counter() - t0:.2f}s, {len(configs)} configs")
+        ctx = mp.get_context("spawn") # same behaviour on Linux and macOS (like multi_feed.py)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(cache_path, symbol, ticks, sim_kwargs or {})) as pool:
+            return list(pool.map(_run_config, configs))
+    finally:
+        os.unlink(cache_path)
+
+
+def _parse_param(spec: str):
+    name, _, values = spec.partition("=")
+    if name not in MAKER_PARAMS:
+        raise SystemExit(f"unknown parameter {name!r} (one of {', '.join(MAKER_PARAMS)})")
+    if ":" in values:
+        lo, hi = values.split(":")
+        return name, (float(lo), float(hi))
+    return name, [float(v) for v in values.split(",")]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Sweep MarketMaker parameters over a recorded feed log")
+    ap.add_argument("path")
+    ap.add_argument("-p", "--param", action="append", default=[], help="name=v1,v2,... (grid) or name=lo:hi (random)")
+    ap.add_argument("--samples", type=int, default=0, help="random search with this many samples instead of a grid")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--symbol", default="BTCUSDT")
+    ap.add_argument("--ticks", action="store_true", help="integer tick mode")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--entry-latency-us", type=int, default=5_000)
+    ap.add_argument("--cancel-latency-us", type=int, default=5_000)
+    ap.add_argument("--queue-model", choices=("proportional", "risk_averse"), default="proportional")
+    ap.add_argument("--maker-fee-bps", type=float, default=0.0)
+    ap.add_argument("--taker-fee-bps", type=float, default=0.0)
+    ap.add_argument("--sort", default="net_pnl", help="result column to sort by (descending)")
+    ap.add_argument("--csv", help="write the full result table here")
+    args = ap.parse_args()
+
+    params = dict(_parse_param(p) for p in args.param)
+    if args.samples:
+        if any(isinstance(v, list) for v in params.values()):
+            raise SystemExit("--samples needs lo:hi ranges")
+        configs = random_search(params, args.samples, args.seed)
+    else:
+        if any(isinstance(v, tuple) for v in params.values()):
+            raise SystemExit("lo:hi ranges need --samples")
+        configs = grid(params)
+
+    sim_kwargs = {
+        "entry_latency_us": args.entry_latency_us, "cancel_latency_us": args.cancel_latency_us,
+        "queue_model": args.queue_model, "maker_fee_bps": args.maker_fee_bps, "taker_fee_bps": args.taker_fee_bps,
+    }
+    t0 = time.perf_counter()
+    rows = sweep(args.path, configs, args.symbol.upper(), args.ticks, args.workers, sim_kwargs)
+    print(f"[SWEEP] done in {time.perf_counter() - t0:.2f}s")
+
+    rows.sort(key=lambda r: (r.get(args.sort) is not None, r.get(args.sort) or 0), reverse=True)
+    cols = list(params) + ["fills", "taker_fills", "inventory", "max_abs_inventory", "cash_pnl", "fees", "net_pnl"]
+    print("  ".join(f"{c:>14}" for c in cols))
+    for r in rows:
+        print("  ".join(f"{str(r[c]):>14}" for c in cols))
+
+    if args.csv and rows:
+        with open(args.csv, "w", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=list(rows[0]))
+            w.writeheader()
+            w.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import json
+import struct
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+# Telemetry: everything the engine used to print() inline.
+#
+# The hot path (receive loop, book, maker) only calls
+#   tel.event(kind, a, b, c)      → one slot written into a preallocated ring
+#   if tel.book_due(): tel.book(...)  → top-of-book line, at most every N ms
+# and a background thread turns the ring into text / NDJSON / binary records
+# and does the actual I/O. If the ring is full, records are dropped (and
+# counted) rather than ever blocking the hot path.
+#
+# CONSOLE is the default for every component: it prints immediately, exactly
+# like before, so nothing changes unless a Telemetry is plugged in.
+
+# kind → (field names, console template)
+KINDS = {
+    "buffering":      (("U", "u", "last"), "[BUFFERING] U={U} u={u} last={last}"),
+    "synced":         ((), "[ORDERBOOK] Book synced"),
+    "gap":            ((), "[ORDERBOOK] Gap Detected - > Resync"),
+    "gap_buffered":   ((), "[ORDERBOOK] Gap in buffered diffs -> Resync"),
+    "stale_snapshot": ((), "[ORDERBOOK] Snapshot older than buffered diffs -> new snapshot"),
+    "snapshot_error": (("error", "retry"), "[SNAPSHOT] fetch failed ({error}) → retry #{retry}"),
+    "fill":           (("side", "price"), "[FILL] {side} {price}"),
+    "not_synced":     ((), "Book not synced"),
+    "book":           (("bb", "ba", "inventory", "pnl", "bid", "ask"), "[BOOK] BB={bb} BA={ba} INV={inventory} PNL={pnl} BID={bid} ASK={ask}"),
+    "window_resync":  ((), "[ORDERBOOK] Touch back near the depth window edge -> Resync"),
+}
+KIND_IDS = {k: i for i, k in enumerate(KINDS)}
+
+
+def format_text(kind: str, fields: tuple) -> str:
+    names, template = KINDS[kind]
+    return template.format(**dict(zip(names, fields)))
+
+
+class PrintTelemetry:
+    """ Synchronous fallback: print right away (the original behaviour) """
+
+    def event(self, kind: str, a=None, b=None, c=None):
+        print(format_text(kind, (a, b, c)))
+
+    def book_due(self) -> bool:
+        return True
+
+    def book(self, bb, ba, inventory, pnl, bid, ask):
+        print(format_text("book", (bb, ba, inventory, pnl, bid, ask)))
+
+
+class NullTelemetry:
+    """ Discards everything (backtests, sweeps) """
+
+    def event(self, kind: str, a=None, b=None, c=None):
+        pass
+
+    def book_due(self) -> bool:
+        return False
+
+    def book(self, bb, ba, inventory, pnl, bid, ask):
+        pass
+
+
+CONSOLE = PrintTelemetry()
+SILENT = NullTelemetry()
+
+
+# ---------------------------------------------------------------- sinks
+
+class StdoutSink:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def write(self, kind: str, ts_us: int, fields: tuple):
+        self.stream.write(format_text(kind, fields) + "\n")
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+
+
+class NdjsonSink:
+    """ One JSON object per line: {"ts_us": ..., "kind": ..., <named fields>} """
+
+    def __init__(self, path: str):
+        self._f = open(path, "a", buffering=1 << 16)
+
+    def write(self, kind: str, ts_us: int, fields: tuple):
+        rec = {"ts_us": ts_us, "kind": kind}
+        rec.update(zip(KINDS[kind][0], fields))
+        self._f.write(json.dumps(rec, separators=(",", ":")) + "\n")
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+class BinarySink:
+    """
+    Length-prefixed records: kind id u8 | ts_us i64 | len u16 | compact JSON array of the fields.
+    (same framing idea as feed_log.py; kind ids = order of KINDS)
+    """
+
+    _HEADER = struct.Struct("<BqH")
+
+    def __init__(self, path: str):
+        self._f = open(path, "ab", buffering=1 << 16)
+
+    def write(self, kind: str, ts_us: int, fields: tuple):
+        payload = json.dumps(fields[:len(KINDS[kind][0])], separators=(",", ":")).encode()
+        self._f.write(self._HEADER.pack(KIND_IDS[kind], ts_us, len(payload)))
+        self._f.write(payload)
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+# ---------------------------------------------------------------- async telemetry
+
+class Telemetry:
+    def __init__(
+            self,
+            sink=None,
+            capacity: int = 1 << 14, # ring slots; must be a power of two
+            book_interval_ms: float = 250.0, # top-of-book conflation: at most one [BOOK] record per interval
+            sample: Optional[Dict[str, int]] = None, # kind → keep 1 of every N (e.g. {"buffering": 10})
+            flush_interval_ms: float = 20.0, # how often the drain thread wakes up
+    ):
+        if capacity & (capacity - 1):
+            raise ValueError("capacity must be a power of two")
+        self.sink = sink or StdoutSink()
+        self.capacity = capacity
+        self._mask = capacity - 1
+        # preallocated slots: [kind, ts_us, a, b, c, d, e, f] — written in place, never reallocated
+        self._slots = [[None, 0, None, None, None, None, None, None] for _ in range(capacity)]
+        self._head = 0 # next slot the hot path writes (only the hot path touches this)
+        self._tail = 0 # next slot the drain thread reads (only the drain thread touches this)
+
+        self.book_interval_ns = int(book_interval_ms * 1_000_000)
+        self._next_book_ns = 0
+        self._sample = dict(sample or {})
+        self._seen: Dict[str, int] = {}
+        self.flush_interval = flush_interval_ms / 1000.0
+
+        # counters
+        self.emitted = 0
+        self.dropped = 0
+        self.sampled_out = 0
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- hot path
+
+    def _put(self, kind: str, a, b, c, d=None, e=None, f=None):
+        head = self._head
+        if head - self._tail >= self.capacity: # ring full → drop, never block
+            self.dropped += 1
+            return
+        slot = self._slots[head & self._mask]
+        slot[0] = kind
+        slot[1] = time.time_ns() // 1000
+        slot[2] = a
+        slot[3] = b
+        slot[4] = c
+        slot[5] = d
+        slot[6] = e
+        slot[7] = f
+        self._head = head + 1 # publish after the slot is filled
+
+    def event(self, kind: str, a=None, b=None, c=None):
+        n = self._sample.get(kind)
+        if n:
+            seen = self._seen[kind] = self._seen.get(kind, 0) + 1
+            if seen % n:
+                self.sampled_out += 1
+                return
+        self._put(kind, a, b, c)
+
+    def book_due(self) -> bool:
+        """ True at most once per book_interval: check it BEFORE gathering the book values """
+        now = time.perf_counter_ns()
+        if now < self._next_book_ns:
+            return False
+        self._next_book_ns = now + self.book_interval_ns
+        return True
+
+    def book(self, bb, ba, inventory, pnl, bid, ask):
+        self._put("book", bb, ba, inventory, pnl, bid, ask)
+
+    # ---- drain side
+
+    def drain(self) -> int:
+        head = self._head
+        tail = self._tail
+        sink = self.sink
+        mask = self._mask
+        slots = self._slots
+        while tail < head:
+            slot = slots[tail & mask]
+            kind = slot[0]
+            sink.write(kind, slot[1], tuple(slot[2:2 + len(KINDS[kind][0])]))
+            tail += 1
+        n = tail - self._tail
+        self._tail = tail # hand the slots back to the writer
+        if n:
+            sink.flush()
+            self.emitted += n
+        return n
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.drain()
+        self.drain()
+
+    def start(self) -> "Telemetry":
+        self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        else:
+            self.drain()
+        self.sink.close()
+
+    def status(self) -> dict:
+        return {
+            "emitted": self.emitted,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "backlog": self._head - self._tail,
+        }
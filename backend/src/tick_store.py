@@ -0,0 +1,468 @@
+"""
+Columnar on-disk store for decoded trades and depth updates, for research jobs.
+
+    store/
+      meta.json                         symbol, float/tick mode, tick/lot size
+      trades/index.json                 one entry per chunk: rows, ts_event_us min/max, id min/max, sorted
+      trades/000000/ts_event_us.npy ... one .npy file per column
+      depth/...                         one row per level update
+      diffs/...                         one row per DepthDiff (ids, level counts), same chunks as depth
+
+Columns
+  trades  ts_event_us ts_recv_us trade_id price qty side(+1 taker buy / -1 taker sell)
+  depth   ts_event_us ts_recv_us update_id side(0 bid / 1 ask) price qty
+  diffs   ts_event_us ts_recv_us first_id update_id prev_id(-1 = none) n_bids n_asks
+price/qty are f64, or int ticks/lots when the store was written in tick mode.
+
+Reads go through the sparse index: only chunks whose [min, max] overlaps the
+range are opened, each column is np.load(mmap_mode="r"), and the range inside a
+chunk is a searchsorted() on the memory-mapped key column, so scan() hands out
+zero-copy views straight into the page cache.
+
+    st = TickStore("store")
+    t = st.read("trades", start_us, end_us)                 # dict of column → array
+    for cols in st.scan("depth", start_us, end_us): ...     # zero-copy, chunk by chunk
+    st.read("trades", 1000, 2000, by="trade_id")            # sequence range
+    for diff in st.iter_diffs(start_us, end_us): ...        # back to DepthDiff objects
+
+Writing from the live loop (TICK_STORE_PATH in data_feed.py) is one list
+append per event. Full chunks go to a background thread that builds the
+columns (in small slices, handing the GIL back in between) and writes the files.
+
+    python tick_store.py build session.feed store/          # feed log → store
+    python tick_store.py info store/
+    python tick_store.py read store/ trades --start ... --end ... --head 10
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from array import array
+from itertools import chain
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from market_handler import DepthDiff, Trade
+from ticks import TICK_SPECS, TickSpec
+
+VERSION = 1
+TABLES = ("trades", "depth", "diffs")
+SLICE = 1000 # events converted per GIL hand-back in the writer thread
+COLUMNS = {
+    "trades": ("ts_event_us", "ts_recv_us", "trade_id", "price", "qty", "side"),
+    "depth": ("ts_event_us", "ts_recv_us", "update_id", "side", "price", "qty"),
+    "diffs": ("ts_event_us", "ts_recv_us", "first_id", "update_id", "prev_id", "n_bids", "n_asks"),
+}
+KEYS = {"trades": "trade_id", "depth": "update_id", "diffs": "update_id"} # sequence column of each table
+
+
+# ---------------------------------------------------------------- writer
+
+class TickStoreWriter:
+    def __init__(self, path: str, symbol: str, tick_spec: Optional[TickSpec] = None, chunk_rows: int = 1 << 20):
+        """ chunk_rows: trades / level updates per chunk (a diff is never split across chunks) """
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self._vfmt = "q" if tick_spec is not None else "d"
+        os.makedirs(path, exist_ok=True)
+        meta = {
+            "version": VERSION,
+            "symbol": symbol.upper(),
+            "mode": "ticks" if tick_spec is not None else "float",
+            "tick_size": tick_spec.tick_size if tick_spec is not None else None,
+            "lot_size": tick_spec.lot_size if tick_spec is not None else None,
+        }
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path): # appending to an existing store: must be the same kind
+            with open(meta_path) as f:
+                old = json.load(f)
+            if {k: old.get(k) for k in meta} != meta:
+                raise ValueError(f"{path} holds {old['symbol']} in {old['mode']} mode, not {meta['symbol']} in {meta['mode']} mode")
+        else:
+            _write_json(meta_path, meta)
+
+        self._index = {t: _load_index(path, t) for t in TABLES}
+        self._next_chunk = {t: len(self._index[t]) for t in ("trades", "depth")} # diffs follow depth's numbering
+        # the live side only keeps references: decoded events are never mutated after the consumer sees them,
+        # so turning them into columns can wait for the writer thread
+        self._trades: List[Trade] = []
+        self._diffs: List[DepthDiff] = []
+        self._levels = 0
+
+        self._q: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="tick-store", daemon=True)
+        self._thread.start()
+
+        # counters
+        self.rows = {t: 0 for t in TABLES}
+        self.chunks_written = 0
+        self.last_write_s: Optional[float] = None
+        self.error: Optional[BaseException] = None
+
+    # ---- live side: one list append per event
+
+    def on_event(self, ev):
+        if type(ev) is DepthDiff:
+            self.on_depth(ev)
+        elif type(ev) is Trade:
+            self.on_trade(ev)
+
+    def on_trade(self, tr: Trade):
+        self._trades.append(tr)
+        if len(self._trades) >= self.chunk_rows:
+            self._flush_trades()
+
+    def on_depth(self, diff: DepthDiff):
+        self._diffs.append(diff)
+        self._levels += len(diff.bids) + len(diff.asks)
+        if self._levels >= self.chunk_rows:
+            self._flush_depth()
+
+    def _flush_trades(self):
+        if self._trades:
+            self._q.put(("trades", self._next_chunk["trades"], self._trades))
+            self._next_chunk["trades"] += 1
+            self._trades = []
+
+    def _flush_depth(self):
+        if self._diffs:
+            self._q.put(("depth", self._next_chunk["depth"], self._diffs))
+            self._next_chunk["depth"] += 1
+            self._diffs = []
+            self._levels = 0
+
+    def flush(self):
+        """ Hand the current partial chunks to the writer thread (they become readable once written) """
+        self._flush_trades()
+        self._flush_depth()
+
+    def close(self):
+        self.flush()
+        self._q.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def pending(self) -> int:
+        return self._q.qsize()
+
+    def status(self) -> dict:
+        return {
+            "rows": dict(self.rows),
+            "chunks_written": self.chunks_written,
+            "pending_chunks": self.pending(),
+            "last_write_ms": round(self.last_write_s * 1000, 1) if self.last_write_s is not None else None,
+        }
+
+    # ---- writer thread
+
+    def _run(self):
+        while True:
+            item = self._q.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue # keep draining so the live side never blocks; close() reports the error
+            table, chunk, events = item
+            t0 = time.perf_counter()
+            try:
+                if table == "trades":
+                    self._write_trades(chunk, events)
+                else:
+                    self._write_depth(chunk, events)
+            except Exception as e:
+                self.error = e
+                print(f"[TICKSTORE] write failed: {e!r}")
+                continue
+            self.last_write_s = time.perf_counter() - t0
+            self.chunks_written += 1
+
+    def _slices(self, events: list):
+        # column building holds the GIL; hand it back to the live loop between small slices
+        for k in range(0, len(events), SLICE):
+            yield events[k:k + SLICE]
+            time.sleep(0)
+
+    def _write_trades(self, chunk: int, trades: List[Trade]):
+        vt = np.int64 if self._vfmt == "q" else np.float64
+        ts, recv, ids, px, qty, side = array("q"), array("q"), array("q"), array(self._vfmt), array(self._vfmt), array("b")
+        for part in self._slices(trades):
+            for tr in part:
+                ts.append(tr.ts_event_us)
+                recv.append(tr.ts_recv_us)
+                ids.append(tr.trade_id)
+                px.append(tr.price)
+                qty.append(tr.qty)
+                side.append(1 if tr.taker_side == "buy" else -1)
+        self._write_chunk("trades", chunk, {
+            "ts_event_us": np.frombuffer(ts, np.int64),
+            "ts_recv_us": np.frombuffer(recv, np.int64),
+            "trade_id": np.frombuffer(ids, np.int64),
+            "price": np.frombuffer(px, vt),
+            "qty": np.frombuffer(qty, vt),
+            "side": np.frombuffer(side, np.int8),
+        })
+
+    def _write_depth(self, chunk: int, diffs: List[DepthDiff]):
+        vt = np.int64 if self._vfmt == "q" else np.float64
+        ts, recv, first, u, pu = array("q"), array("q"), array("q"), array("q"), array("q")
+        nb, na = array("q"), array("q")
+        levels = array(self._vfmt) # price, qty, price, qty, ... bids then asks for each diff
+        for part in self._slices(diffs):
+            for d in part:
+                ts.append(d.ts_event_us)
+                recv.append(d.ts_recv_us)
+                first.append(d.U)
+                u.append(d.u)
+                pu.append(-1 if d.pu is None else d.pu)
+                nb.append(len(d.bids))
+                na.append(len(d.asks))
+                levels.extend(chain.from_iterable(d.bids))
+                levels.extend(chain.from_iterable(d.asks))
+        ts = np.frombuffer(ts, np.int64)
+        recv = np.frombuffer(recv, np.int64)
+        u = np.frombuffer(u, np.int64)
+        nb = np.frombuffer(nb, np.int64).astype(np.int32)
+        na = np.frombuffer(na, np.int64).astype(np.int32)
+        lv = np.frombuffer(levels, vt)
+        per_diff = nb + na
+        self._write_chunk("diffs", chunk, {
+            "ts_event_us": ts,
+            "ts_recv_us": recv,
+            "first_id": np.frombuffer(first, np.int64),
+            "update_id": u,
+            "prev_id": np.frombuffer(pu, np.int64),
+            "n_bids": nb,
+            "n_asks": na,
+        })
+        self._write_chunk("depth", chunk, {
+            "ts_event_us": np.repeat(ts, per_diff),
+            "ts_recv_us": np.repeat(recv, per_diff),
+            "update_id": np.repeat(u, per_diff),
+            "side": np.repeat(np.tile(np.array([0, 1], dtype=np.int8), len(nb)), np.column_stack((nb, na)).ravel()),
+            "price": lv[0::2],
+            "qty": lv[1::2],
+        })
+
+    def _write_chunk(self, table: str, chunk: int, cols: Dict[str, np.ndarray]):
+        d = os.path.join(self.path, table, f"{chunk:06d}")
+        os.makedirs(d, exist_ok=True)
+        for name, col in cols.items():
+            np.save(os.path.join(d, f"{name}.npy"), np.ascontiguousarray(col))
+        ts, ids = cols["ts_event_us"], cols[KEYS[table]]
+        n = len(ts)
+        entry = {
+            "chunk": chunk,
+            "rows": n,
+            "ts_min": int(ts.min()) if n else None,
+            "ts_max": int(ts.max()) if n else None,
+            "id_min": int(ids.min()) if n else None,
+            "id_max": int(ids.max()) if n else None,
+            "sorted": bool(n < 2 or ((np.diff(ts) >= 0).all() and (np.diff(ids) >= 0).all())),
+        }
+        index = self._index[table]
+        index.append(entry)
+        _write_json(os.path.join(self.path, table, "index.json"), index) # after the columns → readers never see half a chunk
+        self.rows[table] += n
+
+
+def _write_json(path: str, obj):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def _load_index(path: str, table: str) -> List[dict]:
+    try:
+        with open(os.path.join(path, table, "index.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+# ---------------------------------------------------------------- reader
+
+class TickStore:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.symbol = self.meta["symbol"]
+        self.tick_spec = TickSpec(self.symbol, self.meta["tick_size"], self.meta["lot_size"]) if self.meta["mode"] == "ticks" else None
+        self._maps: Dict[tuple, np.ndarray] = {}
+        self.refresh()
+
+    def refresh(self):
+        """ Pick up chunks written since the store was opened (e.g. by a live writer) """
+        self.index = {t: _load_index(self.path, t) for t in TABLES}
+
+    def column(self, table: str, chunk: int, name: str) -> np.ndarray:
+        """ One column of one chunk, memory-mapped (read-only) """
+        key = (table, chunk, name)
+        col = self._maps.get(key)
+        if col is None:
+            col = np.load(os.path.join(self.path, table, f"{chunk:06d}", f"{name}.npy"), mmap_mode="r")
+            self._maps[key] = col
+        return col
+
+    def columns(self, table: str) -> List[str]:
+        return list(COLUMNS[table])
+
+    def _chunks(self, table: str, start, end, by: str) -> Iterator[tuple]:
+        """ (chunk, i, j, mask) for each chunk holding rows with start <= by < end; mask is None for sorted chunks """
+        if by == "ts_event_us":
+            lo_key, hi_key = "ts_min", "ts_max"
+        elif by == KEYS[table]:
+            lo_key, hi_key = "id_min", "id_max"
+        else:
+            raise ValueError(f"{table} can be read by ts_event_us or {KEYS[table]}, not {by!r}")
+        for entry in self.index[table]:
+            if not entry["rows"]:
+                continue
+            if (start is not None and entry[hi_key] < start) or (end is not None and entry[lo_key] >= end):
+                continue # the sparse index rules the whole chunk out
+            chunk = entry["chunk"]
+            key = self.column(table, chunk, by)
+            if entry["sorted"]:
+                i = 0 if start is None else int(np.searchsorted(key, start, side="left"))
+                j = len(key) if end is None else int(np.searchsorted(key, end, side="left"))
+                if i < j:
+                    yield chunk, i, j, None
+            else:
+                mask = np.ones(len(key), dtype=bool)
+                if start is not None:
+                    mask &= key >= start
+                if end is not None:
+                    mask &= key < end
+                if mask.any():
+                    yield chunk, 0, len(key), mask
+
+    def scan(self, table: str, start=None, end=None, by: str = "ts_event_us",
+             columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Rows with start <= by < end, one dict of column arrays per chunk, in chunk order.
+        by = "ts_event_us" or the table's sequence column (trade_id / update_id).
+        Sorted chunks give zero-copy views into the mapped files; unsorted ones a filtered copy.
+        """
+        names = list(columns) if columns is not None else self.columns(table)
+        for chunk, i, j, mask in self._chunks(table, start, end, by):
+            if mask is None:
+                yield {name: self.column(table, chunk, name)[i:j] for name in names}
+            else:
+                yield {name: self.column(table, chunk, name)[mask] for name in names}
+
+    def read(self, table: str, start=None, end=None, by: str = "ts_event_us",
+             columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        """ Same rows as scan(), as one array per column (a copy only if they span several chunks) """
+        names = list(columns) if columns is not None else self.columns(table)
+        parts = list(self.scan(table, start, end, by, names))
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return {name: np.empty(0, dtype=self._dtype(table, name)) for name in names}
+        return {name: np.concatenate([p[name] for p in parts]) for name in names}
+
+    def _dtype(self, table: str, name: str):
+        if self.index[table]:
+            return self.column(table, self.index[table][0]["chunk"], name).dtype
+        return np.int64
+
+    def iter_diffs(self, start=None, end=None, by: str = "ts_event_us") -> Iterator[DepthDiff]:
+        """ The stored depth updates as DepthDiff objects again (e.g. to feed an OrderBookEngine) """
+        for chunk, i, j, mask in self._chunks("diffs", start, end, by):
+            col = lambda name: self.column("diffs", chunk, name)
+            nb_all, na_all = col("n_bids"), col("n_asks")
+            # depth rows are laid out diff after diff, bids then asks → level offset of each diff in the chunk
+            offsets = np.concatenate(([0], np.cumsum(nb_all.astype(np.int64) + na_all)))
+            rows = np.arange(i, j) if mask is None else np.flatnonzero(mask)
+            px = self.column("depth", chunk, "price")
+            qty = self.column("depth", chunk, "qty")
+            lo, hi = int(offsets[rows[0]]), int(offsets[rows[-1] + 1])
+            levels = list(zip(px[lo:hi].tolist(), qty[lo:hi].tolist()))
+            for r, ts, recv, U, u, pu, nb, na in zip(rows.tolist(), col("ts_event_us")[rows].tolist(), col("ts_recv_us")[rows].tolist(),
+                                                     col("first_id")[rows].tolist(), col("update_id")[rows].tolist(),
+                                                     col("prev_id")[rows].tolist(), nb_all[rows].tolist(), na_all[rows].tolist()):
+                k = int(offsets[r]) - lo
+                yield DepthDiff("depth_diff", ts, recv, self.symbol, U, u, None if pu == -1 else pu,
+                                levels[k:k + nb], levels[k + nb:k + nb + na])
+
+    def info(self) -> dict:
+        out = {"path": self.path, **self.meta}
+        for t in TABLES:
+            idx = self.index[t]
+            rows = sum(e["rows"] for e in idx)
+            ts = [e for e in idx if e["rows"]]
+            out[t] = {
+                "chunks": len(idx),
+                "rows": rows,
+                "ts_event_us": [min(e["ts_min"] for e in ts), max(e["ts_max"] for e in ts)] if ts else None,
+                "ids": [min(e["id_min"] for e in ts), max(e["id_max"] for e in ts)] if ts else None,
+                "unsorted_chunks": sum(1 for e in idx if not e["sorted"]),
+            }
+        return out
+
+
+# ---------------------------------------------------------------- CLI
+
+def build(log_path: str, store_path: str, symbol: str = "BTCUSDT", tick_spec: Optional[TickSpec] = None,
+          chunk_rows: int = 1 << 20) -> dict:
+    """ Decode a feed log (feed_log.py) once and write it into a store """
+    from feed_log import REC_FRAME, read_feed_log
+    from market_handler import MarketDecoder
+
+    decoder = MarketDecoder(expect_microseconds=True, tick_specs={symbol: tick_spec} if tick_spec else None)
+    writer = TickStoreWriter(store_path, symbol, tick_spec, chunk_rows)
+    t0 = time.perf_counter()
+    for kind, ts_recv_us, payload in read_feed_log(log_path):
+        if kind == REC_FRAME:
+            ev = decoder.parse_frame(payload, ts_recv_us)
+            if ev is not None and ev.symbol == symbol:
+                writer.on_event(ev)
+    writer.close()
+    return {**writer.status(), "elapsed_s": round(time.perf_counter() - t0, 3)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Columnar tick store")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="feed log → store")
+    b.add_argument("log")
+    b.add_argument("store")
+    b.add_argument("--symbol", default="BTCUSDT")
+    b.add_argument("--ticks", action="store_true", help="store int ticks/lots")
+    b.add_argument("--chunk-rows", type=int, default=1 << 20)
+    i = sub.add_parser("info")
+    i.add_argument("store")
+    r = sub.add_parser("read", help="print a range of one table")
+    r.add_argument("store")
+    r.add_argument("table", choices=TABLES)
+    r.add_argument("--start", type=int, help="inclusive, in --by units")
+    r.add_argument("--end", type=int, help="exclusive")
+    r.add_argument("--by", default="ts_event_us", help="ts_event_us or trade_id / update_id")
+    r.add_argument("--head", type=int, default=20)
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        symbol = args.symbol.upper()
+        print(build(args.log, args.store, symbol, TICK_SPECS[symbol] if args.ticks else None, args.chunk_rows))
+    elif args.cmd == "info":
+        print(json.dumps(TickStore(args.store).info(), indent=2))
+    else:
+        st = TickStore(args.store)
+        t0 = time.perf_counter()
+        cols = st.read(args.table, args.start, args.end, args.by)
+        dt = time.perf_counter() - t0
+        names = list(cols)
+        n = len(cols[names[0]]) if names else 0
+        print(f"{n} rows in {dt * 1000:.2f} ms")
+        print("  ".join(f"{c:>14}" for c in names))
+        for k in range(min(n, args.head)):
+            print("  ".join(f"{cols[c][k]:>14}" for c in names))
+
+
+if __name__ == "__main__":
+    main()
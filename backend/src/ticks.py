@@ -0,0 +1,105 @@
+from dataclasses import dataclass, field
+
+# Fixed-point prices and quantities.
+#
+# Binance sends prices and quantities as decimal strings ("90105.01000000").
+# Turning them into floats means 90105.01 might not compare equal to the
+# "same" price later, and float keys hash/compare slower than small ints.
+#
+# In tick mode we parse those strings straight into integers:
+#   price -> number of ticks (tick_size = smallest price step, BTCUSDT = 0.01)
+#   qty   -> number of lots  (lot_size  = smallest qty step,   BTCUSDT = 0.00001)
+# and only convert back to float when printing / reporting.
+# (The hot-path parse may use a double internally, but only where the result is provably the exact
+# integer; see price_to_ticks / qty_to_lots.)
+
+
+def _decimals(step: str) -> int: # "0.01" -> 2, "1" -> 0
+    _, _, frac = step.partition(".")
+    return len(frac.rstrip("0"))
+
+
+def _scaled_int(s: str, decimals: int) -> int:
+    """ "90105.01000000" with decimals=2 -> 9010501, without going through float """
+    whole, _, frac = s.partition(".")
+    if len(frac) < decimals:
+        frac = frac + "0" * (decimals - len(frac))
+    return int(whole + frac[:decimals]) # digits past `decimals` are zeros for tick-aligned values
+
+
+# Parsed prices are cached per TickSpec: a diff mostly touches price levels the book has seen
+# before, and a dict hit is ~10x cheaper than parsing. Cleared when it gets this big.
+CACHE_SIZE = 1 << 16
+
+
+@dataclass(frozen=True)
+class TickSpec:
+    symbol: str
+    tick_size: str # kept as strings so the exact decimal is never lost, e.g. "0.01"
+    lot_size: str  # e.g. "0.00001"
+
+    # derived in __post_init__
+    price_decimals: int = field(init=False)
+    qty_decimals: int = field(init=False)
+    tick_units: int = field(init=False) # tick size expressed at price_decimals scale (1 for "0.01", 5 for "0.05")
+    lot_units: int = field(init=False)
+    tick: float = field(init=False) # float versions, only for the reporting edge
+    lot: float = field(init=False)
+    price_scale: int = field(init=False) # 10 ** price_decimals
+    qty_scale: int = field(init=False)
+    ticks_cache: dict = field(init=False, repr=False, compare=False) # price string -> ticks, see CACHE_SIZE
+
+    def __post_init__(self):
+        pd = _decimals(self.tick_size)
+        qd = _decimals(self.lot_size)
+        object.__setattr__(self, "price_decimals", pd)
+        object.__setattr__(self, "qty_decimals", qd)
+        object.__setattr__(self, "tick_units", _scaled_int(self.tick_size, pd))
+        object.__setattr__(self, "lot_units", _scaled_int(self.lot_size, qd))
+        object.__setattr__(self, "tick", float(self.tick_size))
+        object.__setattr__(self, "lot", float(self.lot_size))
+        object.__setattr__(self, "price_scale", 10 ** pd)
+        object.__setattr__(self, "qty_scale", 10 ** qd)
+        object.__setattr__(self, "ticks_cache", {})
+
+    # string -> int (hot path: decoder + snapshot)
+    # Both are exact for tick-aligned strings of up to 15 significant digits (every Binance price / qty):
+    # a double is off by < 1e-15 relative there, so round() lands on the exact integer. Longer strings
+    # take the pure string path.
+    def price_to_ticks(self, s: str) -> int:
+        t = self.ticks_cache.get(s)
+        if t is None:
+            if len(s) > 16:
+                t = _scaled_int(s, self.price_decimals) // self.tick_units
+            else:
+                t = round(float(s) * self.price_scale) // self.tick_units
+            if len(self.ticks_cache) >= CACHE_SIZE:
+                self.ticks_cache.clear()
+            self.ticks_cache[s] = t
+        return t
+
+    def qty_to_lots(self, s: str) -> int: # not cached: sizes rarely repeat
+        if len(s) > 16:
+            return _scaled_int(s, self.qty_decimals) // self.lot_units
+        return round(float(s) * self.qty_scale) // self.lot_units
+
+    # int -> float (reporting edge only)
+    def ticks_to_price(self, ticks: int) -> float:
+        return round(ticks * self.tick, self.price_decimals)
+
+    def lots_to_qty(self, lots: int) -> float:
+        return round(lots * self.lot, self.qty_decimals)
+
+    # float config values (strategy params) -> ints, done once at startup
+    def price_to_ticks_f(self, price: float) -> int:
+        return round(price / self.tick)
+
+    def qty_to_lots_f(self, qty: float) -> int:
+        return round(qty / self.lot)
+
+
+# Exchange filters (PRICE_FILTER.tickSize / LOT_SIZE.stepSize from /api/v3/exchangeInfo)
+TICK_SPECS = {
+    "BTCUSDT": TickSpec("BTCUSDT", "0.01", "0.00001"),
+    "ETHUSDT": TickSpec("ETHUSDT", "0.01", "0.0001"),
+}
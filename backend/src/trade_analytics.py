@@ -0,0 +1,141 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from market_handler import Trade
+from ticks import TickSpec
+
+# Rolling trade analytics over several time windows (default 1s / 10s / 60s).
+#
+# Every trade goes into one preallocated ring of NumPy arrays (time, price, qty,
+# side). on_trade() is O(1): a handful of scalar array writes, no allocation.
+# Each trade is written twice, at i and i + capacity, so the most recent n
+# trades are always ONE contiguous slice — a window is then a searchsorted()
+# for its start plus vectorised sums over that slice, with no copying or
+# wrap-around handling.
+#
+# Memory is fixed by `capacity` whatever the trade rate. If more than
+# `capacity` trades arrive within the longest window, that window only covers
+# the newest `capacity` trades (reported as "truncated").
+#
+# Times are exchange times (ts_event_us), so a replay gives the same numbers.
+
+
+class TradeAnalytics:
+    def __init__(
+            self,
+            windows_s: Sequence[float] = (1.0, 10.0, 60.0),
+            capacity: int = 1 << 16, # trades kept; must be a power of two
+            tick_spec: Optional[TickSpec] = None, # tick mode: trades arrive in ticks/lots, stored as prices/qtys
+    ):
+        if capacity & (capacity - 1):
+            raise ValueError("capacity must be a power of two")
+        self.windows_s = tuple(windows_s)
+        self.capacity = capacity
+        self._mask = capacity - 1
+        self._price_scale = tick_spec.tick if tick_spec else 1.0
+        self._qty_scale = tick_spec.lot if tick_spec else 1.0
+
+        n = 2 * capacity # mirrored, see above
+        self._ts = np.zeros(n, dtype=np.int64) # µs
+        self._px = np.zeros(n, dtype=np.float64)
+        self._qty = np.zeros(n, dtype=np.float64)
+        self._sign = np.zeros(n, dtype=np.float64) # +1 taker buy, -1 taker sell
+        self._head = 0 # trades written so far
+
+    def on_trade(self, tr: Trade):
+        i = self._head & self._mask
+        j = i + self.capacity
+        ts = tr.ts_event_us
+        px = tr.price * self._price_scale
+        qty = tr.qty * self._qty_scale
+        sign = 1.0 if tr.taker_side == "buy" else -1.0
+        self._ts[i] = self._ts[j] = ts
+        self._px[i] = self._px[j] = px
+        self._qty[i] = self._qty[j] = qty
+        self._sign[i] = self._sign[j] = sign
+        self._head += 1
+
+    def __len__(self) -> int:
+        return min(self._head, self.capacity)
+
+    def _recent(self, n: int) -> slice:
+        """ slice of the mirrored arrays holding the newest n trades, oldest first """
+        end = (self._head & self._mask) + self.capacity
+        return slice(end - n, end)
+
+    def last_ts(self) -> Optional[int]:
+        if not self._head:
+            return None
+        return int(self._ts[(self._head - 1) & self._mask])
+
+    # ---- window reductions
+
+    def window(self, seconds: float, now_us: Optional[int] = None) -> dict:
+        """ Stats over trades with ts > now - seconds (now = newest trade by default) """
+        n = len(self)
+        now_us = self.last_ts() if now_us is None else now_us
+        out = {"window_s": seconds, "trades": 0, "volume": 0.0, "vwap": None, "flow_imbalance": None,
+               "realized_vol": None, "open": None, "high": None, "low": None, "close": None, "truncated": False}
+        if not n or now_us is None:
+            return out
+        sl = self._recent(n)
+        ts = self._ts[sl]
+        start = int(np.searchsorted(ts, now_us - int(seconds * 1_000_000), side="right"))
+        stop = int(np.searchsorted(ts, now_us, side="right"))
+        if stop <= start:
+            return out
+        px = self._px[sl][start:stop]
+        qty = self._qty[sl][start:stop]
+        vol = float(qty.sum())
+        logp = np.log(px)
+        out.update(
+            trades=stop - start,
+            volume=vol,
+            vwap=float(px @ qty / vol) if vol else None,
+            flow_imbalance=float(self._sign[sl][start:stop] @ qty / vol) if vol else None, # (buy vol - sell vol) / vol
+            realized_vol=float(np.sqrt(np.square(np.diff(logp)).sum())), # sqrt(sum of squared trade-to-trade log returns)
+            open=float(px[0]), high=float(px.max()), low=float(px.min()), close=float(px[-1]),
+            truncated=start == 0 and self._head > self.capacity, # oldest kept trade is inside the window
+        )
+        return out
+
+    def snapshot(self, now_us: Optional[int] = None) -> Dict[float, dict]:
+        return {w: self.window(w, now_us) for w in self.windows_s}
+
+    def bars(self, bar_s: float = 1.0, count: int = 60) -> List[dict]:
+        """ Last `count` OHLCV bars of bar_s seconds (bars without trades are skipped) """
+        n = len(self)
+        if not n:
+            return []
+        bar_us = int(bar_s * 1_000_000)
+        sl = self._recent(n)
+        ts = self._ts[sl]
+        first_bar = ts[-1] // bar_us - count + 1
+        start = int(np.searchsorted(ts, first_bar * bar_us, side="left"))
+        ts = ts[start:]
+        px = self._px[sl][start:]
+        qty = self._qty[sl][start:]
+        ids = ts // bar_us
+        edges = np.flatnonzero(np.diff(ids)) + 1 # where a new bar starts
+        starts = np.concatenate(([0], edges))
+        ends = np.concatenate((edges, [len(ids)])) - 1
+        vols = np.add.reduceat(qty, starts)
+        highs = np.maximum.reduceat(px, starts)
+        lows = np.minimum.reduceat(px, starts)
+        return [
+            {"t_us": int(ids[s] * bar_us), "open": float(px[s]), "high": float(h), "low": float(lo),
+             "close": float(px[e]), "volume": float(v)}
+            for s, e, h, lo, v in zip(starts, ends, highs, lows, vols)
+        ]
+
+    def format(self, snap: Optional[Dict[float, dict]] = None) -> str:
+        snap = self.snapshot() if snap is None else snap
+        lines = [f"{'window':>7}{'trades':>9}{'volume':>12}{'vwap':>14}{'flow':>8}{'rvol(bp)':>10}"]
+        for w, s in snap.items():
+            if not s["trades"]:
+                lines.append(f"{w:>6g}s{0:>9}")
+                continue
+            lines.append(f"{w:>6g}s{s['trades']:>9}{s['volume']:>12.5f}{s['vwap']:>14.2f}"
+                         f"{s['flow_imbalance']:>+8.2f}{s['realized_vol'] * 1e4:>10.2f}{' *' if s['truncated'] else ''}")
+        return "\n".join(lines)
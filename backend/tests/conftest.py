@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules use flat imports (they are run from backend/src), so put that directory on the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
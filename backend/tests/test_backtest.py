@@ -0,0 +1,56 @@
+from backtest import make_backtester, run_events
+from market_handler import DepthDiff, Trade
+from ticks import TICK_SPECS
+
+SPEC = TICK_SPECS["BTCUSDT"]
+SNAPSHOT = {"lastUpdateId": 100, "bids": [["100.00", "5"], ["99.00", "5"]], "asks": [["100.10", "5"], ["101.00", "5"]]}
+
+
+def ticks(p):
+    return SPEC.price_to_ticks(p)
+
+
+def lots(q):
+    return SPEC.qty_to_lots(q)
+
+
+def diff(t, n):
+    return DepthDiff("depth_diff", t, t, "BTCUSDT", n, n, None, [(ticks("99.00"), lots(str(n)))], [])
+
+
+def sell(t, price, qty):
+    return Trade("trade", t, t, "BTCUSDT", t, ticks(price), lots(qty), "sell")
+
+
+def resting(sim, side):
+    return {o.price: o for o in sim.maker.orders.side(side).levels()}
+
+
+def test_every_ladder_level_is_simulated_and_fills_go_through_the_order_manager():
+    # mid 100.05, 1 tick away, 3 levels 1 tick apart → bids 100.04 / 100.03 / 100.02, nobody ahead of us
+    sim = make_backtester([SNAPSHOT], tick_spec=SPEC, entry_latency_us=0, cancel_latency_us=0, maker_kwargs=dict(
+        quote_size=1.0, max_inventory=10.0, spread_offset=0.01, inventory_skew=0.0, levels=3, level_spacing=0.01))
+    run_events(sim, [diff(1000, 101), diff(2000, 102)])
+    bids = resting(sim, "buy")
+    assert sorted(bids) == [ticks("100.02"), ticks("100.03"), ticks("100.04")]
+    assert {o.rest.order_id for o in sim._working["buy"].values()} == {r.order_id for r in bids.values()}
+    assert all(o.live for o in sim.active)
+
+    # trades through 100.04 (all of it) and at 100.03 (half of it)
+    run_events(sim, [sell(3000, "100.03", "0.5")])
+    assert [(sim.book.to_price(f.price), sim.book.to_qty(f.qty)) for f in sim.fills] == [(100.04, 1.0), (100.03, 0.5)]
+    bids = resting(sim, "buy")
+    assert sorted(bids) == [ticks("100.02"), ticks("100.03")] # the filled order stopped resting
+    assert bids[ticks("100.03")].remaining == lots("0.5")
+    assert sim.maker.bid_quote.price == ticks("100.03") and sim.maker.bid_quote.qty == lots("0.5")
+
+    # next book update: the filled level is quoted again, the partial keeps its queue spot and its size
+    partial = sim._working["buy"][bids[ticks("100.03")].order_id]
+    sent = sim.orders_sent
+    run_events(sim, [diff(4000, 103)])
+    bids = resting(sim, "buy")
+    assert sorted(bids) == [ticks("100.02"), ticks("100.03"), ticks("100.04")]
+    assert sim.orders_sent == sent + 1
+    assert sim._working["buy"][bids[ticks("100.03")].order_id] is partial and partial.remaining == lots("0.5")
+    assert sim.maker.bid_quote.price == ticks("100.04") and sim.maker.bid_quote.qty == lots("1")
+    assert sim.book.to_qty(sim.maker.inventory) == 1.5
@@ -0,0 +1,89 @@
+import struct
+
+import pytest
+
+from book_checkpoint import HEADER, BookCheckpoint
+from market_handler import DepthDiff
+from order_book_engine import OrderBookEngine
+from telemetry import SILENT
+from ticks import TICK_SPECS
+
+SEQ_AT = struct.calcsize("<8sHH16sI") # offset of seq in the header
+
+
+def make_book(tick_spec=None, synced=True):
+    book = OrderBookEngine("BTCUSDT", book_side="ticks" if tick_spec else "sorted", tick_spec=tick_spec)
+    book.telemetry = SILENT
+    book.snapshot_provider = lambda: pytest.fail("no REST snapshot expected")
+    book.apply_snapshot({"lastUpdateId": 500,
+                         "bids": [["100.00", "1.5"], ["99.99", "2"]],
+                         "asks": [["100.01", "0.5"], ["100.50", "4"]]})
+    book.synced = synced
+    return book
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "btcusdt.book")
+
+
+def write(book, path):
+    ckpt = BookCheckpoint(book, path, depth=10)
+    assert ckpt.write()
+    ckpt.close()
+
+
+@pytest.mark.parametrize("tick_spec", [None, TICK_SPECS["BTCUSDT"]])
+def test_roundtrip_and_warm_start(path, tick_spec):
+    src = make_book(tick_spec)
+    write(src, path)
+
+    book = make_book(tick_spec, synced=False)
+    book.bids.clear()
+    book.asks.clear()
+    ckpt = BookCheckpoint(book, path, depth=10)
+    assert ckpt.restore()
+    assert ckpt.restored_from == 500
+    assert book.top_levels(10) == src.top_levels(10)
+    assert book.snapshot_loaded and not book.synced
+
+    # the first live diff bridges the checkpoint without a REST snapshot
+    bid = tick_spec.price_to_ticks("100.00") if tick_spec else 100.0
+    qty = tick_spec.qty_to_lots("3") if tick_spec else 3.0
+    book.on_depth_diff(DepthDiff("depth_diff", 0, 0, "BTCUSDT", 499, 501, None, [(bid, qty)], []))
+    assert book.synced and book.last_update_id == 501
+    assert book.best_bid() == bid and book.bids.get(bid) == qty
+
+
+def test_not_synced_book_is_not_written(path):
+    assert not BookCheckpoint(make_book(synced=False), path).write()
+
+
+def corrupt(path, offset, data):
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(data)
+
+
+def test_crc_mismatch_is_rejected(path):
+    write(make_book(), path)
+    corrupt(path, HEADER.size + 3, b"\xff")
+    assert BookCheckpoint(make_book(synced=False), path, depth=10).load() is None
+
+
+def test_torn_write_is_rejected(path):
+    write(make_book(), path)
+    with open(path, "rb") as f:
+        f.seek(SEQ_AT)
+        (seq,) = struct.unpack("<Q", f.read(8))
+    assert seq % 2 == 0
+    corrupt(path, SEQ_AT, struct.pack("<Q", seq + 1)) # crashed between the two header writes
+    assert BookCheckpoint(make_book(synced=False), path, depth=10).load() is None
+
+
+def test_other_mode_missing_or_stale_is_rejected(path, tmp_path):
+    write(make_book(), path)
+    assert BookCheckpoint(make_book(TICK_SPECS["BTCUSDT"], synced=False), path, depth=10).load() is None # float file, tick book
+    assert BookCheckpoint(make_book(synced=False), str(tmp_path / "missing.book")).load() is None
+    assert BookCheckpoint(make_book(synced=False), path, depth=10, max_age_s=-1).load() is None
+    assert BookCheckpoint(make_book(synced=False), path, depth=10).load() is not None
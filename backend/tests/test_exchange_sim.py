@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+from exchange_sim import ExchangeSim
+from feed_log import FeedRecorder
+
+
+@pytest.fixture
+def btc_log(tmp_path):
+    path = str(tmp_path / "btc.feed")
+    with FeedRecorder(path) as rec:
+        frame = {"stream": "btcusdt@depth@100ms",
+                 "data": {"e": "depthUpdate", "E": 1, "s": "BTCUSDT", "U": 99, "u": 101, "b": [["100.00", "2"]], "a": []}}
+        rec.write_frame(json.dumps(frame), 1)
+        rec.write_snapshot({"lastUpdateId": 100, "bids": [["100.00", "1"]], "asks": [["100.10", "1"]]}, 2)
+    return path
+
+
+def test_replay_seeds_the_recorded_symbols_book(btc_log):
+    sim = ExchangeSim(["ethusdt", "btcusdt"], replay_path=btc_log)
+    frames = sim._load_replay()
+    assert len(frames) == 1
+    assert sim.books["BTCUSDT"].last_update_id == 100
+    assert sim.books["BTCUSDT"].snapshot(10)["bids"] == [["100.00", "1"]]
+    assert sim.books["ETHUSDT"].last_update_id == 1 # untouched
+
+
+def test_replay_of_a_symbol_not_served_is_rejected(btc_log):
+    with pytest.raises(ValueError, match="BTCUSDT"):
+        ExchangeSim(["ethusdt"], replay_path=btc_log)._load_replay()
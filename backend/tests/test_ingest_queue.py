@@ -0,0 +1,76 @@
+from ingest_queue import ConflatingQueue
+from market_handler import DepthDiff, Trade
+
+
+def diff(U, u, bids=(), asks=(), pu=None):
+    return DepthDiff("depth_diff", 0, 0, "BTCUSDT", U, u, pu, list(bids), list(asks))
+
+
+def trade(trade_id):
+    return Trade("trade", 0, 0, "BTCUSDT", trade_id, 100.0, 1.0, "buy")
+
+
+def drain(q):
+    out = []
+    while not q.empty():
+        out.append(q.get_nowait())
+    return out
+
+
+def test_contiguous_diffs_are_merged_later_qty_wins():
+    q = ConflatingQueue(conflate_at=1)
+    q.put_nowait(diff(1, 2, bids=[(100.0, 1.0)], asks=[(101.0, 1.0)]))
+    q.put_nowait(diff(3, 4, bids=[(100.0, 0.0), (99.0, 2.0)]))
+    q.put_nowait(diff(5, 7, asks=[(101.0, 3.0)]))
+    assert q.qsize() == 1
+    (m,) = drain(q)
+    assert (m.U, m.u) == (1, 7)
+    assert dict(m.bids) == {100.0: 0.0, 99.0: 2.0}
+    assert dict(m.asks) == {101.0: 3.0}
+    s = q.stats()
+    assert (s["diffs_in"], s["diffs_out"], s["conflation_ratio"]) == (3, 1, 3.0)
+
+
+def test_never_merged_across_a_trade_or_a_gap():
+    q = ConflatingQueue(conflate_at=1)
+    q.put_nowait(diff(1, 2))
+    q.put_nowait(trade(1))
+    q.put_nowait(diff(3, 4)) # tail is a trade
+    q.put_nowait(diff(6, 7)) # gap: 5 missing → the book must see it
+    out = drain(q)
+    assert [type(e).__name__ for e in out] == ["DepthDiff", "Trade", "DepthDiff", "DepthDiff"]
+    assert [(e.U, e.u) for e in out if isinstance(e, DepthDiff)] == [(1, 2), (3, 4), (6, 7)]
+
+
+def test_pu_continuity_keeps_first_pu():
+    q = ConflatingQueue(conflate_at=1)
+    q.put_nowait(diff(10, 12, pu=9))
+    q.put_nowait(diff(13, 15, pu=12))
+    q.put_nowait(diff(16, 18, pu=14)) # pu doesn't follow → not merged
+    out = drain(q)
+    assert [(e.U, e.u, e.pu) for e in out] == [(10, 15, 9), (16, 18, 14)]
+
+
+def test_conflate_at_threshold():
+    q = ConflatingQueue(conflate_at=2)
+    q.put_nowait(diff(1, 1))
+    q.put_nowait(diff(2, 2)) # only one waiting → queued
+    q.put_nowait(diff(3, 3)) # two waiting → merged into the last
+    assert [(e.U, e.u) for e in drain(q)] == [(1, 1), (2, 3)]
+
+    q = ConflatingQueue(conflate_at=0) # never
+    for i in range(1, 4):
+        q.put_nowait(diff(i, i))
+    assert q.qsize() == 3
+
+
+def test_taken_diff_is_not_merged_into_any_more():
+    q = ConflatingQueue(conflate_at=1)
+    q.put_nowait(diff(1, 1, bids=[(100.0, 1.0)]))
+    q.put_nowait(diff(2, 2, bids=[(99.0, 1.0)]))
+    first = q.get_nowait()
+    q.put_nowait(diff(3, 3, bids=[(98.0, 1.0)]))
+    assert (first.U, first.u) == (1, 2)
+    assert dict(first.bids) == {100.0: 1.0, 99.0: 1.0}
+    (second,) = drain(q)
+    assert (second.U, second.u) == (3, 3)
@@ -0,0 +1,118 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import ingest_ring
+from ingest_ring import EventCodec, SpscRing
+from market_handler import DepthDiff, Trade
+from ticks import TICK_SPECS
+
+
+@pytest.fixture
+def ring():
+    r = SpscRing(1 << 12)
+    yield r
+    r.close()
+
+
+def events_float():
+    return [
+        DepthDiff("depth_diff", 1_700_000_000_000_001, 1_700_000_000_000_050, "BTCUSDT", 100, 105, None,
+                  [(90000.01, 1.5), (89999.99, 0.0)], [(90000.02, 2.25)], t_recv_ns=11, t_enq_ns=12),
+        DepthDiff("depth_diff", 2, 3, "BTCUSDT", 106, 106, 105, [], []),
+        Trade("trade", 4, 5, "BTCUSDT", 77, 90000.01, 0.001, "sell", t_recv_ns=13, t_enq_ns=14),
+        Trade("trade", 6, 7, "BTCUSDT", 78, 90000.02, 0.5, "buy"),
+    ]
+
+
+def roundtrip(ring, codec, events):
+    for ev in events:
+        assert codec.encode(ring, ev)
+    return ring.drain(codec.decode)
+
+
+def test_codec_roundtrip_float(ring):
+    codec = EventCodec("btcusdt")
+    events = events_float()
+    out = roundtrip(ring, codec, events)
+    assert out == events
+    assert [(e.t_recv_ns, e.t_enq_ns) for e in out] == [(e.t_recv_ns, e.t_enq_ns) for e in events] # not part of ==
+    assert ring.empty()
+
+
+def test_codec_roundtrip_ticks(ring):
+    codec = EventCodec("BTCUSDT", TICK_SPECS["BTCUSDT"])
+    events = [
+        DepthDiff("depth_diff", 1, 2, "BTCUSDT", 10, 12, 9, [(9000001, 150000), (9000000, 0)], [(9000002, 3)]),
+        Trade("trade", 3, 4, "BTCUSDT", 5, 9000001, 100, "buy"),
+    ]
+    out = roundtrip(ring, codec, events)
+    assert out == events
+    assert all(type(p) is int and type(q) is int for p, q in out[0].bids)
+
+
+def test_wraparound_keeps_order_and_content():
+    ring = SpscRing(1 << 10) # small → wraps every few records
+    codec = EventCodec("BTCUSDT")
+    try:
+        seen = []
+        sent = []
+        for i in range(500):
+            n = i % 7
+            ev = DepthDiff("depth_diff", i, i, "BTCUSDT", i, i, None, [(float(i), float(j)) for j in range(n)], [])
+            sent.append(ev)
+            assert codec.encode(ring, ev)
+            if i % 4 == 3:
+                seen += ring.drain(codec.decode, max_n=4) # consumer a few records behind
+        seen += ring.drain(codec.decode, max_n=10_000)
+        assert seen == sent
+    finally:
+        ring.close()
+
+
+def test_full_ring_refuses_then_recovers():
+    ring = SpscRing(1 << 10)
+    codec = EventCodec("BTCUSDT")
+    try:
+        trade = Trade("trade", 0, 0, "BTCUSDT", 0, 1.0, 1.0, "buy")
+        pushed = 0
+        while codec.encode(ring, trade):
+            pushed += 1
+        assert 0 < pushed < 1 << 10
+        assert ring.used() <= ring.capacity
+        assert len(ring.drain(codec.decode, max_n=10_000)) == pushed # nothing lost or torn
+        assert codec.encode(ring, trade)
+    finally:
+        ring.close()
+
+
+def test_record_too_big_is_rejected(ring):
+    codec = EventCodec("BTCUSDT")
+    huge = DepthDiff("depth_diff", 0, 0, "BTCUSDT", 1, 1, None, [(1.0, 1.0)] * 200, [])
+    with pytest.raises(ValueError):
+        codec.encode(ring, huge)
+
+
+def test_consumer_attached_by_name(ring):
+    codec = EventCodec("BTCUSDT")
+    consumer = SpscRing(name=ring.name, create=False)
+    try:
+        events = events_float()
+        for ev in events:
+            codec.encode(ring, ev)
+        assert consumer.drain(codec.decode) == events
+        assert ring.counters()["pushed"] == len(events)
+    finally:
+        consumer.close() # not the owner → doesn't unlink
+
+
+def test_consumer_in_another_process_leaves_the_ring_alone(ring):
+    # a process with its own resource tracker attaches and exits: the ring must survive, and no leak warning
+    code = ("import sys; sys.path.insert(0, sys.argv[1]); from ingest_ring import SpscRing; "
+            "SpscRing(name=sys.argv[2], create=False).close()")
+    r = subprocess.run([sys.executable, "-c", code, os.path.dirname(ingest_ring.__file__), ring.name],
+                       capture_output=True, text=True, timeout=30)
+    assert r.returncode == 0 and "leaked" not in r.stderr, r.stderr
+    SpscRing(name=ring.name, create=False).close() # still there; the fixture's close() unlinks it once
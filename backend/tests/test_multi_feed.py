@@ -0,0 +1,59 @@
+import pickle
+import queue
+
+from market_maker import MarketMaker
+from multi_feed import ShardedRunner
+from order_book_engine import OrderBookEngine
+from telemetry import SILENT
+
+
+def make_maker():
+    book = OrderBookEngine("BTCUSDT")
+    book.telemetry = SILENT
+    book.apply_snapshot({"lastUpdateId": 1, "bids": [["100.00", "1"]], "asks": [["100.10", "1"]]})
+    book.synced = True
+    maker = MarketMaker(book, quote_size=1.0, max_inventory=5.0, inventory_skew=0.0, levels=2, level_spacing=0.01)
+    maker.telemetry = SILENT
+    return maker
+
+
+def test_maker_state_survives_a_move():
+    old = make_maker()
+    old.on_book_update()
+    old.orders.match(old.bid_quote.price - 0.01, 1.5) # best bid filled, second level half filled
+    old.inventory, old.realized_pnl = 1.5, -150.06
+    old.refresh_quotes()
+    state = pickle.loads(pickle.dumps(old.export_state())) # through the reports / inbox queues
+
+    new = make_maker()
+    new.restore_state(state)
+    assert (new.inventory, new.realized_pnl) == (1.5, -150.06)
+    assert [(o.price, o.remaining) for o in new.orders.bids.levels()] == [(o.price, o.remaining) for o in old.orders.bids.levels()]
+    assert new.bid_quote == old.bid_quote and new.ask_quote == old.ask_quote
+
+    restored = {o.order_id for o in new.orders.bids.levels() + new.orders.asks.levels()}
+    sent = new.orders.sent
+    new.on_book_update() # same ladder: only the filled level is sent again, the partial keeps its spot
+    assert new.orders.sent == sent + 1
+    best, partial = new.orders.bids.levels()
+    assert partial.order_id in restored and partial.remaining == 0.5
+    assert best.order_id not in restored and best.order_id > max(restored) # fresh id, no clash
+
+
+def test_move_hands_the_maker_over():
+    runner = ShardedRunner(["btcusdt", "ethusdt", "bnbusdt"], n_shards=2)
+    runner.inboxes = [queue.Queue(), queue.Queue()]
+    runner.reports = queue.Queue()
+    assert runner.assignment["BTCUSDT"] == 0
+
+    runner.move("BTCUSDT", 1)
+    assert runner.inboxes[0].get_nowait() == ("drop", "BTCUSDT")
+    assert runner.inboxes[1].empty() # nothing for the new shard until the old one answers
+    runner.rebalance() # a move is in flight → no other move
+    assert runner.moves == 1
+
+    state = {"inventory": 0.02, "realized_pnl": -1800.0, "orders": []}
+    runner.reports.put({"shard": 0, "handoff": "BTCUSDT", "maker": state})
+    runner.poll_reports()
+    assert runner.inboxes[1].get_nowait() == ("assign", "BTCUSDT", state)
+    assert not runner._moving and 0 not in runner.health
@@ -0,0 +1,120 @@
+import pytest
+
+from market_maker import MarketMaker
+from order_book_engine import OrderBookEngine
+from order_manager import CANCELLED, FILLED, LIVE, PARTIAL, PENDING, OrderManager
+
+
+def prices(om, side):
+    return [o.price for o in om.side(side).levels()]
+
+
+def test_sync_only_touches_changed_levels():
+    om = OrderManager()
+    assert om.sync("buy", [(100.0, 1.0), (99.0, 1.0)])
+    assert om.sent == 2 and prices(om, "buy") == [100.0, 99.0]
+    first = om.best("buy")
+
+    assert om.sync("buy", [(100.0, 1.0), (98.0, 1.0)])
+    assert om.sent == 3 and om.cancelled == 1 and om.kept == 1
+    assert prices(om, "buy") == [100.0, 98.0]
+    assert om.best("buy") is first # kept its queue spot
+
+    assert not om.sync("buy", [(100.0, 1.0), (98.0, 1.0)]) # unchanged → nothing sent
+    assert om.sent == 3
+
+    om.sync("buy", [(100.0, 2.0)]) # resized → cancel + resend
+    assert om.best("buy") is not first and first.state == CANCELLED
+    assert prices(om, "buy") == [100.0]
+
+
+def test_asks_are_ordered_lowest_first():
+    om = OrderManager()
+    om.sync("sell", [(103.0, 1.0), (101.0, 1.0), (102.0, 1.0)])
+    assert prices(om, "sell") == [101.0, 102.0, 103.0]
+    assert om.best("sell").price == 101.0
+
+
+def test_match_misses_fast():
+    om = OrderManager()
+    om.sync("buy", [(100.0, 1.0)])
+    om.sync("sell", [(101.0, 1.0)])
+    assert om.match(100.5, 10.0) == ()
+    assert om.fills == 0
+
+
+def test_match_fills_best_first_with_partials():
+    om = OrderManager()
+    om.sync("buy", [(100.0, 1.0), (99.0, 1.0), (98.0, 1.0)])
+    fills = om.match(99.0, 1.5) # reaches 100 and 99, not 98
+    assert [(o.price, q) for o, q in fills] == [(100.0, 1.0), (99.0, 0.5)]
+    assert fills[0][0].state == FILLED
+    assert fills[1][0].state == PARTIAL and fills[1][0].remaining == 0.5
+    assert prices(om, "buy") == [99.0, 98.0] # the filled one is gone
+
+    # the partial keeps its queue spot: the same ladder doesn't resend it at full size
+    sent = om.sent
+    om.sync("buy", [(99.0, 1.0), (98.0, 1.0)])
+    assert om.sent == sent and om.best("buy") is fills[1][0] and om.best("buy").remaining == 0.5
+
+    fills = om.match(95.0, 10.0) # more than everything resting
+    assert sum(q for _, q in fills) == 1.5
+    assert len(om.bids) == 0
+
+
+def test_match_sells():
+    om = OrderManager()
+    om.sync("sell", [(101.0, 1.0), (102.0, 2.0)])
+    fills = om.match(102.0, 2.0)
+    assert [(o.price, q) for o, q in fills] == [(101.0, 1.0), (102.0, 1.0)]
+    assert om.best("sell").remaining == 1.0
+
+
+def test_pending_orders_wait_for_ack():
+    sent, cancelled = [], []
+    om = OrderManager(send=sent.append, cancel=cancelled.append)
+    om.sync("buy", [(100.0, 1.0)])
+    o = om.best("buy")
+    assert sent == [o] and o.state == PENDING
+    assert om.match(100.0, 1.0) == [] # not at the exchange yet
+
+    om.ack(o.order_id)
+    assert o.state == LIVE
+    assert [(x.price, q) for x, q in om.match(100.0, 0.4)] == [(100.0, 0.4)]
+
+    om.cancel_all()
+    assert cancelled == [o] and len(om.bids) == 0
+    assert om.sync("buy", [(100.0, 1.0)]) # last ladder was reset → sent again
+
+
+def test_repeated_prices_rest_once():
+    om = OrderManager()
+    for _ in range(3):
+        om.sync("buy", [(100.0, 1.0), (100.0, 2.0), (99.0, 1.0)])
+    assert om.sent == 2 and om.cancelled == 0 # first size wins, no cancel/resend churn
+    assert prices(om, "buy") == [100.0, 99.0] and om.best("buy").qty == 1.0
+    om.match(100.0, 1.0)
+    assert om.best("buy").price == 99.0 # no stale key left behind for 100
+    om.match(99.0, 1.0)
+    assert om.best("buy") is None
+
+
+def test_ladder_needs_a_spacing():
+    with pytest.raises(ValueError):
+        MarketMaker(OrderBookEngine("BTCUSDT"), levels=3, level_spacing=0.0)
+    MarketMaker(OrderBookEngine("BTCUSDT"), levels=1, level_spacing=0.0) # one level: spacing unused
+
+
+def test_fill_from_outside():
+    om = OrderManager()
+    om.sync("sell", [(101.0, 1.0), (102.0, 1.0)])
+    o = om.best("sell")
+    om.fill(o, 0.25)
+    assert o.state == PARTIAL and om.best("sell") is o
+    om.fill(o, 0.75)
+    assert o.state == FILLED and om.best("sell").price == 102.0 and om.fills == 2
+
+    gone = om.best("sell")
+    om.sync("sell", []) # cancelled while a fill was in flight
+    om.fill(gone, 1.0)
+    assert gone.state == CANCELLED and om.fills == 2
@@ -0,0 +1,145 @@
+import itertools
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+
+import pytest
+
+import shm_book
+from market_handler import DepthDiff
+from order_book_engine import OrderBookEngine
+from shm_book import SEQ, SEQ_OFFSET, TopOfBookPublisher, TopOfBookReader
+from telemetry import SILENT
+from ticks import TICK_SPECS
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def name():
+    return f"mmtest_{os.getpid()}_{next(_names)}"
+
+
+def make_book(tick_spec=None):
+    book = OrderBookEngine("BTCUSDT", book_side="ticks" if tick_spec else "sorted", tick_spec=tick_spec)
+    book.telemetry = SILENT
+    book.apply_snapshot({"lastUpdateId": 10,
+                         "bids": [["100.00", "1.5"], ["99.99", "2"], ["99.00", "3"]],
+                         "asks": [["100.01", "0.5"], ["100.50", "4"]]})
+    book.synced = True
+    return book
+
+
+def test_publish_read_roundtrip(name):
+    book = make_book()
+    pub = TopOfBookPublisher(book, name, depth=2)
+    reader = TopOfBookReader(name)
+    try:
+        pub.publish(DepthDiff("depth_diff", 123, 456, "BTCUSDT", 1, 10, None, [], []))
+        tob = reader.read()
+        assert tob.symbol == "BTCUSDT" and tob.synced and tob.last_update_id == 10
+        assert tob.bids == [(100.0, 1.5), (99.99, 2.0)] # only `depth` levels
+        assert tob.asks == [(100.01, 0.5), (100.5, 4.0)]
+        assert (tob.ts_event_us, tob.ts_recv_us) == (123, 456)
+        assert tob.seq == 2 and tob.seq % 2 == 0
+    finally:
+        reader.close()
+        pub.close()
+
+
+def test_tick_mode_publishes_real_prices(name):
+    book = make_book(TICK_SPECS["BTCUSDT"])
+    pub = TopOfBookPublisher(book, name, depth=5)
+    reader = TopOfBookReader(name)
+    try:
+        pub.publish()
+        tob = reader.read()
+        assert tob.bids == [(100.0, 1.5), (99.99, 2.0), (99.0, 3.0)]
+        assert tob.best_ask() == 100.01
+    finally:
+        reader.close()
+        pub.close()
+
+
+def test_validate_detects_a_publish_during_the_read(name):
+    book = make_book()
+    pub = TopOfBookPublisher(book, name, depth=2)
+    reader = TopOfBookReader(name)
+    try:
+        pub.publish()
+        seq = reader.begin()
+        pub.publish() # raced the zero-copy read
+        assert not reader.validate(seq)
+        assert reader.validate(reader.begin())
+    finally:
+        reader.close()
+        pub.close()
+
+
+def test_read_waits_out_a_write_in_progress(name):
+    book = make_book()
+    pub = TopOfBookPublisher(book, name, depth=2)
+    reader = TopOfBookReader(name)
+    try:
+        pub.publish()
+        SEQ.pack_into(pub.shm.buf, SEQ_OFFSET, pub._seq + 1) # odd: writer "in the middle" of an update
+        book.bids[101.0] = 7.0
+        timer = threading.Timer(0.05, pub.publish) # the writer finishes later
+        timer.start()
+        tob = reader.read() # must not return the half-written state
+        timer.join()
+        assert tob.seq == pub._seq
+        assert tob.bids[0] == (101.0, 7.0)
+    finally:
+        reader.close()
+        pub.close()
+
+
+def test_reader_rejects_other_segments(name):
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name, create=True, size=256)
+    try:
+        with pytest.raises(ValueError):
+            TopOfBookReader(name)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_readers_in_other_processes_leave_the_segment_alone(name, tmp_path):
+    # Readers in a spawned child (shares our resource tracker) and in an unrelated process (has its own)
+    # must neither unlink the segment nor disturb the publisher's own cleanup.
+    script = textwrap.dedent(f"""
+        import multiprocessing as mp, subprocess, sys
+        sys.path.insert(0, {os.path.dirname(shm_book.__file__)!r})
+        from order_book_engine import OrderBookEngine
+        from shm_book import TopOfBookPublisher, TopOfBookReader
+        from telemetry import SILENT
+
+        def read(name):
+            r = TopOfBookReader(name)
+            assert r.read().bids
+            r.close()
+
+        if __name__ == "__main__":
+            book = OrderBookEngine("BTCUSDT")
+            book.telemetry = SILENT
+            book.apply_snapshot({{"lastUpdateId": 1, "bids": [["1.00", "1"]], "asks": [["2.00", "1"]]}})
+            pub = TopOfBookPublisher(book, {name!r})
+            pub.publish()
+            p = mp.get_context("spawn").Process(target=read, args=({name!r},))
+            p.start()
+            p.join()
+            # an unrelated reader afterwards: fails if the child took the segment with it
+            subprocess.run([sys.executable, "-c", "import sys; sys.path.insert(0, sys.argv[1]); "
+                            "import shm_book; shm_book.TopOfBookReader(sys.argv[2]).close()", sys.path[0], {name!r}], check=True)
+            pub.close()
+            print("ok")
+    """)
+    path = tmp_path / "readers.py" # a file, so the spawned child can import read()
+    path.write_text(script)
+    r = subprocess.run([sys.executable, str(path)], capture_output=True, text=True, timeout=60)
+    assert r.stdout.strip() == "ok", r.stderr
+    assert "Traceback" not in r.stderr and "leaked" not in r.stderr, r.stderr
@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from market_handler import DepthDiff
+from order_book_engine import OrderBookEngine
+from signals import BookSignals
+from telemetry import SILENT
+from ticks import TICK_SPECS
+
+
+def band_by_hand(side, bps):
+    best = side.best()
+    if best is None:
+        return 0
+    if side.is_bid:
+        return sum(q for p, q in side.items() if p >= best * (1 - bps / 10_000))
+    return sum(q for p, q in side.items() if p <= best * (1 + bps / 10_000))
+
+
+@pytest.mark.parametrize("book_side,ticks", [("sorted", False), ("dict", False), ("ticks", True)])
+def test_band_depth_follows_the_touch(book_side, ticks):
+    spec = TICK_SPECS["BTCUSDT"] if ticks else None
+    book = OrderBookEngine("BTCUSDT", book_side=book_side, tick_spec=spec)
+    book.telemetry = SILENT
+    book.apply_snapshot({"lastUpdateId": 1,
+                         "bids": [[f"{100 - i * 0.01:.2f}", "1"] for i in range(1, 40)],
+                         "asks": [[f"{100 + i * 0.01:.2f}", "1"] for i in range(40)]})
+    book.snapshot_loaded = True
+    book.synced = True
+    signals = BookSignals(book, band_bps=5) # 5 bps of 100 = 5 ticks
+    rnd = random.Random(7)
+    mid = 10_000 # ticks
+    for u in range(2, 600):
+        mid += rnd.choice((-2, -1, 0, 1, 2)) # the touch wanders, so the band edge keeps moving
+        bids, asks = [], []
+        for _ in range(rnd.randint(1, 6)):
+            t = mid - rnd.randint(1, 12)
+            bids.append((t, rnd.choice((0, 1, 2, 3)))) # 0 = level removed
+            t = mid + rnd.randint(0, 12)
+            asks.append((t, rnd.choice((0, 1, 2, 3))))
+        conv = (lambda t: t) if ticks else (lambda t: t / 100)
+        book.on_depth_diff(DepthDiff("depth_diff", 0, 0, "BTCUSDT", u, u, None,
+                                     [(conv(t), q) for t, q in bids], [(conv(t), q) for t, q in asks]))
+        if u % 3 == 0: # reads skip some diffs: the shift has to cover several touch moves at once
+            b, a = signals.band_depth()
+            assert b == pytest.approx(band_by_hand(book.bids, 5))
+            assert a == pytest.approx(band_by_hand(book.asks, 5))
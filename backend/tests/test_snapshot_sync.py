@@ -0,0 +1,211 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from market_handler import DepthDiff
+from order_book_engine import OrderBookEngine
+from snapshot_sync import AsyncSnapshotSync
+from telemetry import SILENT
+
+
+class StandIn:
+    """
+    Local stand-in for GET /api/v3/depth. Answers with the scripted (status, body, delay_s)
+    responses in order (the last one repeats) and records when each request came in.
+    """
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.hits = [] # time.monotonic() of every request
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.hits.append(time.monotonic())
+                status, body, delay = stand_in.responses.pop(0) if len(stand_in.responses) > 1 else stand_in.responses[0]
+                time.sleep(delay)
+                payload = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError): # the client gave up (timeout test)
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def gaps(self):
+        return [b - a for a, b in zip(self.hits, self.hits[1:])]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stand_in():
+    servers = []
+
+    def make(*responses):
+        servers.append(StandIn(responses))
+        return servers[-1]
+
+    yield make
+    for s in servers:
+        s.close()
+
+
+def snapshot(last_update_id, bids=(("100.00", "1.0"),), asks=(("101.00", "1.0"),)):
+    return {"lastUpdateId": last_update_id, "bids": [list(b) for b in bids], "asks": [list(a) for a in asks]}
+
+
+def diff(U, u, bids=(), asks=()):
+    return DepthDiff("depth_diff", 0, 0, "BTCUSDT", U, u, None, list(bids), list(asks))
+
+
+def make_book(server) -> OrderBookEngine:
+    book = OrderBookEngine("BTCUSDT", rest_url=server.url)
+    book.telemetry = SILENT
+    return book
+
+
+async def wait_for(pred, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not pred():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_requests_are_rate_limited_and_coalesced(stand_in):
+    server = stand_in((200, snapshot(10), 0))
+
+    async def run():
+        book = make_book(server)
+        sync = AsyncSnapshotSync(book, min_interval=0.3)
+        sync.start()
+        sync.request()
+        await wait_for(lambda: sync.fetches == 1)
+        for _ in range(5): # a burst while the next one waits → one fetch
+            sync.request()
+        await wait_for(lambda: sync.fetches == 2)
+        await asyncio.sleep(0.4)
+        await sync.stop()
+        return sync
+
+    sync = asyncio.run(run())
+    assert sync.fetches == 2
+    assert sync.requests == 6
+    assert len(server.hits) == 2
+    assert server.gaps()[0] >= 0.3 - 0.02
+
+
+def test_backoff_after_server_errors(stand_in):
+    server = stand_in((500, {}, 0), (503, {}, 0), (500, {}, 0), (200, snapshot(10), 0))
+
+    async def run():
+        book = make_book(server)
+        sync = AsyncSnapshotSync(book, min_interval=0.0, backoff_base=0.1, backoff_max=10.0)
+        sync.start()
+        sync.request()
+        await wait_for(lambda: sync.fetches == 1)
+        await sync.stop()
+        return book, sync
+
+    book, sync = asyncio.run(run())
+    assert sync.errors == 3
+    assert len(server.hits) == 4
+    for gap, expected in zip(server.gaps(), (0.1, 0.2, 0.4)): # doubled after every failure
+        assert gap >= expected - 0.02
+    assert book.last_update_id == 10
+    assert not book.snapshot_pending
+
+
+def test_backoff_is_capped():
+    async def run():
+        book = OrderBookEngine("BTCUSDT")
+        sync = AsyncSnapshotSync(book, min_interval=0.0, backoff_base=0.5, backoff_max=3.0)
+        sync._last_attempt = 0.0
+        sync._failures = 20
+        return sync._delay(1.0)
+
+    assert asyncio.run(run()) == 3.0
+
+
+def test_timeout_counts_as_failure_and_retries(stand_in):
+    server = stand_in((200, snapshot(10), 1.0), (200, snapshot(11), 0))
+
+    async def run():
+        book = make_book(server)
+        sync = AsyncSnapshotSync(book, min_interval=0.0, backoff_base=0.05, timeout=0.2)
+        sync.start()
+        sync.request()
+        await wait_for(lambda: sync.fetches == 1)
+        await sync.stop()
+        return book, sync
+
+    book, sync = asyncio.run(run())
+    assert sync.errors == 1
+    assert len(server.hits) == 2
+    assert book.last_update_id == 11 # the late answer to the timed out request is never installed
+
+
+def test_complete_snapshot_bridges_buffered_diffs(stand_in):
+    server = stand_in((200, snapshot(103), 0.05))
+
+    async def run():
+        book = make_book(server)
+        sync = AsyncSnapshotSync(book, min_interval=0.0)
+        sync.start()
+        # all buffered before the snapshot arrives; the first one is older than the snapshot
+        book.on_depth_diff(diff(100, 101, bids=[(99.0, 5.0)]))
+        book.on_depth_diff(diff(102, 104, bids=[(100.0, 2.0)]))
+        book.on_depth_diff(diff(105, 106, asks=[(101.0, 0.0), (102.0, 3.0)]))
+        assert not book.synced and book.snapshot_pending
+        await wait_for(lambda: book.synced)
+        await sync.stop()
+        return book, sync
+
+    book, sync = asyncio.run(run())
+    assert book.last_update_id == 106
+    assert book.bids.get(100.0) == 2.0
+    assert book.bids.get(99.0) is None # the diff before the snapshot was dropped
+    assert book.asks.get(101.0) is None
+    assert book.asks.get(102.0) == 3.0
+    assert sync.fetches == 1
+    assert len(book.buffer) == 0
+
+
+def test_stale_snapshot_is_requested_again(stand_in):
+    # the first snapshot is older than the first buffered diff → can never bridge → one more request, no spinning
+    server = stand_in((200, snapshot(100), 0), (200, snapshot(205), 0))
+
+    async def run():
+        book = make_book(server)
+        sync = AsyncSnapshotSync(book, min_interval=0.05)
+        sync.start()
+        book.on_depth_diff(diff(201, 203))
+        book.on_depth_diff(diff(204, 206, bids=[(100.0, 4.0)]))
+        book.on_depth_diff(diff(207, 208))
+        await wait_for(lambda: book.synced)
+        await sync.stop()
+        return book, sync
+
+    book, sync = asyncio.run(run())
+    assert book.stale_snapshots == 1
+    assert sync.requests == 2
+    assert len(server.hits) == 2
+    assert book.last_update_id == 208
+    assert book.bids.get(100.0) == 4.0
+    assert book.try_sync_steps < 10
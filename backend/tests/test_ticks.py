@@ -0,0 +1,26 @@
+import random
+
+import ticks
+from ticks import TickSpec, _scaled_int
+
+
+def test_fast_parse_matches_the_string_path():
+    spec = TickSpec("BTCUSDT", "0.01", "0.00001")
+    rnd = random.Random(3)
+    for _ in range(20000):
+        t = rnd.randrange(10 ** rnd.randint(1, 12))
+        price = f"{t // 100}.{t % 100:02d}" + "0" * rnd.randint(0, 6) # Binance pads to 8 decimals
+        n = rnd.randrange(10 ** rnd.randint(1, 13))
+        qty = f"{n // 10 ** 5}.{n % 10 ** 5:05d}000"
+        assert spec.price_to_ticks(price) == _scaled_int(price, 2) == t
+        assert spec.qty_to_lots(qty) == _scaled_int(qty, 5) == n
+    assert spec.price_to_ticks("12345678901234.567800") == 1234567890123456 # too long for a double: string path
+
+
+def test_price_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(ticks, "CACHE_SIZE", 4)
+    spec = TickSpec("BTCUSDT", "0.05", "0.001")
+    for t in range(10):
+        assert spec.price_to_ticks(f"{t * 5 // 100}.{t * 5 % 100:02d}000000") == t
+    assert len(spec.ticks_cache) <= 4
+    assert spec.price_to_ticks("0.05000000") == 1 # still right after a clear